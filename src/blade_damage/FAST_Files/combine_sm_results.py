@@ -31,6 +31,32 @@ def combine_results(src_dirs, dest_dir, src_num, turb, turb_class, af):
 
             f_dest.close()
 
+def combine_db_results(src_dirs, dest_dir, src_num, turb, turb_class, af):
+
+    # same as combine_results, for training points stored in sm_training.db (FASTinfo['sm_training_store'] = 'db')
+    import sys
+    sys.path.insert(0, '..')
+    from sm_db import combine_sm_db, sm_db_to_master, sm_db_file_name
+
+    sm_var_dir = 'sm_var_dir_' + turb + '_' + turb_class + '_' + af
+
+    # make new destination directory
+    if not os.path.isdir('Opt_Files/' + dest_dir):
+        os.mkdir('Opt_Files/' + dest_dir)
+    if not os.path.isdir('Opt_Files/' + dest_dir + '/' + sm_var_dir):
+        os.mkdir('Opt_Files/' + dest_dir + '/' + sm_var_dir)
+
+    src_files = []
+    for i in range(len(src_dirs)):
+        src_files.append('Opt_Files/' + src_dirs[i] + '/' + sm_var_dir + '/' + sm_db_file_name)
+
+    dest_file = 'Opt_Files/' + dest_dir + '/' + sm_var_dir + '/' + sm_db_file_name
+
+    combine_sm_db(src_files, dest_file, src_num)
+
+    # master files used by calc_FAST_sm_fit
+    sm_db_to_master(dest_file, 'Opt_Files/' + dest_dir + '/' + sm_var_dir)
+
 if __name__ == "__main__":
 
     # opt_file_srcs = ['test_075MW', 'test_15MW', 'test_3MW', 'test_5MW']
@@ -56,5 +82,11 @@ if __name__ == "__main__":
     turbine_class = 'I'
     airfoils = 'af1'
 
-    combine_results(opt_file_srcs, opt_file_dest, opt_file_srcs_num, turbulence, turbine_class, airfoils)
+    # training points stored in sm_training.db
+    use_db = False
+
+    if use_db:
+        combine_db_results(opt_file_srcs, opt_file_dest, opt_file_srcs_num, turbulence, turbine_class, airfoils)
+    else:
+        combine_results(opt_file_srcs, opt_file_dest, opt_file_srcs_num, turbulence, turbine_class, airfoils)
 
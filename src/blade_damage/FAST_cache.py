@@ -0,0 +1,288 @@
+# FAST_cache.py includes a cache of the reduced results of FAST simulations (FASTinfo['use_FAST_cache']), shared by
+# all optimizations and surrogate model training runs (ex. the DLC_0_0 rated torque case of every campaign, repeated
+# training points, baseline designs that reappear across Opt_Files/test_* studies)
+#
+# key: sha1 of the FAST input files of the case (template files, rendered case files and the FAST config of the
+# case), the wind file, the FAST executable and the post-processing settings (see FAST_case_key)
+# entry (<cache dir>/<key>.npz): the DEMs of the case (before the turbulent safety factor), the rainflow peaks, and the
+# min / max / mean of every output channel (extreme loads, tip deflection, rated torque)
+#
+# on a hit (CreateFASTConfig), the entry is copied into the case directory and the case is marked in its config
+# (cfg['fst_cache_hit']). RunFASTCases leaves the marked cases out (FAST_cache_run_caseids) before it builds the
+# group of FAST runs, so no FAST output files are written or read for them, and their output is empty.
+# CreateFASTConstraints takes the DEMs, rainflow peaks and channel min / max / mean of these cases from the entry
+# (FAST_cache_channels), and the other cases from their FAST outputs. On a miss, CreateFASTConstraints adds the entry
+# once the case is processed.
+# Entries are evicted least recently used first (a hit updates the modification time of the entry) when the cache
+# is larger than FASTinfo['FAST_cache_max_size']. The cache directory is only listed when the size of the cache,
+# counted from the entries added by this process since the last listing, is over the limit.
+
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+
+# ========================================================================================================= #
+
+# changed when the contents of the entries change
+FAST_cache_version = 1
+
+# files in the case directory: key of the case, and copy of the cache entry (on a hit)
+FAST_cache_key_file = 'fst_cache_key.txt'
+FAST_cache_case_file = 'fst_runfile_cache.npz'
+
+# config value that marks a case found in the cache
+FAST_cache_hit_cfg = 'fst_cache_hit'
+
+# config values that do not change the results (case directory, executable (hashed instead), cache hit mark)
+FAST_cache_ignored_cfg = ['fst_masterdir', 'fst_rundir', 'fst_exe', FAST_cache_hit_cfg]
+
+# process-wide file digests, key: file name, value: [(modification time, size), digest]
+_FAST_file_digests = dict()
+
+# process-wide size of each cache (bytes) at its last listing, plus the entries added since, key: cache directory
+_FAST_cache_size = dict()
+
+# ========================================================================================================= #
+
+def file_digest(file_name):
+
+    # sha1 of the file contents, only recomputed when the file changed (wind files, executable, template files)
+    stat = os.stat(file_name)
+    version = (stat.st_mtime, stat.st_size)
+
+    if file_name in _FAST_file_digests and _FAST_file_digests[file_name][0] == version:
+        return _FAST_file_digests[file_name][1]
+
+    h = hashlib.sha1()
+    f = open(file_name, "rb")
+    for block in iter(lambda: f.read(1 << 20), b''):
+        h.update(block)
+    f.close()
+
+    _FAST_file_digests[file_name] = [version, h.hexdigest()]
+
+    return h.hexdigest()
+
+# ========================================================================================================= #
+
+def canonical(value):
+
+    # json serializable version of a config value
+    if isinstance(value, dict):
+        return dict([(str(name), canonical(value[name])) for name in value])
+    if isinstance(value, (list, tuple)):
+        return [canonical(v) for v in value]
+    if isinstance(value, np.ndarray):
+        return canonical(value.tolist())
+    if isinstance(value, np.generic):
+        return value.item()
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+
+    return repr(value)
+
+# ========================================================================================================= #
+
+def FAST_case_key(template_dir, case_files, cfg, wnd_file_path, fst_exe, settings):
+
+    # template_dir - FAST template directory (the files that are not in case_files are linked / copied unchanged)
+    # case_files - file name -> contents of the rendered case files
+    # cfg - FAST config of the case
+    # settings - post-processing settings that change the reduced results (ex. S-N slope)
+
+    h = hashlib.sha1()
+
+    cfg = dict([(name, cfg[name]) for name in cfg if name not in FAST_cache_ignored_cfg])
+    h.update(json.dumps([FAST_cache_version, canonical(settings), canonical(cfg)], sort_keys=True).encode('utf-8'))
+
+    # template files (including subdirectories, ex. AeroData)
+    for dir_path, dir_names, file_names in sorted(os.walk(template_dir)):
+        dir_names.sort()
+        for name in sorted(file_names):
+            rel_name = os.path.relpath(os.path.join(dir_path, name), template_dir)
+            if rel_name in case_files:
+                continue
+            h.update((rel_name + ' ' + file_digest(os.path.join(dir_path, name)) + '\n').encode('utf-8'))
+
+    for name in sorted(case_files):
+        h.update((name + ' ' + hashlib.sha1(case_files[name].encode('utf-8')).hexdigest() + '\n').encode('utf-8'))
+
+    # wind file (and the summary file of full-field wind files)
+    wnd_file_path = wnd_file_path.strip('"')
+    for file_name in [wnd_file_path, os.path.splitext(wnd_file_path)[0] + '.sum']:
+        if os.path.isfile(file_name):
+            h.update(('wnd ' + file_digest(file_name) + '\n').encode('utf-8'))
+
+    if os.path.isfile(fst_exe):
+        h.update(('exe ' + file_digest(fst_exe) + '\n').encode('utf-8'))
+    else:
+        h.update(('exe ' + fst_exe + '\n').encode('utf-8'))
+
+    return h.hexdigest()
+
+# ========================================================================================================= #
+
+def FAST_cache_file_name(cache_dir, key):
+
+    return cache_dir + '/' + key + '.npz'
+
+# ========================================================================================================= #
+
+def FAST_cache_entry(DEM, peak_names, peaks_list, resultsdict):
+
+    # DEM - rainflow DEMs of the case (allres[0] of do_rainflow), peak_names / peaks_list - rainflow peaks of each
+    # rainflow channel, resultsdict - output channels of the case (name -> time series)
+    channels = sorted(resultsdict.keys())
+
+    entry = {'DEM': np.array(DEM, dtype=float),
+             'peak_names': np.array(peak_names),
+             'channels': np.array(channels),
+             'channel_min': np.array([np.min(resultsdict[name]) for name in channels], dtype=float),
+             'channel_max': np.array([np.max(resultsdict[name]) for name in channels], dtype=float),
+             'channel_mean': np.array([np.mean(resultsdict[name]) for name in channels], dtype=float)}
+
+    for j in range(0, len(peaks_list)):
+        entry['peaks_' + str(j)] = np.array(peaks_list[j], dtype=float)
+
+    return entry
+
+# ========================================================================================================= #
+
+def load_FAST_cache_entry(file_name):
+
+    entry_file = np.load(file_name, allow_pickle=False)
+    entry = dict()
+    for name in entry_file.files:
+        entry[name] = entry_file[name]
+    entry_file.close()
+
+    entry['peak_names'] = [str(name) for name in entry['peak_names']]
+    entry['channels'] = [str(name) for name in entry['channels']]
+    entry['peaks_list'] = [entry['peaks_' + str(j)] for j in range(0, len(entry['peak_names']))]
+
+    return entry
+
+# ========================================================================================================= #
+
+def FAST_cache_channels(entry, stat):
+
+    # name -> value of stat ('min', 'max', 'mean') of each output channel
+    values = entry['channel_' + stat]
+
+    return dict([(entry['channels'][j], values[j]) for j in range(0, len(values))])
+
+# ========================================================================================================= #
+
+def save_FAST_cache_entry(file_name, entry):
+
+    # written to a temporary file first, so a cache entry that exists is always complete
+    tmp_file_name = file_name + '.' + str(os.getpid()) + '.tmp.npz'
+    np.savez(tmp_file_name, **entry)
+    os.rename(tmp_file_name, file_name)
+
+# ========================================================================================================= #
+
+def evict_FAST_cache(cache_dir, max_size):
+
+    # removes the least recently used entries until the cache is at most max_size bytes, returns the size of the
+    # cache
+    entries = []
+    total_size = 0
+    for name in os.listdir(cache_dir):
+        if not name.endswith('.npz') or name.endswith('.tmp.npz'):
+            continue
+        try:
+            stat = os.stat(os.path.join(cache_dir, name))
+        except OSError:
+            continue
+        entries.append([stat.st_mtime, stat.st_size, name])
+        total_size += stat.st_size
+
+    entries.sort()
+    for mtime, size, name in entries:
+        if total_size <= max_size:
+            break
+        try:
+            os.remove(os.path.join(cache_dir, name))
+        except OSError:
+            # removed by another process
+            pass
+        total_size -= size
+
+    return total_size
+
+# ========================================================================================================= #
+
+def put_FAST_cache_entry(cache_dir, key, entry, max_size):
+
+    if not os.path.isdir(cache_dir):
+        try:
+            os.makedirs(cache_dir)
+        except OSError:
+            # created by another process
+            pass
+
+    file_name = FAST_cache_file_name(cache_dir, key)
+    save_FAST_cache_entry(file_name, entry)
+
+    # (entries added by other processes are counted at the next listing)
+    if cache_dir in _FAST_cache_size:
+        _FAST_cache_size[cache_dir] += os.path.getsize(file_name)
+    if cache_dir not in _FAST_cache_size or _FAST_cache_size[cache_dir] > max_size:
+        _FAST_cache_size[cache_dir] = evict_FAST_cache(cache_dir, max_size)
+
+# ========================================================================================================= #
+
+def prepare_FAST_cache_case(cache_dir, key, case_dir):
+
+    # saves the key in the case directory; on a hit, copies the entry into the case directory and returns its file
+    # name (None on a miss)
+    f = open(os.path.join(case_dir, FAST_cache_key_file), "w")
+    f.write(key + '\n')
+    f.close()
+
+    case_file = os.path.join(case_dir, FAST_cache_case_file)
+    if os.path.isfile(case_file):
+        os.remove(case_file)
+
+    cache_file = FAST_cache_file_name(cache_dir, key)
+    try:
+        shutil.copyfile(cache_file, case_file)
+    except (IOError, OSError):
+        return None
+
+    # (most recently used)
+    try:
+        os.utime(cache_file, None)
+    except OSError:
+        pass
+
+    return case_file
+
+# ========================================================================================================= #
+
+def read_FAST_cache_case(case_dir):
+
+    # key of the case and its cache entry (None if the case was not in the cache)
+    key_file = os.path.join(case_dir, FAST_cache_key_file)
+    if not os.path.isfile(key_file):
+        return None, None
+
+    f = open(key_file, "r")
+    key = f.read().strip()
+    f.close()
+
+    case_file = os.path.join(case_dir, FAST_cache_case_file)
+    if not os.path.isfile(case_file):
+        return key, None
+
+    return key, load_FAST_cache_entry(case_file)
+
+# ========================================================================================================= #
+
+def FAST_cache_run_caseids(cfg_master, caseids):
+
+    # cases that are not marked as cache hits in cfg_master, the only ones that are run (see RunFASTCases)
+    return [caseid for caseid in caseids if not cfg_master.get(caseid, dict()).get(FAST_cache_hit_cfg, False)]
@@ -0,0 +1,93 @@
+# FAST_case_dir.py includes the set up of the FAST case directories (sgp<i>/<caseid>, one per strain gage group and
+# wind file, for the optimization and each surrogate model training point), see CreateFASTConfig
+#
+# only the template files that are changed for each case (.fst, _AD.ipt, _Blade.dat) are copied; the other
+# template files (AeroData airfoil tables, tower, pitch files) are only read by FAST, and are linked:
+#   'hardlink' - hard link to each template file (falls back to a symbolic link across file systems)
+#   'symlink' - symbolic link to each template file / directory
+#   'copy' - copy of the whole template (same as distutils copy_tree)
+
+import os
+import shutil
+
+# ========================================================================================================= #
+
+# endings of the template files that are written / edited for each case
+case_dir_copy_files = ['.fst', '_AD.ipt', '_Blade.dat']
+
+# ========================================================================================================= #
+
+def is_case_file(file_name, copy_files):
+
+    for ending in copy_files:
+        if file_name.endswith(ending):
+            return True
+
+    return False
+
+# ========================================================================================================= #
+
+def link_file(src, dest, mode):
+
+    if mode == 'hardlink':
+        try:
+            os.link(src, dest)
+            return
+        except OSError:
+            pass
+
+    os.symlink(os.path.abspath(src), dest)
+
+# ========================================================================================================= #
+
+def create_case_dir(template_dir, case_dir, mode='hardlink', copy_files=None, case_files=None):
+
+    # creates case_dir from the template (case_dir must not exist yet; the parent directory must exist)
+    # case_files - file name -> contents of case files that are written instead of copied (see FAST_template.py)
+    if copy_files is None:
+        copy_files = case_dir_copy_files
+    if case_files is None:
+        case_files = dict()
+
+    if mode == 'copy':
+        shutil.copytree(template_dir, case_dir)
+        for name in case_files:
+            f = open(os.path.join(case_dir, name), "w")
+            f.write(case_files[name])
+            f.close()
+        return
+
+    if mode not in ['hardlink', 'symlink']:
+        raise Exception('FAST case directory mode must be hardlink, symlink or copy.')
+
+    # the directory is set up under a temporary name, then renamed into place, so a case directory that exists is
+    # always complete
+    tmp_case_dir = case_dir + '.' + str(os.getpid()) + '.tmp'
+    os.mkdir(tmp_case_dir)
+
+    for name in os.listdir(template_dir):
+
+        src = os.path.join(template_dir, name)
+        dest = os.path.join(tmp_case_dir, name)
+
+        if os.path.isdir(src):
+            if mode == 'symlink':
+                os.symlink(os.path.abspath(src), dest)
+            else:
+                os.mkdir(dest)
+                for sub_name in os.listdir(src):
+                    link_file(os.path.join(src, sub_name), os.path.join(dest, sub_name), mode)
+        elif name in case_files:
+            f = open(dest, "w")
+            f.write(case_files[name])
+            f.close()
+        elif is_case_file(name, copy_files):
+            shutil.copy2(src, dest)
+        else:
+            link_file(src, dest, mode)
+
+    try:
+        os.rename(tmp_case_dir, case_dir)
+    except OSError:
+        # created by another job at the same time
+        shutil.rmtree(tmp_case_dir)
@@ -0,0 +1,346 @@
+# FAST_span_loads.py includes the reconstruction of the spanwise edgewise / flapwise bending moments at all blade
+# nodes (rstar_damage stations) from a single FAST run per wind file (FASTinfo['reconstruct_span_loads'], see
+# CreateFASTConstraints)
+#
+# FAST v7 only outputs the local bending moments at 7 strain gages, so without the reconstruction each wind file is
+# run once per strain gage group (sgp 1, 2, 3). With the reconstruction, each wind file is run once with the strain
+# gages over the entire blade (sgp 4), and the AeroDyn element forces (ForcN, ForcT, PrnElm = PRINT in the AeroDyn
+# file) are written to fst_runfile.elm:
+#   - the out-of-plane / in-plane moments of the aerodynamic forces outboard of each node are integrated from the
+#     element forces
+#   - at the measured stations (root and strain gages), the local moments are fit (least squares over time) to these
+#     aerodynamic moments and the gravity moment shapes, rotated by the blade pitch. This accounts for the structural
+#     twist, the gravity / inertial loads and the sign conventions of the outputs.
+#   - the fit coefficients and the fit residuals are interpolated along the span to the other nodes
+# the moments at the measured stations are the FAST outputs. The reconstructed moments are written to
+# fst_runfile_span.out (same format as fst_runfile.out, with Spn<n>MLxb1 / Spn<n>MLyb1 for every node n), which is
+# used for the rainflow counting and extreme loads instead of fst_runfile.out.
+#
+# check_span_loads.py compares the DEMs and extreme loads of the reconstructed moments with those of the moments
+# measured when each wind file is run once per strain gage group (span_load_errors), and saves the errors in
+# <opt_dir>/span_load_check.json. CreateFASTConstraints only uses the reconstructed moments when the largest error
+# at a reconstructed node is within FASTinfo['span_load_max_error'] (check_span_load_errors).
+
+import os
+import re
+import json
+import numpy as np
+
+# ========================================================================================================= #
+
+# FAST output channels needed for the reconstruction (in addition to the root / strain gage moments)
+span_load_channels = ['BldPitch1', 'Azimuth']
+
+# line of the FAST text output file with the channel names (then units, then data)
+FAST_out_name_line = 6
+
+# errors measured by check_span_loads.py, in opt_dir
+span_load_check_file_name = 'span_load_check.json'
+
+# DEMs and extreme loads compared by check_span_loads.py
+span_load_quantities = ['DEMx', 'DEMy', 'Edg', 'Flp']
+
+# ========================================================================================================= #
+
+def read_FAST_out(file_name):
+
+    # returns the header lines, the channel names, and the data (one column per channel)
+    f = open(file_name, "r")
+    lines = f.readlines()
+    f.close()
+
+    names = re.findall(r"\S+", lines[FAST_out_name_line])
+    data = np.loadtxt(lines[FAST_out_name_line + 2:], ndmin=2)
+
+    return lines[0:FAST_out_name_line], names, data
+
+# ========================================================================================================= #
+
+def write_FAST_out(file_name, header_lines, names, units, data):
+
+    f = open(file_name, "w")
+    f.write(''.join(header_lines))
+    f.write('\t'.join(names) + '\n')
+    f.write('\t'.join(units) + '\n')
+    for row in data:
+        f.write('\t'.join(['%.6E' % value for value in row]) + '\n')
+    f.close()
+
+# ========================================================================================================= #
+
+def read_AD_element_file(file_name):
+
+    # AeroDyn element output file (fst_runfile.elm), returns time, ForcN and ForcT (one column per printed element,
+    # in element order)
+    if not os.path.isfile(file_name):
+        raise Exception('Could not find AeroDyn element output file ' + file_name
+                        + ' (PrnElm must be PRINT in the AeroDyn file).')
+
+    f = open(file_name, "r")
+    lines = f.readlines()
+    f.close()
+
+    name_line = None
+    for i in range(0, len(lines)):
+        names = re.findall(r"\S+", lines[i])
+        if len(names) > 0 and names[0] == 'Time':
+            name_line = i
+            break
+    if name_line is None:
+        raise Exception('Could not find the channel names in ' + file_name + '.')
+
+    # (skips the units line, if any)
+    rows = []
+    for line in lines[name_line + 1:]:
+        values = line.split()
+        if len(values) != len(names):
+            continue
+        try:
+            rows.append([float(value) for value in values])
+        except ValueError:
+            continue
+    data = np.array(rows)
+
+    forc_n = dict()
+    forc_t = dict()
+    for j in range(0, len(names)):
+        match = re.match(r"^Forc([NT])_?0*(\d+)$", names[j])
+        if match is None:
+            continue
+        if match.group(1) == 'N':
+            forc_n[int(match.group(2))] = data[:, j]
+        else:
+            forc_t[int(match.group(2))] = data[:, j]
+
+    elements = sorted(forc_n.keys())
+    if len(elements) == 0 or sorted(forc_t.keys()) != elements:
+        raise Exception('Could not find the ForcN / ForcT element outputs in ' + file_name + '.')
+
+    return data[:, 0], np.array([forc_n[j] for j in elements]).T, np.array([forc_t[j] for j in elements]).T
+
+# ========================================================================================================= #
+
+def element_moment_arms(r_nodes, dr_nodes, r_stations):
+
+    # (num_stations, num_elements) moment arm matrix: moment about each station of a unit load per unit length on
+    # each element (the load is constant over the element, only the part of the element outboard of the station
+    # contributes)
+    r_nodes = np.asarray(r_nodes, dtype=float)
+    dr_nodes = np.asarray(dr_nodes, dtype=float)
+
+    lo = r_nodes - dr_nodes / 2.0
+    hi = r_nodes + dr_nodes / 2.0
+
+    arms = np.zeros([len(r_stations), len(r_nodes)])
+    for i in range(0, len(r_stations)):
+        start = np.maximum(lo, r_stations[i])
+        length = np.maximum(hi - start, 0.0)
+        arms[i] = length * ((hi + start) / 2.0 - r_stations[i])
+
+    return arms
+
+# ========================================================================================================= #
+
+def span_load_basis(M_ip, M_oop, M_unit, pitch, azimuth):
+
+    # (nt, 9) regressors of the local moments at a station: aerodynamic in-plane / out-of-plane moments and gravity
+    # moment (cos / sin of azimuth), rotated by the blade pitch, and a constant
+    # the gravity and constant terms are scaled by the moment of a unit load per unit length (M_unit), so their
+    # coefficients (~ mass per unit length) vary slowly along the span
+    cp = np.cos(pitch)
+    sp = np.sin(pitch)
+    ca = np.cos(azimuth) * M_unit
+    sa = np.sin(azimuth) * M_unit
+
+    return np.array([M_ip * cp, M_ip * sp, M_oop * cp, M_oop * sp, ca * cp, ca * sp, sa * cp, sa * sp,
+                     M_unit * np.ones(len(pitch))]).T
+
+# ========================================================================================================= #
+
+def reconstruct_span_moments(r_nodes, dr_nodes, gage_nodes, M_meas_x, M_meas_y, forc_n, forc_t, pitch, azimuth):
+
+    # r_nodes, dr_nodes - radii / lengths of the blade nodes (AeroDyn RNodes, DRNodes)
+    # gage_nodes - nodes (1 to len(r_nodes)) of the strain gages
+    # M_meas_x, M_meas_y - (nt, 1 + len(gage_nodes)) measured edgewise / flapwise moments at the root and gages
+    # forc_n, forc_t - (nt, len(r_nodes)) element normal / tangential forces per unit length (N/m)
+    # pitch, azimuth - (nt,) blade pitch and azimuth (deg)
+    # returns the (nt, 1 + len(r_nodes)) edgewise / flapwise moments at the root and every node (kN*m)
+
+    r_nodes = np.asarray(r_nodes, dtype=float)
+    dr_nodes = np.asarray(dr_nodes, dtype=float)
+
+    # root, then every node
+    r_stations = np.insert(r_nodes, 0, r_nodes[0] - dr_nodes[0] / 2.0)
+    meas_stations = [0] + list(gage_nodes)
+
+    # aerodynamic moments (N*m to kN*m)
+    arms = element_moment_arms(r_nodes, dr_nodes, r_stations)
+    M_ip = np.dot(forc_t, arms.T) / 1000.0
+    M_oop = np.dot(forc_n, arms.T) / 1000.0
+    M_unit = np.sum(arms, axis=1) / 1000.0
+
+    pitch = np.radians(pitch)
+    azimuth = np.radians(azimuth)
+
+    M_span = []
+    for M_meas in [M_meas_x, M_meas_y]:
+
+        # fit at each measured station
+        coef = []
+        resid = []
+        for j in range(0, len(meas_stations)):
+            s = meas_stations[j]
+            basis = span_load_basis(M_ip[:, s], M_oop[:, s], M_unit[s], pitch, azimuth)
+            c = np.linalg.lstsq(basis, M_meas[:, j], rcond=None)[0]
+            coef.append(c)
+            resid.append(M_meas[:, j] - np.dot(basis, c))
+        coef = np.array(coef)
+        resid = np.array(resid).T
+
+        # interpolate along the span
+        r_meas = r_stations[meas_stations]
+        M = np.zeros([len(pitch), len(r_stations)])
+        for s in range(0, len(r_stations)):
+
+            if s in meas_stations:
+                M[:, s] = M_meas[:, meas_stations.index(s)]
+                continue
+
+            c = np.array([np.interp(r_stations[s], r_meas, coef[:, k]) for k in range(0, coef.shape[1])])
+            basis = span_load_basis(M_ip[:, s], M_oop[:, s], M_unit[s], pitch, azimuth)
+
+            # (linear interpolation of the residual between the neighboring measured stations)
+            k = min(max(np.searchsorted(r_meas, r_stations[s]), 1), len(r_meas) - 1)
+            w = (r_stations[s] - r_meas[k - 1]) / (r_meas[k] - r_meas[k - 1])
+            w = min(max(w, 0.0), 1.0)
+
+            M[:, s] = np.dot(basis, c) + (1.0 - w) * resid[:, k - 1] + w * resid[:, k]
+
+        M_span.append(M)
+
+    return M_span[0], M_span[1]
+
+# ========================================================================================================= #
+
+def span_load_names(num_nodes):
+
+    names_x = ['RootMxb1'] + ['Spn{0}MLxb1'.format(n) for n in range(1, num_nodes + 1)]
+    names_y = ['RootMyb1'] + ['Spn{0}MLyb1'.format(n) for n in range(1, num_nodes + 1)]
+
+    return names_x, names_y
+
+# ========================================================================================================= #
+
+def reconstruct_FAST_span_loads(FAST_wnd_directory, r_nodes, dr_nodes, gage_nodes):
+
+    # reads fst_runfile.out / fst_runfile.elm of a case with the strain gages at gage_nodes, writes
+    # fst_runfile_span.out, returns its file name and the reconstructed channels (name -> time series)
+
+    header_lines, names, data = read_FAST_out(FAST_wnd_directory + '/fst_runfile.out')
+
+    def channel(name):
+        if name not in names:
+            raise Exception('FAST output channel ' + name + ' is needed to reconstruct the spanwise loads.')
+        return data[:, names.index(name)]
+
+    time = channel('Time')
+
+    M_meas_x = [channel('RootMxb1')]
+    M_meas_y = [channel('RootMyb1')]
+    for l in range(0, len(gage_nodes)):
+        M_meas_x.append(channel('Spn{0}MLxb1'.format(l + 1)))
+        M_meas_y.append(channel('Spn{0}MLyb1'.format(l + 1)))
+
+    elm_time, forc_n, forc_t = read_AD_element_file(FAST_wnd_directory + '/fst_runfile.elm')
+    if forc_n.shape[1] != len(r_nodes):
+        raise Exception('All ' + str(len(r_nodes)) + ' AeroDyn elements need to be printed (PrnElm), found '
+                        + str(forc_n.shape[1]) + '.')
+
+    # element outputs at the FAST output times
+    forc_n = np.array([np.interp(time, elm_time, forc_n[:, j]) for j in range(0, forc_n.shape[1])]).T
+    forc_t = np.array([np.interp(time, elm_time, forc_t[:, j]) for j in range(0, forc_t.shape[1])]).T
+
+    Mx, My = reconstruct_span_moments(r_nodes, dr_nodes, gage_nodes, np.array(M_meas_x).T, np.array(M_meas_y).T,
+                                      forc_n, forc_t, channel('BldPitch1'), channel('Azimuth'))
+
+    names_x, names_y = span_load_names(len(r_nodes))
+    span_names = ['Time'] + names_x + names_y
+    span_units = ['(s)'] + ['(kN-m)'] * (len(names_x) + len(names_y))
+
+    span_file = FAST_wnd_directory + '/fst_runfile_span.out'
+    write_FAST_out(span_file, header_lines, span_names, span_units, np.hstack([time[:, np.newaxis], Mx, My]))
+
+    span_channels = dict()
+    for j in range(0, len(names_x)):
+        span_channels[names_x[j]] = Mx[:, j]
+        span_channels[names_y[j]] = My[:, j]
+
+    return span_file, span_channels
+
+# ========================================================================================================= #
+
+def FAST_gage_channels(gage_nodes):
+
+    # edgewise / flapwise moment channels of the root and the strain gages, station (0 - root, otherwise node) ->
+    # channel name
+    channels_x = {0: 'RootMxb1'}
+    channels_y = {0: 'RootMyb1'}
+    for l in range(0, len(gage_nodes)):
+        channels_x[gage_nodes[l]] = 'Spn{0}MLxb1'.format(l + 1)
+        channels_y[gage_nodes[l]] = 'Spn{0}MLyb1'.format(l + 1)
+
+    return channels_x, channels_y
+
+# ========================================================================================================= #
+
+def span_load_errors(M_ref, M_span):
+
+    # M_ref, M_span - (num_cases, num_stations) DEMs or extreme loads from the measured and reconstructed moments
+    # returns the (num_stations,) maximum and rms relative error over the cases
+    M_ref = np.atleast_2d(np.asarray(M_ref, dtype=float))
+    M_span = np.atleast_2d(np.asarray(M_span, dtype=float))
+
+    error = np.abs(M_span - M_ref) / np.maximum(np.abs(M_ref), 1e-12)
+
+    return np.max(error, axis=0), np.sqrt(np.mean(error**2.0, axis=0))
+
+# ========================================================================================================= #
+
+def save_span_load_check(file_name, errors, reconstructed, num_cases):
+
+    # errors - quantity -> (num_stations,) maximum and rms relative errors (span_load_errors)
+    # reconstructed - stations of the reconstructed moments (the others are FAST outputs)
+    check = {'num_cases': num_cases, 'reconstructed': [int(s) for s in reconstructed], 'max_error': dict(),
+             'rms_error': dict()}
+    for quantity in errors:
+        check['max_error'][quantity] = [float(value) for value in errors[quantity][0]]
+        check['rms_error'][quantity] = [float(value) for value in errors[quantity][1]]
+
+    f = open(file_name, "w+")
+    json.dump(check, f, sort_keys=True, indent=4)
+    f.close()
+
+# ========================================================================================================= #
+
+def check_span_load_errors(opt_dir, max_error):
+
+    # largest measured error at a reconstructed node; raises unless it has been measured and is within max_error
+    file_name = opt_dir + '/' + span_load_check_file_name
+    if not os.path.isfile(file_name):
+        raise Exception('The error of the reconstructed spanwise loads has not been measured (' + file_name
+                        + ' not found); run check_span_loads.py, or set reconstruct_span_loads = False.')
+
+    f = open(file_name, "r")
+    check = json.load(f)
+    f.close()
+
+    error = 0.0
+    for quantity in span_load_quantities:
+        error = max(error, np.max(np.array(check['max_error'][quantity])[check['reconstructed']]))
+
+    if error > max_error:
+        raise Exception('Largest error of the reconstructed spanwise loads (' + str(error * 100.0) + ' %, '
+                        + file_name + ') is above span_load_max_error (' + str(max_error * 100.0)
+                        + ' %); set reconstruct_span_loads = False.')
+
+    return error
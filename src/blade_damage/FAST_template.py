@@ -0,0 +1,114 @@
+# FAST_template.py includes the FAST template files that are written for each FAST case (.fst, _AD.ipt, _Blade.dat),
+# read and parsed once per process (see CreateFASTConfig)
+#
+# each case gets the template files with the wind file path of the case on line 9 of the AeroDyn file; the files
+# are rendered in memory and written with a single write each. The radial nodes of the AeroDyn file (DR_nodes,
+# used when setting chord / twist, and DRNodes, used when reconstructing the spanwise loads) are parsed from the
+# template once.
+
+import os
+import re
+import numpy as np
+
+from FAST_case_dir import case_dir_copy_files
+
+# ========================================================================================================= #
+
+# process-wide cache of parsed templates
+# key: (template directory, template name), value: [modification times of the template files, FASTTemplate]
+_FAST_template_cache = dict()
+
+# line of the AeroDyn file with the wind file path
+AD_wnd_file_line = 9
+
+# ========================================================================================================= #
+
+class FASTTemplate(object):
+
+    def __init__(self, template_dir, FAST_template_name):
+
+        self.template_dir = template_dir
+        self.FAST_template_name = FAST_template_name
+
+        # file name -> lines
+        self.lines = dict()
+        for ending in case_dir_copy_files:
+            file_name = FAST_template_name + ending
+            f = open(os.path.join(template_dir, file_name), "r")
+            self.lines[file_name] = f.readlines()
+            f.close()
+
+        self.AD_file_name = FAST_template_name + '_AD.ipt'
+
+        # radial nodes of the AeroDyn file (RNodes, AeroTwst, DRNodes, Chord, NFoil, PrnElm)
+        if FAST_template_name == 'NREL5MW':
+            self.node_lines = range(28, 45)
+        else:
+            self.node_lines = range(24, 41)
+
+        DR_nodes = []
+        DRNodes = []
+        for i in self.node_lines:
+            values = re.findall(r"[-+]?\d+[\.]?\d*[eE]?[-+]?\d*", self.lines[self.AD_file_name][i].strip('\n'))
+            DR_nodes.append(float(values[0]))
+            DRNodes.append(float(values[2]))
+
+        self.DR_nodes = np.array(DR_nodes)
+        self.DRNodes = np.array(DRNodes)
+
+    def case_files(self, wnd_file_path, print_elements=False):
+
+        # print_elements - set PrnElm of every node to PRINT (AeroDyn element outputs, see FAST_span_loads.py)
+
+        # file name -> contents of the case files
+        case_files = dict()
+        for file_name in self.lines:
+            lines = self.lines[file_name]
+            if file_name == self.AD_file_name:
+                lines = list(lines)
+                lines[AD_wnd_file_line] = wnd_file_path + '\n'
+                if print_elements:
+                    for i in self.node_lines:
+                        lines[i] = lines[i].replace('NOPRINT', 'PRINT')
+            case_files[file_name] = ''.join(lines)
+
+        return case_files
+
+# ========================================================================================================= #
+
+def FAST_template_mtimes(template_dir, FAST_template_name):
+
+    return [os.path.getmtime(os.path.join(template_dir, FAST_template_name + ending))
+            for ending in case_dir_copy_files]
+
+# ========================================================================================================= #
+
+def load_FAST_template(template_dir, FAST_template_name):
+
+    # parsed template, re-read only when a template file changed
+    key = (os.path.abspath(template_dir), FAST_template_name)
+    mtimes = FAST_template_mtimes(template_dir, FAST_template_name)
+
+    if key in _FAST_template_cache and _FAST_template_cache[key][0] == mtimes:
+        return _FAST_template_cache[key][1]
+
+    template = FASTTemplate(template_dir, FAST_template_name)
+    _FAST_template_cache[key] = [mtimes, template]
+
+    return template
+
+# ========================================================================================================= #
+
+def write_case_files(case_dir, case_files):
+
+    for file_name in case_files:
+
+        path = os.path.join(case_dir, file_name)
+
+        # never write through a link into the template
+        if os.path.islink(path) or (os.path.isfile(path) and os.stat(path).st_nlink > 1):
+            os.remove(path)
+
+        f = open(path, "w")
+        f.write(case_files[file_name])
+        f.close()
@@ -3,13 +3,22 @@
 
 from openmdao.api import Problem
 import numpy as np
-import matplotlib.pyplot as plt
 import sys
 import os
 import random
 import re
 import shutil
-from akima import Akima
+from collections import OrderedDict
+from FAST_span_loads import span_load_channels
+
+# ========================================================================================================= #
+
+# strain gage nodes of each strain gage group (FASTinfo['sgp']), at most 7 per FAST v7 run
+sgp_gage_nodes = {1: [1, 2, 3, 4, 5, 6, 7], 2: [8, 9, 10, 11, 12, 13, 14], 3: [15, 16, 17],
+                  4: [1, 3, 5, 7, 9, 12, 17]}
+
+# strain gages of the single run per wind file of the spanwise load reconstruction
+span_gage_nodes = sgp_gage_nodes[4]
 
 # ========================================================================================================= #
 
@@ -105,6 +114,21 @@ def setupFAST(FASTinfo, description):
     #                         'FAST_Files/FAST_File_templates/' + FASTinfo['FAST_template_name'] + '/'
     FASTinfo['template_dir'] = FASTinfo['path'] + 'blade_damage/src/blade_damage/FAST_Files/FAST_File_templates/' + FASTinfo['FAST_template_name'] + '/'
 
+    # how the template is set up in each FAST case directory
+    # 'hardlink', 'symlink' - only the .fst, _AD.ipt, _Blade.dat files are copied, other files are linked
+    # 'copy' - the whole template is copied (see FAST_case_dir.py)
+    FASTinfo['case_dir_mode'] = 'hardlink'
+
+    # cache of the reduced FAST results (DEMs, extreme loads, tip deflection, rainflow peaks), keyed on the FAST
+    # input files, wind file and executable, shared by all optimizations (see FAST_cache.py)
+    FASTinfo['use_FAST_cache'] = False
+    FASTinfo['FAST_cache_dir'] = FASTinfo['path'] + 'blade_damage/src/blade_damage/FAST_Files/FAST_cache'
+    FASTinfo['FAST_cache_max_size'] = 2.0e9  # bytes, least recently used entries are removed
+
+    # (the checks of the FAST time series need the FAST outputs)
+    if FASTinfo['check_results'] or FASTinfo['check_rainflow']:
+        FASTinfo['use_FAST_cache'] = False
+
     # === get FAST executable === #
     FASTinfo = get_FAST_executable(FASTinfo)
 
@@ -168,8 +192,29 @@ def setupFAST(FASTinfo, description):
             plot_kfolds(FASTinfo)
 
     # === strain gage placement === #
-    FASTinfo['sgp'] = [1, 2, 3]
-    # FASTinfo['sgp'] = [4]
+
+    # one FAST run per wind file (strain gages over the entire blade), the moments at the other blade nodes are
+    # reconstructed from the AeroDyn element forces (see FAST_span_loads.py); otherwise each wind file is run once
+    # for each strain gage group
+    # the moments at 10 of the 17 nodes are estimates. Measured error per node: none yet (no turbine / DLC set has
+    # been run both ways). Before using this mode, run the cases both ways and measure the DEM and extreme load
+    # errors of each node with check_span_loads.py (writes <opt_dir>/span_load_check.txt / .json);
+    # CreateFASTConstraints refuses the reconstructed loads unless the largest measured error at a reconstructed
+    # node is within span_load_max_error
+    FASTinfo['reconstruct_span_loads'] = False
+
+    # error budget of the reconstruction: largest relative error of the DEMs / extreme loads at a reconstructed node
+    FASTinfo['span_load_max_error'] = 0.05
+
+    if FASTinfo['reconstruct_span_loads']:
+        FASTinfo['sgp'] = [4]
+
+        for channel in span_load_channels:
+            if channel not in FASTinfo['output_list']:
+                FASTinfo['output_list'].append(channel)
+    else:
+        FASTinfo['sgp'] = [1, 2, 3]
+        # FASTinfo['sgp'] = [4]
 
     #for each position
     FASTinfo['NBlGages'] = []
@@ -178,21 +223,21 @@ def setupFAST(FASTinfo, description):
 
     if 1 in FASTinfo['sgp']:
         FASTinfo['NBlGages'].append(7)  # number of strain gages (max is 7)
-        FASTinfo['BldGagNd'].append([1, 2, 3, 4, 5, 6, 7])  # strain gage positions
-        FASTinfo['BldGagNd_config'].append([1, 2, 3, 4, 5, 6, 7])  # strain gage positions
+        FASTinfo['BldGagNd'].append(list(sgp_gage_nodes[1]))  # strain gage positions
+        FASTinfo['BldGagNd_config'].append(list(sgp_gage_nodes[1]))  # strain gage positions
     if 2 in FASTinfo['sgp']:
         FASTinfo['NBlGages'].append(7)  # number of strain gages (max is 7)
-        FASTinfo['BldGagNd'].append([8, 9, 10, 11, 12, 13, 14])  # strain gage positions
-        FASTinfo['BldGagNd_config'].append([8, 9, 10, 11, 12, 13, 14])  # strain gage positions
+        FASTinfo['BldGagNd'].append(list(sgp_gage_nodes[2]))  # strain gage positions
+        FASTinfo['BldGagNd_config'].append(list(sgp_gage_nodes[2]))  # strain gage positions
     if 3 in FASTinfo['sgp']:
         FASTinfo['NBlGages'].append(3)  # number of strain gages (max is 7)
-        FASTinfo['BldGagNd'].append([15, 16, 17])  # strain gage positions
-        FASTinfo['BldGagNd_config'].append([15, 16, 17])  # strain gage positions
+        FASTinfo['BldGagNd'].append(list(sgp_gage_nodes[3]))  # strain gage positions
+        FASTinfo['BldGagNd_config'].append(list(sgp_gage_nodes[3]))  # strain gage positions
     if 4 in FASTinfo['sgp']:
         # over entire range
         FASTinfo['NBlGages'].append(7)  # number of strain gages (max is 7)
-        FASTinfo['BldGagNd'].append([1, 3, 5, 7, 9, 12, 17])  # strain gage positions
-        FASTinfo['BldGagNd_config'].append([1, 3, 5, 7, 9, 12, 17])  # strain gage positions
+        FASTinfo['BldGagNd'].append(list(span_gage_nodes))  # strain gage positions
+        FASTinfo['BldGagNd_config'].append(list(span_gage_nodes))  # strain gage positions
 
     # === specify which DLCs will be included (for calc_fixed_DEMs === #
     FASTinfo = specify_DLCs(FASTinfo)
@@ -230,6 +275,27 @@ def setupFAST_other(FASTinfo):
     # turns off/on print statements from smt (surrogate model toolbox)
     FASTinfo['print_sm'] = False
 
+    # get surrogate model predictions from a running sm_server.py process (falls back to loading models in
+    # this process if the server is not running); sm_server_address - socket file of the server, None - the default
+    # socket in the per-user directory of sm_server.py
+    FASTinfo['use_sm_server'] = False
+    FASTinfo['sm_server_address'] = None
+
+    # number of surrogate model predictions kept for repeated design points (0 - off), and the tolerance used to
+    # compare design points (0.0 - exact match)
+    FASTinfo['sm_memo_size'] = 128
+    FASTinfo['sm_memo_tol'] = 0.0
+
+    # trust region surrogate model management (run_trust_region.py) - surrogate model outputs are corrected to match
+    # FAST at the trust region center ('additive', 'multiplicative'); sm_correction, tr_bounds are set by the
+    # trust region iterations (None - no correction, full design variable domains)
+    FASTinfo['sm_correction'] = None
+    FASTinfo['sm_correction_type'] = 'additive'
+    FASTinfo['tr_bounds'] = None
+    FASTinfo['tr_radius_init'] = 0.25
+    FASTinfo['tr_radius_min'] = 1e-3
+    FASTinfo['tr_max_iter'] = 20
+
     # use this when calculating DEMs for fixed-DEMs calculation
     FASTinfo['remove_fixedcalc_dir'] = True
     FASTinfo['remove_unnecessary_files'] = True
@@ -509,6 +575,8 @@ def kfold_params(FASTinfo):
 
 def plot_kfolds(FASTinfo):
 
+    import matplotlib.pyplot as plt
+
     point_file = FASTinfo['opt_dir'] + '/pointfile.txt'
 
     f = open(point_file, "r")
@@ -692,13 +760,57 @@ def create_surr_model_params(FASTinfo):
     # total number of points (lhs)
     FASTinfo['num_pts'] = 1000
 
+    # adaptive sampling - start with num_pts_init lhs points, then add points where the cross-validated error of
+    # the fit is largest (up to num_pts total, see create_sm.py and sm_adaptive.py)
+    FASTinfo['adaptive_sampling'] = False
+    FASTinfo['num_pts_init'] = 50
+
     # approximation model
     # implemented options - second_order_poly, least_squares, kriging, KPLS, KPLSK, RBF (radial basis functions)
     FASTinfo['approximation_model'] = 'RBF'
 
+    # file type of the created surrogate models
+    # 'pkl' - pickled smt object (second_order_poly, least_squares only)
+    # 'smb' - binary file with only the values needed for prediction (any approximation model, opt-in; .pkl fits
+    #         are not read when set, so they are trained again)
+    FASTinfo['sm_file_type'] = 'pkl'
+
+    # train / evaluate the DEM and extreme load fits as one model (second_order_poly, least_squares, RBF with .smb
+    # files only, other approximation models are always fit separately); the fused fits are computed with numpy
+    # (sm_artifact.fit_fused_sm) instead of smt
+    FASTinfo['fused_sm'] = False
+
+    # how training points are recorded (lhs only)
+    # 'txt' - one sm_<ft>_<i>.txt file per point and output type, merged with FAST_Files/remove_results_files.py
+    # 'bin' - one shard file per point, compacted into sm_store.bin (no clean up script needed, see sm_store.py)
+    # 'db' - rows of sm_training.db (SQLite), shared by parallel jobs and merged with sm_db.py (WAL mode on local
+    #        disks only, see sm_db.py for network / cluster file systems)
+    FASTinfo['sm_training_store'] = 'txt'
+
+    # number of processes used to train the surrogate models that are not fused (1 - serial, 0 - one per core),
+    # and whether each output column gets its own model (trained in its own process)
+    FASTinfo['sm_train_procs'] = 1
+    FASTinfo['sm_train_per_column'] = False
+
+    # update the saved surrogate models when training points are added, instead of fitting them from scratch
+    # (fused second_order_poly, least_squares, RBF - exact update of the saved factorization; kriging, KPLS -
+    # hyperparameter optimization starts from the previous hyperparameters, see sm_update.py)
+    FASTinfo['sm_incremental'] = False
+
+    # fit the surrogate models to the principal component scores of each output block (DEMx, DEMy, Edg, Flp
+    # spanwise distributions), and reconstruct the distributions when predicting; sm_pca_components is the number
+    # of components per block, or (< 1) the fraction of the variance of the standardized outputs that is kept
+    FASTinfo['sm_pca'] = False
+    FASTinfo['sm_pca_components'] = 0.9999
+
     # initial hyper-parameter value (kriging, KPLS, KPLSK only use)
     FASTinfo['theta0_val'] = [1e-2]
 
+    # choose the hyperparameters (RBF d0, kriging theta0, KPLS / KPLSK theta0 and number of components) by a cross
+    # validated grid search before the fit; scores are cached, so a repeated search only fits new candidates
+    # (see sm_hyper.py). When False, the settings saved by an earlier search (sm_hyper_<model>.json) are used
+    FASTinfo['sm_hyper_search'] = False
+
     # training point distribution
     FASTinfo['training_point_dist'] = 'lhs'
 
@@ -711,6 +823,9 @@ def create_surr_model_params(FASTinfo):
         FASTinfo['sm_DEM_file_master'] = FASTinfo['sm_var_out_dir'] + '/' + 'sm_master_DEM.txt'
         FASTinfo['sm_load_file_master'] = FASTinfo['sm_var_out_dir'] + '/' + 'sm_master_load.txt'
         FASTinfo['sm_def_file_master'] = FASTinfo['sm_var_out_dir'] + '/' + 'sm_master_def.txt'
+
+        FASTinfo['sm_store_file'] = FASTinfo['sm_var_out_dir'] + '/' + 'sm_store.bin'
+        FASTinfo['sm_db_file'] = FASTinfo['sm_var_out_dir'] + '/' + 'sm_training.db'
     else:
         FASTinfo['sm_var_file'] = 'sm_var.txt'
         FASTinfo['sm_DEM_file'] = 'sm_DEM.txt'
@@ -902,7 +1017,10 @@ def create_surr_model_lhs_options(FASTinfo, rotor):
     if not os.path.isfile(point_file):
         print('Creating training point file...')
 
-        points = lhs(num_var, samples=FASTinfo['num_pts'], criterion='center')
+        if FASTinfo['adaptive_sampling']:
+            points = lhs(num_var, samples=FASTinfo['num_pts_init'], criterion='center')
+        else:
+            points = lhs(num_var, samples=FASTinfo['num_pts'], criterion='center')
 
         f = open(point_file,"w+")
 
@@ -916,7 +1034,8 @@ def create_surr_model_lhs_options(FASTinfo, rotor):
 
     lines = open(point_file,"r+").readlines()
 
-    points = np.zeros([FASTinfo['num_pts'], num_var])
+    # (the point file can have more points than num_pts_init when adaptive sampling is used)
+    points = np.zeros([len(lines), num_var])
     for i in range(0, len(lines)):
         spec_line = lines[i].strip('\n').split()
         for j in range(0, len(spec_line)):
@@ -998,6 +1117,8 @@ def create_surr_model_lhs_options(FASTinfo, rotor):
     if FASTinfo['check_var_domains']:
 
         # chord_sub domain plot
+        import matplotlib.pyplot as plt
+
         plt.figure()
         j = 1
 
@@ -1081,6 +1202,8 @@ def create_surr_model_lhs_options(FASTinfo, rotor):
             #
             cv_points[:, i] = cv_points[:, i] * (var_range[1] - var_range[0]) + var_range[0]
 
+        import matplotlib.pyplot as plt
+
         plt.figure()
 
         plt.title('Latin Hypercube Cross Validation Example')
@@ -1101,6 +1224,8 @@ def create_surr_model_lhs_options(FASTinfo, rotor):
 
     if FASTinfo['check_point_dist']:
 
+        import matplotlib.pyplot as plt
+
         plt.figure()
 
         plt.title('Latin Hypercube Sampling Example')
@@ -1146,7 +1271,10 @@ def create_surr_model_lhs_options(FASTinfo, rotor):
 
 # ========================================================================================================= #
 
-def define_des_var_domains(FASTinfo, rotor):
+def des_var_domains(FASTinfo):
+
+    # lower, upper bounds of each design variable, from the domain_<name>.txt files in opt_dir
+    domains = OrderedDict()
 
     for i in range(len(FASTinfo['sm_var_names'])):
 
@@ -1161,16 +1289,37 @@ def define_des_var_domains(FASTinfo, rotor):
             lower_array = np.zeros(int((len(des_var)-1)/2.0))
             upper_array = np.zeros(int((len(des_var)-1)/2.0))
 
-            for j in range(1, (len(des_var)+1)/2):
+            for j in range(1, int((len(des_var)+1)/2)):
                 lower_array[j-1] = float(des_var[2*j-1].strip('\n'))
                 upper_array[j-1] = float(des_var[2*j].strip('\n'))
 
-            rotor.driver.add_desvar(des_var_name, lower=lower_array, upper=upper_array)
+            domains[des_var_name] = [lower_array, upper_array]
 
         else:
-            # rotor.driver.add_desvar('r_max_chord', lower=0.1, upper=0.5)
-            rotor.driver.add_desvar('chord_sub', lower=1.3 * np.ones(4), upper=5.3 * np.ones(4))
-            rotor.driver.add_desvar('theta_sub', lower=-10.0 * np.ones(4), upper=30.0 * np.ones(4))
+            # domains['r_max_chord'] = [0.1, 0.5]
+            if 'chord_sub' not in domains:
+                domains['chord_sub'] = [1.3 * np.ones(4), 5.3 * np.ones(4)]
+            if 'theta_sub' not in domains:
+                domains['theta_sub'] = [-10.0 * np.ones(4), 30.0 * np.ones(4)]
+
+    return domains
+
+# ========================================================================================================= #
+
+def define_des_var_domains(FASTinfo, rotor):
+
+    domains = des_var_domains(FASTinfo)
+
+    for des_var_name in domains:
+
+        lower_array, upper_array = domains[des_var_name]
+
+        # optimization inside the trust region (run_trust_region.py)
+        if FASTinfo['tr_bounds'] is not None and des_var_name in FASTinfo['tr_bounds']:
+            lower_array = np.maximum(lower_array, FASTinfo['tr_bounds'][des_var_name][0])
+            upper_array = np.minimum(upper_array, FASTinfo['tr_bounds'][des_var_name][1])
+
+        rotor.driver.add_desvar(des_var_name, lower=lower_array, upper=upper_array)
 
     return FASTinfo, rotor
 
@@ -1379,22 +1528,20 @@ def Calc_max_DEMs(FASTinfo, rotor):
 
     for i in range(0, len(FASTinfo['wnd_list'])):
 
-        DEMrange = [0, 1, 8, 15]
-        sgp_range = [1, 1, 2, 3]
+        if FASTinfo['reconstruct_span_loads']:
+            # all blade nodes in sgp4
+            DEMrange = [0, 1]
+            sgp_range = [4, 4]
+        else:
+            DEMrange = [0, 1, 8, 15]
+            sgp_range = [1, 1, 2, 3]
 
         lines_x = []
         lines_y = []
 
         for j in DEMrange:
 
-            if j == DEMrange[0]:
-                sgp = sgp_range[0]
-            elif j == DEMrange[1]:
-                sgp = sgp_range[1]
-            elif j == DEMrange[2]:
-                sgp = sgp_range[2]
-            elif j == DEMrange[3]:
-                sgp = sgp_range[3]
+            sgp = sgp_range[DEMrange.index(j)]
 
             # spec_wnd_dir = FASTinfo['description'] + '/' + 'sgp' + str(sgp) + '/' + caseids[i - 1] + '_sgp' + str(sgp)
             spec_wnd_dir = FASTinfo['description'] + '/' + 'sgp' + str(sgp) + '/' + caseids[i] + '_sgp' + str(sgp)
@@ -1419,11 +1566,11 @@ def Calc_max_DEMs(FASTinfo, rotor):
         xDEM = []
         yDEM = []
 
-        for j in range(0, 4):
+        for j in range(0, len(DEMrange)):
             for k in range(0, len(lines_x[j])):
                 xDEM.append(float(lines_x[j][k]))
 
-        for j in range(0, 4):
+        for j in range(0, len(DEMrange)):
             for k in range(0, len(lines_y[j])):
                 yDEM.append(float(lines_y[j][k]))
 
@@ -1438,6 +1585,8 @@ def Calc_max_DEMs(FASTinfo, rotor):
 
     if FASTinfo['createDEMplot']:
 
+        import matplotlib.pyplot as plt
+
         plt.figure()
         plt.xlabel('strain gage position')
         plt.ylabel('DEM (kN*m)')
@@ -1562,6 +1711,8 @@ def Use_FAST_DEMs(FASTinfo, rotor):
 
 def plot_DEMs(rotor, FASTinfo):
 
+    import matplotlib.pyplot as plt
+
     print(rotor['Mxb_damage']/1000.0)
     print(rotor['Myb_damage']/1000.0)
     print(rotor['rstar_damage'])
@@ -1663,7 +1814,7 @@ def remove_fixcalc_unnecessary_files(FASTinfo):
                 pass
 
             file_list = ['/fst_runfile.fsm', '/fst_runfile.fst', '/fst_runfile.opt', '/fst_runfile.out',
-                         '/fst_runfile.outb', '/fst_runfile_ADAMS.acf', '/fst_runfile_ADAMS.acf',
+                         '/fst_runfile.outb', '/fst_runfile.elm', '/fst_runfile_span.out', '/fst_runfile_ADAMS.acf', '/fst_runfile_ADAMS.acf',
                          '/fst_runfile_ADAMS.adm', '/fst_runfile_ADAMS_LIN.acf',
                          '/' + FASTinfo['FAST_template_name'] + '_ADAMSSpecific.dat',
                          '/' + FASTinfo['FAST_template_name'] + '_AD.ipt',
@@ -1684,6 +1835,9 @@ def remove_fixcalc_unnecessary_files(FASTinfo):
 
 def test_dif_turbine(FASTinfo, rotor, turbine_name):
 
+    from akima import Akima
+    import matplotlib.pyplot as plt
+
     if turbine_name == 'TUM335MW':
 
         # number of blades
@@ -0,0 +1,161 @@
+import os
+import numpy as np
+from FAST_util import setupFAST, sgp_gage_nodes, span_gage_nodes
+from FAST_template import FASTTemplate
+from FAST_span_loads import read_FAST_out, reconstruct_FAST_span_loads, FAST_gage_channels, span_load_errors, \
+    save_span_load_check, span_load_check_file_name, span_load_quantities
+
+# this script measures the error of the spanwise load reconstruction (FASTinfo['reconstruct_span_loads'], see
+# FAST_span_loads.py) against the moments FAST outputs when each wind file is run once per strain gage group.
+# Both sets of cases need to exist in <opt_dir>: sgp1, sgp2, sgp3 (reconstruct_span_loads = False) and sgp4
+# (reconstruct_span_loads = True, with fst_runfile.elm). For each station (root and blade nodes 1 to 17), the DEMs
+# (same rainflow counting as CreateFASTConstraints) and extreme loads (maximum absolute moment) of the reconstructed
+# moments are compared to those of the measured moments, and the maximum / rms relative error over the wind files
+# is printed and saved in <opt_dir>/span_load_check.txt. The errors are also saved in <opt_dir>/span_load_check.json,
+# which CreateFASTConstraints checks against FASTinfo['span_load_max_error'] before it uses the reconstruction
+
+# ========================================================================================================= #
+
+def FAST_out_DEMs(file_name, channel_names, FASTinfo, Tmax):
+
+    # DEMs of the given channels of a FAST text output file, same settings as CreateFASTConstraints
+    from rainflow import do_rainflow
+
+    header_lines, names, data = read_FAST_out(file_name)
+
+    output_array = [names.index(name) for name in channel_names]
+    SNslope = FASTinfo['m_value'] * np.ones([1, len(output_array)])
+
+    allres, peaks_list, orig_data, rm_data, data_name = \
+        do_rainflow([file_name], output_array, SNslope, FASTinfo['dir_saved_plots'], Tmax, FASTinfo['dT'],
+                    FASTinfo['rm_time'], False)
+
+    return np.array([allres[0][n][0] for n in range(len(output_array))])
+
+# ========================================================================================================= #
+
+def extreme_loads(file_name, channel_names):
+
+    header_lines, names, data = read_FAST_out(file_name)
+
+    return np.array([np.max(np.abs(data[:, names.index(name)])) for name in channel_names])
+
+# ========================================================================================================= #
+
+if __name__ == "__main__":
+
+    FASTinfo = dict()
+
+    FASTinfo['calc_fixed_DEMs'] = False
+    FASTinfo['calc_fixed_DEMs_seq'] = False
+    FASTinfo['calc_surr_model'] = False
+    FASTinfo['opt_with_surr_model'] = False
+
+    FASTinfo['opt_without_FAST'] = True
+    FASTinfo['opt_with_FAST_in_loop'] = False
+    FASTinfo['opt_with_fixed_DEMs'] = False
+    FASTinfo['opt_with_fixed_DEMs_seq'] = False
+
+    FASTinfo['opt_with_fatigue'] = False
+
+    description = 'test_new'
+
+    FASTinfo, blade_damage = setupFAST(FASTinfo, description)
+
+    # stations: root (0), then every blade node
+    num_stations = 18
+
+    results = dict()
+    for quantity in span_load_quantities:
+        results[quantity] = [[], []]
+
+    for i in range(len(FASTinfo['wnd_list'])):
+
+        caseid = 'WNDfile' + str(i + 1)
+
+        if FASTinfo['wnd_type_list'][i] == 'turb':
+            Tmax = FASTinfo['Tmax_turb']
+        else:
+            Tmax = FASTinfo['Tmax_nonturb']
+
+        # === reconstructed moments (one run) === #
+        span_dir = FASTinfo['opt_dir'] + '/sgp4/' + caseid + '_sgp4'
+        if not os.path.isdir(span_dir):
+            raise Exception('Could not find ' + span_dir + ', run the cases with reconstruct_span_loads first.')
+
+        case_template = FASTTemplate(span_dir, FASTinfo['FAST_template_name'])
+        span_file, span_channels = reconstruct_FAST_span_loads(span_dir, case_template.DR_nodes,
+                                                               case_template.DRNodes, span_gage_nodes)
+
+        span_x, span_y = FAST_gage_channels(list(range(1, num_stations)))
+
+        # === measured moments (one run per strain gage group) === #
+        meas = dict()
+        for quantity in results:
+            meas[quantity] = np.zeros(num_stations)
+        span = dict()
+        for quantity in results:
+            span[quantity] = np.zeros(num_stations)
+
+        for sgp in [1, 2, 3]:
+
+            sgp_dir = FASTinfo['opt_dir'] + '/sgp' + str(sgp) + '/' + caseid + '_sgp' + str(sgp)
+            meas_file = sgp_dir + '/fst_runfile.out'
+            if not os.path.isfile(meas_file):
+                raise Exception('Could not find ' + meas_file + ', run the cases with reconstruct_span_loads = False '
+                                'first.')
+
+            meas_x, meas_y = FAST_gage_channels(sgp_gage_nodes[sgp])
+            stations = sorted(meas_x.keys())
+
+            meas['DEMx'][stations] = FAST_out_DEMs(meas_file, [meas_x[s] for s in stations], FASTinfo, Tmax)
+            meas['DEMy'][stations] = FAST_out_DEMs(meas_file, [meas_y[s] for s in stations], FASTinfo, Tmax)
+            meas['Edg'][stations] = extreme_loads(meas_file, [meas_x[s] for s in stations])
+            meas['Flp'][stations] = extreme_loads(meas_file, [meas_y[s] for s in stations])
+
+            span['DEMx'][stations] = FAST_out_DEMs(span_file, [span_x[s] for s in stations], FASTinfo, Tmax)
+            span['DEMy'][stations] = FAST_out_DEMs(span_file, [span_y[s] for s in stations], FASTinfo, Tmax)
+            span['Edg'][stations] = extreme_loads(span_file, [span_x[s] for s in stations])
+            span['Flp'][stations] = extreme_loads(span_file, [span_y[s] for s in stations])
+
+        for quantity in results:
+            results[quantity][0].append(meas[quantity])
+            results[quantity][1].append(span[quantity])
+
+    # === error table === #
+    errors = dict()
+    for quantity in results:
+        errors[quantity] = span_load_errors(results[quantity][0], results[quantity][1])
+
+    lines = ['%-8s %-9s %12s %12s %12s %12s %12s %12s %12s %12s'
+             % ('station', 'measured', 'DEMx max', 'DEMx rms', 'DEMy max', 'DEMy rms', 'Edg max', 'Edg rms',
+                'Flp max', 'Flp rms')]
+    for s in range(num_stations):
+
+        # root and strain gages of the sgp4 run are FAST outputs, the other nodes are reconstructed
+        measured = s == 0 or s in span_gage_nodes
+
+        values = []
+        for quantity in span_load_quantities:
+            values += [errors[quantity][0][s] * 100.0, errors[quantity][1][s] * 100.0]
+
+        lines.append('%-8s %-9s ' % (['root', str(s)][s > 0], ['no', 'yes'][measured])
+                     + ' '.join(['%12.4f' % value for value in values]))
+
+    # stations of the reconstructed moments
+    reconstructed = [s for s in range(num_stations) if not (s == 0 or s in span_gage_nodes)]
+
+    for quantity in span_load_quantities:
+        lines.append('largest ' + quantity + ' error at a reconstructed node: '
+                     + '%.4f' % (np.max(errors[quantity][0][reconstructed]) * 100.0) + ' %')
+
+    table = 'Relative error (%) of the reconstructed spanwise loads, ' + str(len(FASTinfo['wnd_list'])) \
+        + ' wind files\n' + '\n'.join(lines) + '\n'
+    print(table)
+
+    f = open(FASTinfo['opt_dir'] + '/span_load_check.txt', "w+")
+    f.write(table)
+    f.close()
+
+    save_span_load_check(FASTinfo['opt_dir'] + '/' + span_load_check_file_name, errors, reconstructed,
+                         len(FASTinfo['wnd_list']))
@@ -0,0 +1,104 @@
+import os
+import numpy as np
+from FAST_util import setupFAST
+from sm_util import load_sm_training_data, use_fused_sm
+from sm_train import compare_sm_models, sm_comparison_table, sm_approximation_models
+
+# this script compares the approximation models of the surrogate model (and numbers of training points) in one run:
+# the training points are loaded once, each model is cross validated on the same folds (in parallel processes), and
+# one table of rms / max error, training time and prediction time per model is printed and saved in
+# <opt_dir>/sm_comparison.txt (replaces a run with do_cv_DEM / do_cv_Load per approximation model, and
+# FAST_Files/plot_cv_errors.py). Models that are deployed as fused fits (FASTinfo['fused_sm'], see use_fused_sm) are
+# compared as fused fits.
+
+approximation_models = sm_approximation_models
+
+# numbers of training points, as fractions of FASTinfo['num_pts'] (first num_pts points; rounded down to a multiple
+# of num_folds, and to the number of training points found)
+num_pts_fractions = [0.1, 0.5, 1.0]
+num_folds = 5
+
+# number of processes (0 - one per core)
+num_procs = 0
+
+# outputs that are compared
+# 'DEM' - DEMx, DEMy, 'load' - Edg, Flp
+compare_outputs = ['DEM', 'load']
+
+if __name__ == "__main__":
+
+    FASTinfo = dict()
+
+    FASTinfo['calc_fixed_DEMs'] = False
+    FASTinfo['calc_fixed_DEMs_seq'] = False
+    FASTinfo['calc_surr_model'] = False
+    FASTinfo['opt_with_surr_model'] = True
+
+    FASTinfo['opt_without_FAST'] = False
+    FASTinfo['opt_with_FAST_in_loop'] = False
+    FASTinfo['opt_with_fixed_DEMs'] = False
+    FASTinfo['opt_with_fixed_DEMs_seq'] = False
+
+    FASTinfo['opt_with_fatigue'] = False
+
+    description = 'trained_data'
+
+    FASTinfo, blade_damage = setupFAST(FASTinfo, description)
+
+    # get rated torque
+    rated_tq_file = FASTinfo['opt_dir'] + '/rated_tq.txt'
+    if os.path.isfile(rated_tq_file):
+        f = open(rated_tq_file, "r")
+        lines = f.readlines()
+        rated_tq = float(lines[0])
+        f.close()
+    else:
+        raise Exception('Could not find rated torque file.')
+
+    # === training points (loaded once) === #
+    xt, yt_x, yt_y, yt_x_load, yt_y_load, yt_def = \
+        load_sm_training_data(FASTinfo, FASTinfo['num_pts'], rated_tq, FASTinfo['bladeLength'])
+
+    num_pts_list = []
+    for fraction in num_pts_fractions:
+        num_pts = min(int(fraction * FASTinfo['num_pts']), len(xt))
+        num_pts = num_pts - num_pts % num_folds
+        if num_pts >= num_folds and num_pts not in num_pts_list:
+            num_pts_list.append(num_pts)
+
+    if len(num_pts_list) == 0:
+        raise Exception('Only ' + str(len(xt)) + ' training points found, at least ' + str(num_folds)
+                        + ' needed.')
+
+    print('Training points: ' + str(len(xt)) + ' found, compared with ' + ', '.join(map(str, num_pts_list)))
+
+    # models fit with fit_fused_sm in calc_FAST_sm_fit (same settings as the deployed fits)
+    fused_models = []
+    for approximation_model in approximation_models:
+        if use_fused_sm(dict(FASTinfo, approximation_model=approximation_model)):
+            fused_models.append(approximation_model)
+
+    names = []
+    yt_list = []
+    if 'DEM' in compare_outputs:
+        names += ['DEMx', 'DEMy']
+        yt_list += [yt_x, yt_y]
+    if 'load' in compare_outputs:
+        names += ['Edg', 'Flp']
+        yt_list += [yt_x_load, yt_y_load]
+
+    rows = compare_sm_models(approximation_models, names, xt, yt_list, num_pts_list, num_folds,
+                             FASTinfo['theta0_val'], num_procs, fused_models=fused_models)
+
+    table = sm_comparison_table(rows)
+    print(table)
+
+    f = open(FASTinfo['opt_dir'] + '/sm_comparison.txt', "w+")
+    f.write(table)
+    f.close()
+
+    # most accurate model
+    rms_error = np.array([row['rms_error'] for row in rows])
+    if np.any(np.isfinite(rms_error)):
+        best = rows[int(np.nanargmin(rms_error))]
+        print('Lowest rms error: ' + best['approximation_model'] + ' (' + str(best['num_pts']) + ' points)')
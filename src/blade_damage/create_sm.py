@@ -25,6 +25,54 @@ filename = "test_FAST_DEMs.py"
 #         os.system("python " + filename + " " + str(i) + " " + str(j))
 
 # === lhs surrogate model === #
-total_pts = 4
-for i in range(0, total_pts):
-    os.system("python " + filename + " " + str(i))
+# (with adaptive sampling, set FASTinfo['adaptive_sampling'] = True in create_surr_model_params so the first
+# point file only has num_pts_init points; the initial / maximum number of points, approximation model, training
+# point store and directories are read from the FASTinfo set up by FAST_util.py)
+adaptive_sampling = False
+
+if not adaptive_sampling:
+
+    total_pts = 4
+    for i in range(0, total_pts):
+        os.system("python " + filename + " " + str(i))
+
+else:
+
+    from FAST_util import setupFAST
+    from sm_adaptive import adaptive_sampling_step, merge_sm_point_files
+
+    FASTinfo = dict()
+
+    FASTinfo['calc_fixed_DEMs'] = False
+    FASTinfo['calc_fixed_DEMs_seq'] = False
+    FASTinfo['calc_surr_model'] = False
+    FASTinfo['opt_with_surr_model'] = True
+
+    FASTinfo['opt_without_FAST'] = False
+    FASTinfo['opt_with_FAST_in_loop'] = False
+    FASTinfo['opt_with_fixed_DEMs'] = False
+    FASTinfo['opt_with_fixed_DEMs_seq'] = False
+
+    FASTinfo['opt_with_fatigue'] = False
+
+    # same description as the training script
+    description = 'test_5MW'
+
+    FASTinfo, blade_damage = setupFAST(FASTinfo, description)
+
+    num_new = 10  # points added per iteration
+    target_rms = 0.05  # cross-validated RMS error (normalized by the standard deviation of each output)
+
+    new_pts = list(range(0, FASTinfo['num_pts_init']))
+    while len(new_pts) > 0:
+
+        for i in new_pts:
+            os.system("python " + filename + " " + str(i))
+
+        # (the bin / db stores need no merging)
+        if FASTinfo['sm_training_store'] == 'txt':
+            merge_sm_point_files(FASTinfo['opt_dir'], FASTinfo['sm_var_out_dir'], new_pts)
+
+        cv_rms_error, new_pts = adaptive_sampling_step(FASTinfo, target_rms, num_new)
+
+        print('Cross-validated RMS error: ' + str(cv_rms_error) + ', adding ' + str(len(new_pts)) + ' points')
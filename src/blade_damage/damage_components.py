@@ -1,17 +1,25 @@
-from openmdao.api import IndepVarComp, Component, Group, ParallelFDGroup
+from openmdao.api import IndepVarComp, Component, Group, ParallelFDGroup, Problem
 import numpy as np
 import sys
 import os
-from distutils.dir_util import copy_tree
-from akima import Akima, akima_interp_with_derivs
-import matlab.engine
 import re
-from scipy import stats
 import os
 import time
-import matplotlib.pyplot as plt
-import pickle
 from enum import Enum
+from sm_artifact import save_sm_artifact, fit_fused_sm, fit_output_pca, stack_output_pca, FusedSM, PCASM
+from sm_train import train_sm_models, cross_validate_sm, cv_error_stats, approximation_sm
+from sm_update import update_fused_sm, warm_start_sm, save_warm_start, sm_state_file_name, sm_warm_start_models
+from sm_hyper import search_sm_hyper, save_sm_hyper, load_sm_hyper, sm_hyper_file_name, sm_hyper_cache_file_name
+from sm_util import sm_name_list, sm_file_name, use_fused_sm, sm_signature, SMMemo, sm_cache_stats, \
+    sm_design_vector, sm_chord_columns, predict_batch, predict_batch_derivatives, load_sm_training_data
+from sm_store import write_sm_shard
+from sm_db import insert_sm_point, sm_db_campaign
+from sm_trust_region import apply_sm_correction
+from FAST_case_dir import create_case_dir
+from FAST_template import load_FAST_template, write_case_files
+from FAST_span_loads import reconstruct_FAST_span_loads, check_span_load_errors
+from FAST_cache import FAST_case_key, FAST_cache_hit_cfg, FAST_cache_entry, FAST_cache_channels, \
+    FAST_cache_run_caseids, prepare_FAST_cache_case, read_FAST_cache_case, put_FAST_cache_entry
 
 # AeroelasticSE
 sys.path.insert(0, '../RotorSE_FAST/AeroelasticSE/src/AeroelasticSE/FAST_mdao')
@@ -34,6 +42,7 @@ class CreateFASTConfig(Component):
         self.NBlGages = FASTinfo['NBlGages']
         self.BldGagNd = FASTinfo['BldGagNd_config']
         self.sgp = FASTinfo['sgp']
+        self.reconstruct_span_loads = FASTinfo['reconstruct_span_loads']
 
         self.nonturb_dir = FASTinfo['nonturb_wnd_dir']
         self.turb_dir = FASTinfo['turb_wnd_dir']
@@ -46,8 +55,18 @@ class CreateFASTConfig(Component):
 
         self.FAST_opt_directory = FASTinfo['opt_dir']
         self.template_dir = FASTinfo['template_dir']
+        self.case_dir_mode = FASTinfo['case_dir_mode']
         self.fst_exe = FASTinfo['fst_exe']
 
+        self.use_FAST_cache = FASTinfo['use_FAST_cache']
+        if self.use_FAST_cache:
+            self.FAST_cache_dir = FASTinfo['FAST_cache_dir']
+
+            # post-processing settings that change the cached results
+            self.FAST_cache_settings = {'m_value': FASTinfo['m_value'],
+                                        'reconstruct_span_loads': FASTinfo['reconstruct_span_loads'],
+                                        'output_list': FASTinfo['output_list']}
+
         self.train_sm = FASTinfo['train_sm']
         if self.train_sm:
             self.sm_dir = FASTinfo['sm_dir']
@@ -114,6 +133,215 @@ class CreateFASTConfig(Component):
         # add_output
         self.add_output('cfg_master', val=dict(),pass_by_obj=False)
 
+    def design_cfg(self, params, template):
+
+        # config values that only depend on the design (blade geometry / structure), computed once for all
+        # strain gage groups and wind files
+
+        from akima import Akima
+
+        cfg = {}
+
+        if self.set_chord_twist:
+
+            # (radial nodes of the AeroDyn template file)
+            DR_nodes = template.DR_nodes
+
+            chord_spline = Akima(np.linspace( 0, 1, len(params['chord_sub']) ), params['chord_sub'])
+            twist_spline = Akima(np.linspace( 0, 1, len(params['theta_sub']) ), params['theta_sub'])
+
+            cfg['Chord'] = chord_spline.interp(np.array(DR_nodes)/self.set_blade_length)[0]
+            cfg['AeroTwst'] = twist_spline.interp(np.array(DR_nodes)/self.set_blade_length)[0]
+
+        elif not self.run_template_files:
+
+            # === general parameters === #
+            cfg['NumBl'] = params['nBlades']
+
+            if hasattr(params['g'], "__len__"):
+                cfg['Gravity'] = params['g'][0]
+            else:
+                cfg['Gravity'] = params['g']
+
+            cfg['RotSpeed'] = params['control:tsr']
+            cfg['TipRad'] = params['FAST_Rtip']
+            cfg['HubRad'] = params['FAST_Rhub']
+            cfg['ShftTilt'] = params['tilt']
+            cfg['PreCone1'] = params['precone']
+            cfg['PreCone2'] = params['precone']
+            cfg['PreCone3'] = params['precone']
+
+            # # Aerodyn File
+
+            # Add DLC .wnd file name to Aerodyn.ipt input file
+            cfg['HH'] = params['hubHt'][0]
+
+            if hasattr(params['rho'], "__len__"):
+                cfg['AirDens'] = params['rho'][0]
+                cfg['KinVisc'] = params['mu'][0] / params['rho'][0]
+            else:
+                cfg['AirDens'] = params['rho']
+                cfg['KinVisc'] = params['mu'] / params['rho']
+
+            # cfg['FoilNm'] = FoilNm
+            cfg['NFoil'] = (params['af_idx'] + np.ones(np.size(params['af_idx']))).astype(int)
+
+            cfg['BldNodes'] = np.size(params['af_idx'])
+
+            # Make akima splines of RNodes/AeroTwst and RNodes/Chord
+            theta_sub_spline = Akima(params['FAST_r_Aero'], params['FAST_Theta_Aero'])
+            chord_sub_spline = Akima(params['FAST_r_Aero'], params['FAST_Chord_Aero'])
+
+            # Redefine RNodes so that DRNodes can be calculated using AeroSubs
+            RNodes = params['FAST_r_Aero']
+            RNodes = np.linspace(RNodes[0], RNodes[-1], len(RNodes))
+
+            cfg['RNodes'] = RNodes
+            # Find new values of AeroTwst and Chord using redefined RNodes
+
+            FAST_Theta = theta_sub_spline.interp(RNodes)[0]
+            FAST_Chord = chord_sub_spline.interp(RNodes)[0]
+
+            cfg['Chord'] = FAST_Chord
+            cfg['AeroTwst'] = FAST_Theta
+
+            DRNodes = np.zeros(np.size(params['af_idx']))
+            for i in range(0, np.size(params['af_idx'])):
+                if i == 0:
+                    DRNodes[i] = 2.0 * (RNodes[0] - params['FAST_Rhub'])
+                else:
+                    DRNodes[i] = 2.0 * (RNodes[i] - RNodes[i - 1]) - DRNodes[i - 1]
+
+            cfg['DRNodes'] = DRNodes
+
+            # # Blade File
+
+            cfg['NBlInpSt'] = len(params['FlpStff'])
+            cfg['BlFract'] = np.linspace(0, 1, len(params['FlpStff']))
+            cfg['AeroCent'] = params['leLoc']
+            cfg['StrcTwst'] = params['FAST_Theta_Str']
+            cfg['BMassDen'] = params['BMassDen']
+
+            cfg['FlpStff'] = params['FlpStff']
+            cfg['EdgStff'] = params['EdgStff']
+            cfg['GJStff'] = params['GJStff']
+            cfg['EAStff'] = params['EAStff']
+
+            # exposed parameters (no corresponding RotorSE parameter)
+            cfg['CalcBMode'] = 'False'
+            cfg['BldFlDmp1'] = 2.477465
+            cfg['BldFlDmp2'] = 2.477465
+            cfg['BldEdDmp1'] = 2.477465
+            cfg['FlStTunr1'] = 1.0
+            cfg['FlStTunr2'] = 1.0
+            cfg['AdjBlMs'] = 1.04536
+            cfg['AdjFlSt'] = 1.0
+            cfg['AdjEdSt'] = 1.0
+
+            # unused parameters (not used by FAST)
+            alpha = 0.5 * np.arctan2(2 * params['EAStff'], params['FlpStff'] - params['EAStff'])
+            for i in range(0, len(alpha)):
+                alpha[i] = min(0.99999, alpha[i])
+            cfg['Alpha'] = alpha
+
+            cfg['PrecrvRef'] = np.zeros(len(params['FlpStff']))
+            cfg['PreswpRef'] = np.zeros(len(params['FlpStff']))
+            cfg['FlpcgOf'] = np.zeros(len(params['FlpStff']))
+            cfg['Edgcgof'] = np.zeros(len(params['FlpStff']))
+            cfg['FlpEAOf'] = np.zeros(len(params['FlpStff']))
+            cfg['EdgEAOf'] = np.zeros(len(params['FlpStff']))
+
+            # compare EI properties (only used for the stiffness spline check)
+            if self.check_stif_spline:
+
+                BladeStructureProperties = np.loadtxt('FAST_Files/RotorSE_InputFiles/BladeStructureProperties.txt')
+
+                # Blade Structural Properties
+                #0 BlFract
+                #1 AeroCent
+                #2 StrcTwst
+                #3 BMassDen
+                #4 FlpStff
+                #5 EdgStff
+                #6 GJStff
+                #7 EAStff
+                #8 Alpha
+                #9 FlpIner
+                #10 EdgIner
+                #11 PrecrvRef
+                #12 PreswpRef
+                #13 FlpcgOf
+                #14 EdgcgOf
+                #15 FlpEAOf
+                #16 EdgEAOf
+
+                # FlpStff, EdgStff, GJStff, EAStff
+                EI_flp_spline = Akima(params['FAST_precurve_Str'], params['FlpStff'])
+                EI_flp = EI_flp_spline.interp(BladeStructureProperties[:, 0])[0]
+
+                EI_edge_spline = Akima(params['FAST_precurve_Str'], params['EdgStff'])
+                EI_edge = EI_edge_spline.interp(BladeStructureProperties[:, 0])[0]
+
+                EI_gj_spline = Akima(params['FAST_precurve_Str'], params['GJStff'])
+                EI_gj = EI_gj_spline.interp(BladeStructureProperties[:, 0])[0]
+
+                EI_ea_spline = Akima(params['FAST_precurve_Str'], params['EAStff'])
+                EI_ea = EI_ea_spline.interp(BladeStructureProperties[:, 0])[0]
+
+                # plots
+                BlFract = BladeStructureProperties[:, 0]
+                FlpStff = BladeStructureProperties[:, 4]
+                EdgStff = BladeStructureProperties[:, 5]
+                GJStff = BladeStructureProperties[:, 6]
+                EAStff = BladeStructureProperties[:, 7]
+
+                import matplotlib.pyplot as plt
+
+                plt.figure()
+                plt.plot(BlFract, EI_flp, label='RotorSE spline')
+                plt.plot(BlFract, FlpStff, label='FAST nominal value')
+                plt.legend()
+                plt.title('FlpStff')
+
+                plt.figure()
+                plt.plot(BlFract, EI_edge, label='RotorSE spline')
+                plt.plot(BlFract, EdgStff, label='FAST nominal value')
+                plt.legend()
+                plt.title('EdgStff')
+
+                plt.figure()
+                plt.plot(BlFract, EI_gj, label='RotorSE spline')
+                plt.plot(BlFract, GJStff, label='FAST nominal value')
+                plt.legend()
+                plt.title('GJStff Stiffness')
+
+                plt.figure()
+                plt.plot(BlFract, EI_ea, label='RotorSE spline')
+                plt.plot(BlFract, EAStff, label='FAST nominal value')
+                plt.legend()
+                plt.title('EAStff Stiffness')
+
+                plt.show()
+
+                quit()
+
+        return cfg
+
+    def FAST_cache_case(self, cfg, case_files, wnd_file_path, FAST_wnd_directory, caseid):
+
+        # looks up the case in the FAST cache; on a hit, the case is marked and RunFASTCases does not run it (see
+        # FAST_cache.py)
+        key = FAST_case_key(self.template_dir, case_files, cfg, wnd_file_path, self.fst_exe, self.FAST_cache_settings)
+
+        entry_file = prepare_FAST_cache_case(self.FAST_cache_dir, key, FAST_wnd_directory)
+        if entry_file is None:
+            print('FAST cache miss: ' + caseid)
+            return
+
+        print('FAST cache hit: ' + caseid)
+
+        cfg[FAST_cache_hit_cfg] = True
+
     def solve_nonlinear(self, params, unknowns, resids):
 
         # create file directory for each surrogate model training point
@@ -134,6 +362,12 @@ class CreateFASTConfig(Component):
         caseids = self.caseids
         cfg_master = {}  # master config dictionary (dictionary of dictionaries)
 
+        # template files, parsed once per process
+        template = load_FAST_template(self.template_dir, self.FAST_template_name)
+
+        # config values shared by all cases of the design
+        design_cfg = self.design_cfg(params, template)
+
         for sgp in range(0,len(self.sgp)):
 
             sgp_dir = FAST_opt_directory + '/' + 'sgp' + str(self.sgp[sgp])
@@ -145,15 +379,24 @@ class CreateFASTConfig(Component):
                 FAST_sgp_directory = sgp_dir
                 FAST_wnd_directory = sgp_dir + '/' + caseids[spec_caseid]
 
+                # === .wnd file location (Aerodyn.ipt file) === #
+                if self.wndfiletype[spec_caseid] == 'turb':
+                    wnd_file_path = self.path + self.turb_dir + self.WNDfile_List[wnd_file]
+                else:
+                    wnd_file_path = self.path + self.nonturb_dir + self.WNDfile_List[wnd_file]
+
+                case_files = template.case_files(wnd_file_path, self.reconstruct_span_loads)
+
                 # needs to be created for each .wnd input file
                 if not os.path.isdir(FAST_sgp_directory):
                     os.mkdir(FAST_sgp_directory)
 
                 if os.path.isdir(FAST_wnd_directory):
-                    pass
+                    write_case_files(FAST_wnd_directory, case_files)
                 else:
-                    os.mkdir(FAST_wnd_directory)
-                    copy_tree(self.template_dir, FAST_wnd_directory)
+                    # (read-only template files are linked, not copied)
+                    create_case_dir(self.template_dir, FAST_wnd_directory, self.case_dir_mode,
+                                    case_files=case_files)
 
                 # Create dictionary for this particular index
                 cfg = {}
@@ -172,13 +415,6 @@ class CreateFASTConfig(Component):
                 cfg['fst_file_type'] = 0
                 cfg['ad_file_type'] = 1
 
-                def replace_line(file_name, line_num, text):
-                    lines = open(file_name, 'r').readlines()
-                    lines[line_num] = text
-                    out = open(file_name, 'w')
-                    out.writelines(lines)
-                    out.close()
-
                 # exposed parameters (no corresponding RotorSE parameter)
                 if self.wndfiletype[spec_caseid] == 'turb':
                     cfg['TMax'] = self.Tmax_turb
@@ -187,16 +423,6 @@ class CreateFASTConfig(Component):
                 cfg['DT'] = self.dT
                 cfg['TStart'] = self.rm_time
 
-                # === Add .wnd file location to Aerodyn.ipt file === #
-
-                if self.wndfiletype[spec_caseid] == 'turb':
-                    wnd_file_path = self.path + self.turb_dir + self.WNDfile_List[wnd_file]
-                else:
-                    wnd_file_path = self.path + self.nonturb_dir + self.WNDfile_List[wnd_file]
-
-                aerodyn_file_name = cfg['fst_masterdir'] + '/' + self.FAST_template_name + '_AD.ipt'
-                replace_line(aerodyn_file_name, 9, wnd_file_path + '\n')
-
                 # === parked configuration === #
                 if self.parked_type[wnd_file] == 'yes':
                     cfg['TimGenOn'] = 9999.9
@@ -220,198 +446,16 @@ class CreateFASTConfig(Component):
                 cfg['NBlGages'] = self.NBlGages[sgp]
                 cfg['BldGagNd'] = self.BldGagNd[sgp]
 
-                if self.set_chord_twist:
-
-                    f = open(aerodyn_file_name, "r")
-
-                    lines = f.readlines()
-
-                    if self.FAST_template_name == 'NREL5MW':
-                        lines = lines[28:45]
-                    else:
-                        lines = lines[24:41]
-
-                    DR_nodes = []
-
-                    for i in range(len(lines)):
-                        lines[i] = re.findall("[-+]?\d+[\.]?\d*[eE]?[-+]?\d*", lines[i].strip('\n'))
-                        DR_nodes.append(float(lines[i][0]))
-
-                    chord_spline = Akima(np.linspace( 0, 1, len(params['chord_sub']) ), params['chord_sub'])
-                    twist_spline = Akima(np.linspace( 0, 1, len(params['theta_sub']) ), params['theta_sub'])
-
-                    cfg['Chord'] = chord_spline.interp(np.array(DR_nodes)/self.set_blade_length)[0]
-                    cfg['AeroTwst'] = twist_spline.interp(np.array(DR_nodes)/self.set_blade_length)[0]
+                # AeroDyn element outputs, for the spanwise load reconstruction
+                if self.reconstruct_span_loads:
+                    cfg['PrnElm'] = ['PRINT'] * len(template.DR_nodes)
 
-                elif not self.run_template_files:
+                # blade geometry / structure of the design
+                cfg.update(design_cfg)
 
-                    # === general parameters === #
-                    cfg['NumBl'] = params['nBlades']
-
-                    if hasattr(params['g'], "__len__"):
-                        cfg['Gravity'] = params['g'][0]
-                    else:
-                        cfg['Gravity'] = params['g']
-
-                    cfg['RotSpeed'] = params['control:tsr']
-                    cfg['TipRad'] = params['FAST_Rtip']
-                    cfg['HubRad'] = params['FAST_Rhub']
-                    cfg['ShftTilt'] = params['tilt']
-                    cfg['PreCone1'] = params['precone']
-                    cfg['PreCone2'] = params['precone']
-                    cfg['PreCone3'] = params['precone']
-
-                    # # Aerodyn File
-
-                    # Add DLC .wnd file name to Aerodyn.ipt input file
-                    cfg['HH'] = params['hubHt'][0]
-
-                    if hasattr(params['rho'], "__len__"):
-                        cfg['AirDens'] = params['rho'][0]
-                        cfg['KinVisc'] = params['mu'][0] / params['rho'][0]
-                    else:
-                        cfg['AirDens'] = params['rho']
-                        cfg['KinVisc'] = params['mu'] / params['rho']
-
-                    # cfg['FoilNm'] = FoilNm
-                    cfg['NFoil'] = (params['af_idx'] + np.ones(np.size(params['af_idx']))).astype(int)
-
-                    cfg['BldNodes'] = np.size(params['af_idx'])
-
-                    # Make akima splines of RNodes/AeroTwst and RNodes/Chord
-                    theta_sub_spline = Akima(params['FAST_r_Aero'], params['FAST_Theta_Aero'])
-                    chord_sub_spline = Akima(params['FAST_r_Aero'], params['FAST_Chord_Aero'])
-
-                    # Redefine RNodes so that DRNodes can be calculated using AeroSubs
-                    RNodes = params['FAST_r_Aero']
-                    RNodes = np.linspace(RNodes[0], RNodes[-1], len(RNodes))
-
-                    cfg['RNodes'] = RNodes
-                    # Find new values of AeroTwst and Chord using redefined RNodes
-
-                    FAST_Theta = theta_sub_spline.interp(RNodes)[0]
-                    FAST_Chord = chord_sub_spline.interp(RNodes)[0]
-
-                    cfg['Chord'] = FAST_Chord
-                    cfg['AeroTwst'] = FAST_Theta
-
-                    DRNodes = np.zeros(np.size(params['af_idx']))
-                    for i in range(0, np.size(params['af_idx'])):
-                        if i == 0:
-                            DRNodes[i] = 2.0 * (RNodes[0] - params['FAST_Rhub'])
-                        else:
-                            DRNodes[i] = 2.0 * (RNodes[i] - RNodes[i - 1]) - DRNodes[i - 1]
-
-                    cfg['DRNodes'] = DRNodes
-
-                    # # Blade File
-
-                    cfg['NBlInpSt'] = len(params['FlpStff'])
-                    cfg['BlFract'] = np.linspace(0, 1, len(params['FlpStff']))
-                    cfg['AeroCent'] = params['leLoc']
-                    cfg['StrcTwst'] = params['FAST_Theta_Str']
-                    cfg['BMassDen'] = params['BMassDen']
-
-                    cfg['FlpStff'] = params['FlpStff']
-                    cfg['EdgStff'] = params['EdgStff']
-                    cfg['GJStff'] = params['GJStff']
-                    cfg['EAStff'] = params['EAStff']
-
-                    # exposed parameters (no corresponding RotorSE parameter)
-                    cfg['CalcBMode'] = 'False'
-                    cfg['BldFlDmp1'] = 2.477465
-                    cfg['BldFlDmp2'] = 2.477465
-                    cfg['BldEdDmp1'] = 2.477465
-                    cfg['FlStTunr1'] = 1.0
-                    cfg['FlStTunr2'] = 1.0
-                    cfg['AdjBlMs'] = 1.04536
-                    cfg['AdjFlSt'] = 1.0
-                    cfg['AdjEdSt'] = 1.0
-
-                    # unused parameters (not used by FAST)
-                    alpha = 0.5 * np.arctan2(2 * params['EAStff'], params['FlpStff'] - params['EAStff'])
-                    for i in range(0, len(alpha)):
-                        alpha[i] = min(0.99999, alpha[i])
-                    cfg['Alpha'] = alpha
-
-                    cfg['PrecrvRef'] = np.zeros(len(params['FlpStff']))
-                    cfg['PreswpRef'] = np.zeros(len(params['FlpStff']))
-                    cfg['FlpcgOf'] = np.zeros(len(params['FlpStff']))
-                    cfg['Edgcgof'] = np.zeros(len(params['FlpStff']))
-                    cfg['FlpEAOf'] = np.zeros(len(params['FlpStff']))
-                    cfg['EdgEAOf'] = np.zeros(len(params['FlpStff']))
-
-                    # compare EI properties
-                    BladeStructureProperties = np.loadtxt('FAST_Files/RotorSE_InputFiles/BladeStructureProperties.txt')
-
-                    # Blade Structural Properties
-                    #0 BlFract
-                    #1 AeroCent
-                    #2 StrcTwst
-                    #3 BMassDen
-                    #4 FlpStff
-                    #5 EdgStff
-                    #6 GJStff
-                    #7 EAStff
-                    #8 Alpha
-                    #9 FlpIner
-                    #10 EdgIner
-                    #11 PrecrvRef
-                    #12 PreswpRef
-                    #13 FlpcgOf
-                    #14 EdgcgOf
-                    #15 FlpEAOf
-                    #16 EdgEAOf
-
-                    # FlpStff, EdgStff, GJStff, EAStff
-                    EI_flp_spline = Akima(params['FAST_precurve_Str'], params['FlpStff'])
-                    EI_flp = EI_flp_spline.interp(BladeStructureProperties[:, 0])[0]
-
-                    EI_edge_spline = Akima(params['FAST_precurve_Str'], params['EdgStff'])
-                    EI_edge = EI_edge_spline.interp(BladeStructureProperties[:, 0])[0]
-
-                    EI_gj_spline = Akima(params['FAST_precurve_Str'], params['GJStff'])
-                    EI_gj = EI_gj_spline.interp(BladeStructureProperties[:, 0])[0]
-
-                    EI_ea_spline = Akima(params['FAST_precurve_Str'], params['EAStff'])
-                    EI_ea = EI_ea_spline.interp(BladeStructureProperties[:, 0])[0]
-
-                    if self.check_stif_spline:
-
-                        # plots
-                        BlFract = BladeStructureProperties[:, 0]
-                        FlpStff = BladeStructureProperties[:, 4]
-                        EdgStff = BladeStructureProperties[:, 5]
-                        GJStff = BladeStructureProperties[:, 6]
-                        EAStff = BladeStructureProperties[:, 7]
-
-                        plt.figure()
-                        plt.plot(BlFract, EI_flp, label='RotorSE spline')
-                        plt.plot(BlFract, FlpStff, label='FAST nominal value')
-                        plt.legend()
-                        plt.title('FlpStff')
-
-                        plt.figure()
-                        plt.plot(BlFract, EI_edge, label='RotorSE spline')
-                        plt.plot(BlFract, EdgStff, label='FAST nominal value')
-                        plt.legend()
-                        plt.title('EdgStff')
-
-                        plt.figure()
-                        plt.plot(BlFract, EI_gj, label='RotorSE spline')
-                        plt.plot(BlFract, GJStff, label='FAST nominal value')
-                        plt.legend()
-                        plt.title('GJStff Stiffness')
-
-                        plt.figure()
-                        plt.plot(BlFract, EI_ea, label='RotorSE spline')
-                        plt.plot(BlFract, EAStff, label='FAST nominal value')
-                        plt.legend()
-                        plt.title('EAStff Stiffness')
-
-                        plt.show()
-
-                        quit()
+                # === cached FAST results === #
+                if self.use_FAST_cache:
+                    self.FAST_cache_case(cfg, case_files, wnd_file_path, FAST_wnd_directory, caseids[spec_caseid])
 
                 cfg_master[self.caseids[spec_caseid]] = cfg
 
@@ -422,9 +466,6 @@ class use_FAST_surr_model(Component):
     def __init__(self, FASTinfo, naero, nstr):
         super(use_FAST_surr_model, self).__init__()
 
-        self.deriv_options['type'] = 'fd'
-        self.deriv_options['step_calc'] = 'relative'
-
         self.FASTinfo = FASTinfo
 
         self.add_param('r_max_chord', val=0.0)
@@ -478,6 +519,11 @@ class use_FAST_surr_model(Component):
 
         self.print_sm = FASTinfo['print_sm']
 
+        self.use_sm_server = FASTinfo['use_sm_server']
+
+        # memoized predictions, keyed on the design vector
+        self.sm_memo = SMMemo(FASTinfo['sm_memo_size'], FASTinfo['sm_memo_tol'])
+
         if self.do_cv_DEM or self.do_cv_Load or self.do_cv_def:
             self.kfolds = FASTinfo['kfolds']
             self.num_folds = FASTinfo['num_folds']
@@ -506,59 +552,35 @@ class use_FAST_surr_model(Component):
 
     def solve_nonlinear(self, params, unknowns, resids):
 
-        # === load surrogate model fits === #
-        sm_name_list = ['sm_x', 'sm_y', 'sm_x_load', 'sm_y_load']
-
-        for i in range(len(sm_name_list)):
-            pkl_file_name = self.opt_dir + '/' + sm_name_list[i] + '_' + self.approximation_model + '.pkl'
-
-            file_handle = open(pkl_file_name, "r")
-
-            if sm_name_list[i] == 'sm_x':
-                sm_x = pickle.load(file_handle)
-            elif sm_name_list[i] == 'sm_y':
-                sm_y = pickle.load(file_handle)
-            elif sm_name_list[i] == 'sm_x_load':
-                sm_x_load = pickle.load(file_handle)
-            elif sm_name_list[i] == 'sm_y_load':
-                sm_y_load = pickle.load(file_handle)
-            elif sm_name_list[i] == 'sm_def':
-                sm_def = pickle.load(file_handle)
-
         # === estimate outputs === #
 
         # current design variable values
-        sv = []
-        for i in range(0, len(self.sm_var_names)):
+        sv = sm_design_vector(params, self.sm_var_names, self.sm_var_index)
 
-            # chord_sub, theta_sub
-            if hasattr(params[self.sm_var_names[i]], '__len__'):
-                for j in range(0, len(self.sm_var_names[i])):
+        # === predict values === #
 
-                    if j in self.sm_var_index[i]:
+        # repeated design points (line searches, driver re-queries) are taken from the memo
+        memo_key = self.sm_memo.key('values', sv, params['bladeLength'], sm_signature(self.FASTinfo))
+        sm_values = self.sm_memo.get(memo_key)
 
-                        # calculate chord / blade length
-                        if self.sm_var_names[i] == 'chord_sub':
-                            sv.append( params[self.sm_var_names[i]][j] / ( params['bladeLength'] ) )
-                        else:
-                            sv.append(params[self.sm_var_names[i]][j])
-            # turbulence intensity
-            else:
-                sv.append(params[self.sm_var_names[i]])
+        if sm_values is None:
 
-        # === predict values === #
+            # surrogate models are only read from disk once per process (or held by sm_server.py)
+            if self.use_sm_server:
+                from sm_server import predict_batch_client
+                sm_values = predict_batch_client(sv, self.FASTinfo, params['bladeLength'])
+            else:
+                sm_values = predict_batch(sv, self.FASTinfo, params['bladeLength'])
 
-        int_sv = np.zeros([len(sv), 1])
-        for i in range(0, len(int_sv)):
-            int_sv[i] = sv[i]
+            self.sm_memo.put(memo_key, sm_values)
 
-        # DEMs
-        DEMx_sm = np.transpose(sm_x.predict_values(np.transpose(int_sv)))
-        DEMy_sm = np.transpose(sm_y.predict_values(np.transpose(int_sv)))
+        DEMx_sm, DEMy_sm, Edg_sm, Flp_sm = sm_values
 
-        # extreme loads
-        Edg_sm = np.transpose(sm_x_load.predict_values(np.transpose(int_sv)))
-        Flp_sm = np.transpose(sm_y_load.predict_values(np.transpose(int_sv)))
+        if self.print_sm:
+            print('Surrogate model cache (loads, hits):')
+            print(sm_cache_stats())
+            print('Surrogate model prediction memo (hits, misses):')
+            print(self.sm_memo.stats())
 
         # tip deflections
         # def_sm = np.transpose(sm_def.predict_values(np.transpose(int_sv)))
@@ -567,13 +589,69 @@ class use_FAST_surr_model(Component):
 
         # def_sm = def_sm[0][0]
 
-        unknowns['DEMx_sm'] = DEMx_sm
-        unknowns['DEMy_sm'] = DEMy_sm
-        unknowns['Edg_sm'] = Edg_sm
-        unknowns['Flp_sm'] = Flp_sm
+        # correction to match FAST at the trust region center (None - no correction, see sm_trust_region.py)
+        sm_correction = self.FASTinfo['sm_correction']
+
+        unknowns['DEMx_sm'] = apply_sm_correction(sm_correction, 'DEMx_sm', DEMx_sm[0])
+        unknowns['DEMy_sm'] = apply_sm_correction(sm_correction, 'DEMy_sm', DEMy_sm[0])
+        unknowns['Edg_sm'] = apply_sm_correction(sm_correction, 'Edg_sm', Edg_sm[0])
+        unknowns['Flp_sm'] = apply_sm_correction(sm_correction, 'Flp_sm', Flp_sm[0])
 
         # unknowns['def_sm'] = def_sm
 
+    def linearize(self, params, unknowns, resids):
+
+        # analytic partials of the surrogate model outputs
+        sv = sm_design_vector(params, self.sm_var_names, self.sm_var_index)
+
+        memo_key = self.sm_memo.key('derivatives', sv, params['bladeLength'], sm_signature(self.FASTinfo))
+        sm_derivs = self.sm_memo.get(memo_key)
+
+        if sm_derivs is None:
+            if self.use_sm_server:
+                from sm_server import predict_batch_derivatives_client
+                sm_derivs = predict_batch_derivatives_client(sv, self.FASTinfo, params['bladeLength'])
+            else:
+                sm_derivs = predict_batch_derivatives(sv, self.FASTinfo, params['bladeLength'])
+
+            self.sm_memo.put(memo_key, sm_derivs)
+
+        output_names = ['DEMx_sm', 'DEMy_sm', 'Edg_sm', 'Flp_sm']
+        sm_names = ['sm_x', 'sm_y', 'sm_x_load', 'sm_y_load']
+
+        sm_correction = self.FASTinfo['sm_correction']
+
+        J = {}
+        for k in range(len(output_names)):
+
+            d_out, d_bladeLength = sm_derivs[sm_names[k]]
+
+            # scaled by the multiplicative part of the trust region correction
+            if sm_correction is not None and output_names[k] in sm_correction:
+                sm_mult = sm_correction[output_names[k]][0]
+                d_out = d_out * np.reshape(sm_mult, (1, -1, 1))
+                d_bladeLength = d_bladeLength * np.reshape(sm_mult, (1, -1))
+
+            # map surrogate model inputs back to design variables
+            col = 0
+            for i in range(0, len(self.sm_var_names)):
+
+                # chord_sub, theta_sub
+                if hasattr(params[self.sm_var_names[i]], '__len__'):
+                    d_var = np.zeros([d_out.shape[1], len(params[self.sm_var_names[i]])])
+                    for j in range(0, len(params[self.sm_var_names[i]])):
+                        if j in self.sm_var_index[i]:
+                            d_var[:, j] = d_out[0, :, col]
+                            col += 1
+                    J[output_names[k], self.sm_var_names[i]] = d_var
+                # turbulence intensity (not a parameter of this component)
+                else:
+                    col += 1
+
+            J[output_names[k], 'bladeLength'] = np.reshape(d_bladeLength[0], (-1, 1))
+
+        return J
+
 
 class calc_FAST_sm_fit(Component):
 
@@ -592,6 +670,15 @@ class calc_FAST_sm_fit(Component):
         self.FASTinfo = FASTinfo
 
         self.approximation_model = FASTinfo['approximation_model']
+        self.sm_file_type = FASTinfo['sm_file_type']
+        self.fused_sm = use_fused_sm(FASTinfo)
+
+        self.sm_train_procs = FASTinfo['sm_train_procs']
+        self.sm_train_per_column = FASTinfo['sm_train_per_column']
+        self.sm_incremental = FASTinfo['sm_incremental']
+        self.sm_hyper_search = FASTinfo['sm_hyper_search']
+        self.sm_pca = FASTinfo['sm_pca']
+        self.sm_pca_components = FASTinfo['sm_pca_components']
 
         self.training_point_dist = FASTinfo['training_point_dist'] # 'linear', 'lhs'
 
@@ -775,202 +862,16 @@ class calc_FAST_sm_fit(Component):
 
             f.close()
 
+            # extreme loads are only recorded for lhs training points
+            raise Exception('Surrogate model fits need lhs training points.')
+
         elif self.training_point_dist == 'lhs':
 
             # === get design variable values / calculated outputs === #
-            f_var = open(self.var_filename, "r")
-            lines_var = list(f_var)
-            f_var.close()
-
-            f_DEM = open(self.DEM_filename, "r")
-            lines_DEM = list(f_DEM)
-            f_DEM.close()
-
-            f_def = open(self.def_filename, "r")
-            lines_def = list(f_def)
-            f_def.close()
-
-            f_load = open(self.load_filename, "r")
-            lines_load = list(f_load)
-            f_load.close()
-
-            # === create var_dict === #
-
-            # iterate for every training point
-            for k in range(self.num_pts):
-
-                # for i in range(header_len, tot_var + header_len):
-                for i in range(header_len + k, header_len + k + 1):
-
-                    cur_line = lines_var[i].split()
-
-                    # for the case where only varied variables are recorded in sm_var.txt
-                    if len(cur_line) == num_var + 1:
-                        for j in range(1, len(cur_line)):
-                            var_dict[var_names[j - 1]].append(float(cur_line[j]))
-
-            # === DEMs, extreme loads, and tip deflection (oh my!) === #
-            # first out line
-            first_line = lines_DEM[1].split()
-
-            if len(first_line) == 37:
-                sgp_range = 17 + 1
-            elif len(first_line) == 17:
-                sgp_range = 7 + 1
-
-            # all outputs (DEMs, loads, tip def) dictionary
-            out_dict = dict()
-
-            DEM_names = []
-
-            out_dict['Rootx'] = []
-            DEM_names.append('Rootx')
-            for i in range(1, sgp_range):
-                out_dict['DEMx_' + str(i)] = []
-                DEM_names.append('DEMx_' + str(i))
-
-            out_dict['Rooty'] = []
-            DEM_names.append('Rooty')
-            for i in range(1, sgp_range):
-                out_dict['DEMy_' + str(i)] = []
-                DEM_names.append('DEMy_' + str(i))
-
-            load_names = []
-
-            for i in range(self.nstr):
-                out_dict['Edg' + str(i)] = []
-                load_names.append('Edg' + str(i))
-            for i in range(self.nstr):
-                out_dict['Flp' + str(i)] = []
-                load_names.append('Flp' + str(i))
-
-            def_names = []
-
-            for i in range(1):
-                out_dict['tip' + str(i)] = []
-                def_names.append('tip' + str(i))
-
-            for k in range(self.num_pts):
-                # DEMx, DEMy
-
-                # for i in range(header_len, tot_var + header_len):
-                for i in range(header_len + k, header_len + k + 1):
-
-                    cur_line = lines_DEM[i].split()
-                    for j in range(1, len(cur_line)):
-                        # out_dict[DEM_names[j - 1]].append(float(cur_line[j]))
-                        out_dict[DEM_names[j - 1]].append(float(cur_line[j])*rated_tq)
-
-                # Edg, Flp
-
-                # for i in range(header_len, tot_var + header_len):
-                for i in range(header_len + k, header_len + k + 1):
-
-                    cur_line = lines_load[i].split()
-                    for j in range(1, len(cur_line)):
-
-                        # out_dict[load_names[j - 1]].append(float(cur_line[j]))
-                        out_dict[load_names[j - 1]].append(float(cur_line[j])*rated_tq)
-
-                # tip deflection
-
-                # for i in range(header_len, tot_var + header_len):
-                for i in range(header_len + k, header_len + k + 1):
-
-                    cur_line = lines_def[i].split()
-                    for j in range(1, len(cur_line)):
-
-                        out_dict[def_names[j - 1]].append(float(cur_line[j])*params['bladeLength'])
-
-        # === Approximation Model === #
-        from smt.surrogate_models import QP, LS, KRG, KPLS, KPLSK, RBF
-
-        if self.approximation_model == 'second_order_poly':
-            sm_x_fit = QP()
-            sm_y_fit = QP()
-            sm_x_load_fit = QP()
-            sm_y_load_fit = QP()
-            sm_def_fit = QP()
-
-            sm_check_fit = QP()
-
-            cv_x_fit = QP()
-            cv_y_fit = QP()
-
-        elif self.approximation_model == 'least_squares':
-            sm_x_fit = LS()
-            sm_y_fit = LS()
-            sm_x_load_fit = LS()
-            sm_y_load_fit = LS()
-            sm_def_fit = LS()
-
-            sm_check_fit = LS()
-
-            cv_x_fit = LS()
-            cv_y_fit = LS()
-
-        elif self.approximation_model == 'RBF':
-
-            sm_x_fit = RBF(d0=5)
-            sm_y_fit = RBF(d0=5)
-            sm_x_load_fit = RBF(d0=5)
-            sm_y_load_fit = RBF(d0=5)
-            sm_def_fit = RBF(d0=5)
 
-            sm_check_fit = RBF(d0=5)
-
-            cv_x_fit = RBF(d0=5)
-            cv_y_fit = RBF(d0=5)
-
-        elif self.approximation_model == 'kriging':
-
-            # initial hyperparameters
-            theta0_val = np.zeros([len(self.var_index), 1])
-            for i in range(len(theta0_val)):
-                theta0_val[i] = self.theta0_val[0]
-
-            sm_x_fit = KRG(theta0=theta0_val)
-            sm_y_fit = KRG(theta0=theta0_val)
-            sm_x_load_fit = KRG(theta0=theta0_val)
-            sm_y_load_fit = KRG(theta0=theta0_val)
-            sm_def_fit = KRG(theta0=theta0_val)
-
-            sm_check_fit = KRG(theta0=theta0_val)
-
-            cv_x_fit = KRG(theta0=theta0_val)
-            cv_y_fit = KRG(theta0=theta0_val)
-
-        elif self.approximation_model == 'KPLS':
-            theta0_val = self.theta0_val
-
-            sm_x_fit = KPLS(theta0=theta0_val)
-            sm_y_fit = KPLS(theta0=theta0_val)
-            sm_x_load_fit = KPLS(theta0=theta0_val)
-            sm_y_load_fit = KPLS(theta0=theta0_val)
-            sm_def_fit = KPLS(theta0=theta0_val)
-
-            sm_check_fit = KPLS(theta0=theta0_val)
-
-            cv_x_fit = KPLS(theta0=theta0_val)
-            cv_y_fit = KPLS(theta0=theta0_val)
-
-        elif self.approximation_model == 'KPLSK':
-            theta0_val = self.theta0_val
-
-            sm_x_fit = KPLSK(theta0=theta0_val)
-            sm_y_fit = KPLSK(theta0=theta0_val)
-            sm_x_load_fit = KPLSK(theta0=theta0_val)
-            sm_y_load_fit = KPLSK(theta0=theta0_val)
-            sm_def_fit = KPLSK(theta0=theta0_val)
-
-            sm_check_fit = KPLSK(theta0=theta0_val)
-
-            cv_x_fit = KPLSK(theta0=theta0_val)
-            cv_y_fit = KPLSK(theta0=theta0_val)
-
-
-        else:
-            raise Exception('Need to specify which approximation model will be used in surrogate model.')
+            # (num_pts, or fewer when sampled adaptively)
+            xt_pts, yt_x_pts, yt_y_pts, yt_x_load_pts, yt_y_load_pts, yt_def_pts = \
+                load_sm_training_data(self.FASTinfo, self.num_pts, rated_tq, params['bladeLength'])
 
         # === initialize predicted values === #
 
@@ -985,70 +886,124 @@ class calc_FAST_sm_fit(Component):
         # tip deflection
         def_sm = np.zeros([1, 1])
 
-        # need to get training values: xt -
-        num_pts = len(out_dict['Rootx'])
-        num_vars = len(var_names)
-
-        xt = np.zeros([num_vars, num_pts])
+        # training values (design variables / outputs x training points), the transposes of the contiguous
+        # (training points x .) arrays
+        xt = np.transpose(xt_pts)
 
         # === DEMx_sm, DEMy_sm fit creation === #
+        yt_x = np.transpose(yt_x_pts)
+        yt_y = np.transpose(yt_y_pts)
 
-        # design variable values; yt - outputs
-        yt_x = np.zeros([len(DEMx_sm), num_pts])
-        yt_y = np.zeros([len(DEMy_sm), num_pts])
+        # === Edg_sm, Flp_sm fit creation === #
+        yt_x_load = np.transpose(yt_x_load_pts)
+        yt_y_load = np.transpose(yt_y_load_pts)
 
-        for i in range(0,len(DEMx_sm)):
+        # hyperparameters that replace the defaults of the approximation model (see sm_hyper.py)
+        if self.sm_hyper_search:
 
-            for j in range(0, num_pts):
+            sm_hyper, sm_hyper_rms = search_sm_hyper(self.approximation_model, sm_name_list, xt_pts,
+                                                     [yt_x_pts, yt_y_pts, yt_x_load_pts, yt_y_load_pts],
+                                                     self.opt_dir + '/' + sm_hyper_cache_file_name,
+                                                     num_procs=self.sm_train_procs, theta0_val=self.theta0_val)
 
-                # design variable values
-                for k in range(0,len(var_names)):
+            if len(sm_hyper) > 0:
 
-                    # convert from chord / blade length to chord
-                    # if var_names == 'chord_sub':
-                    if k < 4:
-                        xt[k, j] = var_dict[var_names[k]][j] * params['bladeLength']
-                    else:
-                        xt[k, j] = var_dict[var_names[k]][j]
+                print('Best hyperparameters: ' + str(sm_hyper) + ', rms error ' + str(sm_hyper_rms * 100.0) + ' %')
+                save_sm_hyper(sm_hyper_file_name(self.opt_dir, self.approximation_model), self.approximation_model,
+                              sm_hyper, sm_hyper_rms)
 
-                # output values
-                yt_x[i, j] = out_dict[DEM_names[i]][j]
-                yt_y[i, j] = out_dict[DEM_names[i + 18]][j]
+        else:
 
-        sm_x = sm_x_fit
-        sm_x.set_training_values(np.transpose(xt),np.transpose(yt_x))
-        sm_x.options['print_global'] = self.print_sm
-        sm_x.train()
+            # settings of a previous search, if any
+            sm_hyper = load_sm_hyper(sm_hyper_file_name(self.opt_dir, self.approximation_model))
 
-        sm_y = sm_y_fit
-        sm_y.set_training_values(np.transpose(xt),np.transpose(yt_y))
-        sm_y.options['print_global'] = self.print_sm
-        sm_y.train()
+            if len(sm_hyper) > 0:
+                print('Hyperparameters from ' + sm_hyper_file_name(self.opt_dir, self.approximation_model) + ': '
+                      + str(sm_hyper))
 
-        # === Edg_sm, Flp_sm fit creation === #
+        # === Approximation Model === #
+        sm_x_fit, sm_y_fit, sm_x_load_fit, sm_y_load_fit, sm_def_fit, sm_check_fit, cv_x_fit, cv_y_fit = \
+            [approximation_sm(self.approximation_model, self.theta0_val, len(self.var_index), sm_hyper)
+             for i in range(8)]
 
-        num_pts_load = len(out_dict['Edg0'])
+        # fused RBF kernel width
+        d0 = sm_hyper.get('d0', 5.0)
 
-        yt_x_load = np.zeros([len(Edg_sm), num_pts_load])
-        yt_y_load = np.zeros([len(Flp_sm), num_pts_load])
+        # training outputs of each model, (training points x outputs)
+        yt_fit_list = [yt_x_pts, yt_y_pts, yt_x_load_pts, yt_y_load_pts]
 
-        for i in range(0,len(Edg_sm)):
+        if self.sm_pca:
 
-            for j in range(0, num_pts_load):
+            if self.sm_incremental:
+                raise Exception('sm_pca and sm_incremental cannot be used together (the principal components change '
+                                'when training points are added).')
 
-                # output values
-                yt_x_load[i, j] = out_dict[load_names[i]][j]
-                yt_y_load[i, j] = out_dict[load_names[i + self.nstr]][j]
+            # models are fit to the principal component scores of each output block (spanwise distribution)
+            sm_pca_list = [fit_output_pca(yt, self.sm_pca_components) for yt in yt_fit_list]
+            yt_fit_list = [sm_pca[2] for sm_pca in sm_pca_list]
 
-        sm_x_load = sm_x_load_fit
-        sm_x_load.set_training_values(np.transpose(xt),np.transpose(yt_x_load))
-        sm_x_load.options['print_global'] = self.print_sm
-        sm_x_load.train()
+            print('Principal components (' + ', '.join(sm_name_list) + '): '
+                  + ', '.join([str(len(yt[0])) for yt in yt_fit_list]))
 
-        sm_y_load = sm_y_load_fit
-        sm_y_load.set_training_values(np.transpose(xt),np.transpose(yt_y_load))
-        sm_y_load.options['print_global'] = self.print_sm
-        sm_y_load.train()
+        if self.fused_sm:
+
+            # one basis / kernel matrix for the DEM and extreme load fits
+            if self.sm_incremental:
+                sm_fused, num_new = update_fused_sm(sm_state_file_name(sm_file_name(self.opt_dir, 'sm_fused',
+                                                                                    self.approximation_model,
+                                                                                    self.sm_file_type)),
+                                                    np.transpose(xt), yt_fit_list, sm_name_list,
+                                                    self.approximation_model, d0)
+                print('Surrogate model updated with ' + str(num_new) + ' new training points.')
+            else:
+                sm_fused = fit_fused_sm(np.transpose(xt), yt_fit_list, sm_name_list, self.approximation_model, d0)
+
+            if self.sm_pca:
+                y_mean, components = stack_output_pca([sm_pca[0] for sm_pca in sm_pca_list],
+                                                      [sm_pca[1] for sm_pca in sm_pca_list])
+                sm_fused = FusedSM(PCASM(sm_fused.sm, y_mean, components), sm_name_list,
+                                   [len(sm_pca[0]) for sm_pca in sm_pca_list])
+
+            sm_x = sm_fused.output('sm_x')
+            sm_y = sm_fused.output('sm_y')
+            sm_x_load = sm_fused.output('sm_x_load')
+            sm_y_load = sm_fused.output('sm_y_load')
+
+        else:
+
+            sm_fit_list = [sm_x_fit, sm_y_fit, sm_x_load_fit, sm_y_load_fit]
+
+            # kriging / KPLS models start from the hyperparameters of the previous fit
+            warm_start = self.sm_incremental and self.approximation_model in sm_warm_start_models \
+                and not self.sm_train_per_column
+            if warm_start:
+                for i in range(len(sm_fit_list)):
+                    warm_start_sm(sm_fit_list[i], sm_state_file_name(sm_file_name(self.opt_dir, sm_name_list[i],
+                                                                                  self.approximation_model,
+                                                                                  self.sm_file_type)),
+                                  self.approximation_model)
+
+            # independent models (and optionally output columns) are trained in parallel processes
+            sm_trained, sm_time, sm_theta = train_sm_models(sm_fit_list, sm_name_list, np.transpose(xt), yt_fit_list,
+                                                            self.approximation_model, self.sm_train_procs,
+                                                            self.sm_train_per_column, self.print_sm)
+
+            if warm_start:
+                for i in range(len(sm_fit_list)):
+                    save_warm_start(sm_theta[sm_name_list[i]],
+                                    sm_state_file_name(sm_file_name(self.opt_dir, sm_name_list[i],
+                                                                    self.approximation_model, self.sm_file_type)),
+                                    self.approximation_model)
+
+            if self.sm_pca:
+                for i in range(len(sm_name_list)):
+                    sm_trained[sm_name_list[i]] = PCASM(sm_trained[sm_name_list[i]], sm_pca_list[i][0],
+                                                        sm_pca_list[i][1])
+
+            sm_x = sm_trained['sm_x']
+            sm_y = sm_trained['sm_y']
+            sm_x_load = sm_trained['sm_x_load']
+            sm_y_load = sm_trained['sm_y_load']
 
         # === tip deflection fit creation === #
 
@@ -1118,23 +1073,33 @@ class calc_FAST_sm_fit(Component):
 
             quit()
 
-        if self.approximation_model == 'second_order_poly' or self.approximation_model == 'least_squares':
-            pass
-        else:
-            raise Exception('only polynomial fits can be pickled. Either change the approximation '
-                            'model to second_order_poly or least_squares, or do not pickle fit.')
+        if self.sm_file_type == 'pkl':
+            if self.approximation_model == 'second_order_poly' or self.approximation_model == 'least_squares':
+                pass
+            else:
+                raise Exception('only polynomial fits can be pickled. Either change the approximation '
+                                'model to second_order_poly or least_squares, or set sm_file_type to smb.')
 
 
-        # === created surrogate models to .pkl files
+        # === created surrogate models to .pkl / .smb files
         sm_list = [sm_x, sm_y, sm_x_load, sm_y_load]
         sm_string_list = ['sm_x', 'sm_y', 'sm_x_load', 'sm_y_load']
 
 
 
+        if self.fused_sm:
+            sm_list = [sm_fused]
+            sm_string_list = ['sm_fused']
+
         for i in range(len(sm_list)):
-            pkl_file_name = self.opt_dir + '/' + sm_string_list[i] + '_' + self.approximation_model + '.pkl'
-            file_handle = open(pkl_file_name, "w+")
-            pickle.dump(sm_list[i], file_handle)
+            sm_file = sm_file_name(self.opt_dir, sm_string_list[i], self.approximation_model, self.sm_file_type)
+            if self.sm_file_type == 'smb':
+                save_sm_artifact(sm_file, sm_list[i], self.approximation_model)
+            else:
+                import pickle
+                file_handle = open(sm_file, "wb")
+                pickle.dump(sm_list[i], file_handle)
+                file_handle.close()
 
         if self.check_sm_accuracy:
 
@@ -1202,6 +1167,8 @@ class calc_FAST_sm_fit(Component):
             # turb_name = 'TUM335'
 
             # DEMx plot
+            import matplotlib.pyplot as plt
+
             plt.figure()
             plt.title('DEMx initial design, turbulence: ' + turb_class + ' (surrogate model accuracy)')
 
@@ -1259,7 +1226,7 @@ class calc_FAST_sm_fit(Component):
             sm = sm_check_fit
 
             # sm.set_training_values(np.array(var_dict['r_max_chord']), np.array(out_dict['Rooty']))
-            sm.set_training_values(np.array(var_dict['var_0']), np.array(out_dict['Rooty']))
+            sm.set_training_values(xt[0] / params['bladeLength'], yt_y[0])
             sm.train()
 
             # predicted value
@@ -1270,6 +1237,8 @@ class calc_FAST_sm_fit(Component):
             fit_x = np.linspace(0.1, 0.5, num)
             fit_y = sm.predict_values(np.array(fit_x))
 
+            import matplotlib.pyplot as plt
+
             plt.figure()
             plt.title('r_max_chord')
             # plt.plot(var_dict['r_max_chord'], out_dict['Rooty'], 'o')
@@ -1292,112 +1261,24 @@ class calc_FAST_sm_fit(Component):
 
             print('Running DEM cross validation...')
 
-            # === initialize error === #
-            DEM_error_x = np.zeros([len(DEMx_sm), self.num_folds])
-            percent_DEM_error_x = np.zeros([len(DEMx_sm), self.num_folds])
-
-            DEM_error_y = np.zeros([len(DEMy_sm), self.num_folds])
-            percent_DEM_error_y = np.zeros([len(DEMy_sm), self.num_folds])
-
-            for j in range(len(self.kfolds)):
-
-                cur_DEM_error_x = np.zeros([len(DEMx_sm), len(self.kfolds[j])])
-                cur_percent_DEM_error_x = np.zeros([len(DEMx_sm), len(self.kfolds[j])])
-
-                cur_DEM_error_y = np.zeros([len(DEMx_sm), len(self.kfolds[j])])
-                cur_percent_DEM_error_y = np.zeros([len(DEMx_sm), len(self.kfolds[j])])
-
-                for k in range(len(self.kfolds[j])):
-
-                    cur_kfold = self.kfolds[j]
-
-                    # choose training point indices
-                    train_pts = np.linspace(0, self.num_pts - 1, self.num_pts)  # -1 so it's zero-based
-                    train_pts = train_pts.tolist()
-
-                    for i in range(0, len(cur_kfold)):
-                        train_pts.remove(cur_kfold[i])
-
-                    # choose training point values
+            # one model per fold, trained on the points outside the fold; folds run in parallel processes
+            yt_cv = cross_validate_sm(cv_x_fit, ['DEMx', 'DEMy'], np.transpose(xt),
+                                      [np.transpose(yt_x), np.transpose(yt_y)], self.kfolds, self.sm_train_procs,
+                                      self.print_sm)
 
-                    train_xt = xt[:, train_pts]
-                    kfold_xt = xt[:, cur_kfold]
+            DEM_cv_x = cv_error_stats(np.transpose(yt_x), yt_cv['DEMx'], self.kfolds)
+            DEM_cv_y = cv_error_stats(np.transpose(yt_y), yt_cv['DEMy'], self.kfolds)
 
-                    train_yt_x = yt_x[:, train_pts]
-                    kfold_yt_x = yt_x[:, cur_kfold]
+            # average, maximum percent error over all k-folds
+            avg_percent_DEM_error_x = DEM_cv_x['avg_percent_error']
+            avg_percent_DEM_error_y = DEM_cv_y['avg_percent_error']
 
-                    train_yt_y = yt_y[:, train_pts]
-                    kfold_yt_y = yt_y[:, cur_kfold]
-
-                    # using current design variable values, predict output
-
-                    cv_x = cv_x_fit
-                    cv_x.set_training_values(np.transpose(train_xt), np.transpose(train_yt_x))
-                    cv_x.options['print_global'] = self.print_sm
-                    cv_x.train()
-
-                    cv_y = cv_y_fit
-                    cv_y.set_training_values(np.transpose(train_xt), np.transpose(train_yt_y))
-                    cv_y.options['print_global'] = self.print_sm
-                    cv_y.train()
-
-                    DEMx_cv = np.transpose(cv_x.predict_values(np.array([kfold_xt[:, k]])))
-                    DEMy_cv = np.transpose(cv_y.predict_values(np.array([kfold_xt[:, k]])))
-
-                    for i in range(len(DEM_error_x)):
-                        cur_DEM_error_x[i][k] = DEMx_cv[i] - kfold_yt_x[:, 0][i]
-                        cur_percent_DEM_error_x[i][k] = abs(DEMx_cv[i] - kfold_yt_x[:, k][i]) / kfold_yt_x[:, k][i]
-
-                        cur_DEM_error_y[i][k] = DEMy_cv[i] - kfold_yt_y[:, 0][i]
-                        cur_percent_DEM_error_y[i][k] = abs(DEMy_cv[i] - kfold_yt_y[:, k][i]) / kfold_yt_y[:, k][i]
-
-                # average error for specific k-fold
-                for i in range(len(DEM_error_x)):
-                    DEM_error_x[i][j] = sum(cur_DEM_error_x[i, :]) / len(cur_DEM_error_x[i, :])
-                    percent_DEM_error_x[i][j] = sum(cur_percent_DEM_error_x[i, :]) / len(cur_percent_DEM_error_x[i, :])
-
-                    DEM_error_y[i][j] = sum(cur_DEM_error_y[i, :]) / len(cur_DEM_error_y[i, :])
-                    percent_DEM_error_y[i][j] = sum(cur_percent_DEM_error_y[i, :]) / len(cur_percent_DEM_error_y[i, :])
-
-            # average percent error over all k-folds
-            avg_percent_DEM_error_x = np.zeros([len(DEM_error_x), 1])
-            avg_percent_DEM_error_y = np.zeros([len(DEM_error_y), 1])
-
-            rms_percent_DEM_error_x = np.zeros([len(DEM_error_x), 1])
-            rms_percent_DEM_error_y = np.zeros([len(DEM_error_y), 1])
-
-            # calculate root mean square error
-            for i in range(len(DEM_error_x)):
-
-                avg_percent_DEM_error_x[i] = sum(percent_DEM_error_x[i, :]) / len(percent_DEM_error_x[i, :])
-                avg_percent_DEM_error_y[i] = sum(percent_DEM_error_y[i, :]) / len(percent_DEM_error_y[i, :])
-
-                squared_total_x = 0.0
-                squared_total_y = 0.0
-                for index in range(len(percent_DEM_error_x[i, :])):
-                    squared_total_x += percent_DEM_error_x[i, index] ** 2.0
-                    squared_total_y += percent_DEM_error_y[i, index] ** 2.0
-
-                rms_percent_DEM_error_x[i] = (squared_total_x / len(percent_DEM_error_x[i, :])) ** 0.5
-                rms_percent_DEM_error_y[i] = (squared_total_y / len(percent_DEM_error_y[i, :])) ** 0.5
-
-            # maximum percent error over all k-folds
-            max_percent_DEM_error_x = np.zeros([len(DEM_error_x), 1])
-            max_percent_DEM_error_y = np.zeros([len(DEM_error_y), 1])
-
-            for i in range(len(DEM_error_x)):
-                max_percent_DEM_error_x[i] = max(percent_DEM_error_x[i, :])
-                max_percent_DEM_error_y[i] = max(percent_DEM_error_y[i, :])
+            max_percent_DEM_error_x = DEM_cv_x['max_percent_error']
+            max_percent_DEM_error_y = DEM_cv_y['max_percent_error']
 
             # root mean square error over all DEMx, DEMy points
-            total_squared_total_x = 0.0
-            total_squared_total_y = 0.0
-            for index in range(len(rms_percent_DEM_error_x)):
-                total_squared_total_x += rms_percent_DEM_error_x[index] ** 2.0
-                total_squared_total_y += rms_percent_DEM_error_y[index] ** 2.0
-
-            rms_DEM_error_x = (total_squared_total_x / len(rms_percent_DEM_error_x)) ** 0.5
-            rms_DEM_error_y = (total_squared_total_y / len(rms_percent_DEM_error_y)) ** 0.5
+            rms_DEM_error_x = DEM_cv_x['rms_error']
+            rms_DEM_error_y = DEM_cv_y['rms_error']
 
             # root mean square error overall
             rms_error = ( (rms_DEM_error_x ** 2.0 + rms_DEM_error_y ** 2.0) / 2.0) ** 0.5
@@ -1412,8 +1293,8 @@ class calc_FAST_sm_fit(Component):
             error_file_name = str(self.opt_dir) + '/error_' + self.approximation_model + '_' + str(
                 self.num_pts) + '.txt'
             ferror = open(error_file_name, "w+")
-            ferror.write(str(rms_DEM_error_x[0]) + '\n')
-            ferror.write(str(rms_DEM_error_y[0]))
+            ferror.write(str(rms_DEM_error_x) + '\n')
+            ferror.write(str(rms_DEM_error_y))
             ferror.close()
 
             # DEMx plot
@@ -1454,111 +1335,24 @@ class calc_FAST_sm_fit(Component):
 
             print('Running extreme loads cross validation...')
 
-            # === initialize error === #
-            Edg_error = np.zeros([len(Edg_sm), self.num_folds])
-            percent_Edg_error = np.zeros([len(Edg_sm), self.num_folds])
-
-            Flp_error = np.zeros([len(Flp_sm), self.num_folds])
-            percent_Flp_error = np.zeros([len(Flp_sm), self.num_folds])
-
-            for j in range(len(self.kfolds)):
-
-                cur_Edg_error = np.zeros([len(Edg_sm), len(self.kfolds[j])])
-                cur_percent_Edg_error = np.zeros([len(Edg_sm), len(self.kfolds[j])])
-
-                cur_Flp_error = np.zeros([len(Flp_sm), len(self.kfolds[j])])
-                cur_percent_Flp_error = np.zeros([len(Flp_sm), len(self.kfolds[j])])
-
-                for k in range(len(self.kfolds[j])):
-
-                    cur_kfold = self.kfolds[j]
+            # one model per fold, trained on the points outside the fold; folds run in parallel processes
+            yt_cv = cross_validate_sm(cv_x_fit, ['Edg', 'Flp'], np.transpose(xt),
+                                      [np.transpose(yt_x_load), np.transpose(yt_y_load)], self.kfolds,
+                                      self.sm_train_procs, self.print_sm)
 
-                    # choose training point indices
-                    train_pts = np.linspace(0, self.num_pts - 1, self.num_pts)  # -1 so it's zero-based
-                    train_pts = train_pts.tolist()
+            Edg_cv = cv_error_stats(np.transpose(yt_x_load), yt_cv['Edg'], self.kfolds)
+            Flp_cv = cv_error_stats(np.transpose(yt_y_load), yt_cv['Flp'], self.kfolds)
 
-                    for i in range(0, len(cur_kfold)):
-                        train_pts.remove(cur_kfold[i])
+            # average, maximum percent error over all k-folds
+            avg_percent_Edg_error = Edg_cv['avg_percent_error']
+            avg_percent_Flp_error = Flp_cv['avg_percent_error']
 
-                    # choose training point values
-                    train_xt = xt[:, train_pts]
-                    kfold_xt = xt[:, cur_kfold]
+            max_percent_Edg_error = Edg_cv['max_percent_error']
+            max_percent_Flp_error = Flp_cv['max_percent_error']
 
-                    train_yt_x = yt_x_load[:, train_pts]
-                    kfold_yt_x = yt_x_load[:, cur_kfold]
-
-                    train_yt_y = yt_y_load[:, train_pts]
-                    kfold_yt_y = yt_y_load[:, cur_kfold]
-
-                    # using current design variable values, predict output
-
-                    cv_x = cv_x_fit
-                    cv_x.set_training_values(np.transpose(train_xt), np.transpose(train_yt_x))
-                    cv_x.options['print_global'] = self.print_sm
-                    cv_x.train()
-
-                    cv_y = cv_y_fit
-                    cv_y.set_training_values(np.transpose(train_xt), np.transpose(train_yt_y))
-                    cv_y.options['print_global'] = self.print_sm
-                    cv_y.train()
-
-                    Edg_cv = np.transpose(cv_x.predict_values(np.array([kfold_xt[:, k]])))
-                    Flp_cv = np.transpose(cv_y.predict_values(np.array([kfold_xt[:, k]])))
-
-                    for i in range(len(Edg_error)):
-                        cur_Edg_error[i][k] = Edg_cv[i] - kfold_yt_x[:, 0][i]
-                        cur_percent_Edg_error[i][k] = abs(Edg_cv[i] - kfold_yt_x[:, k][i]) / kfold_yt_x[:, k][i]
-
-                        cur_Flp_error[i][k] = Flp_cv[i] - kfold_yt_y[:, 0][i]
-                        cur_percent_Flp_error[i][k] = abs(Flp_cv[i] - kfold_yt_y[:, k][i]) / kfold_yt_y[:, k][i]
-
-                # average error for specific k-fold
-                for i in range(len(Edg_error)):
-                    Edg_error[i][j] = sum(cur_Edg_error[i, :]) / len(cur_Edg_error[i, :])
-                    percent_Edg_error[i][j] = sum(cur_percent_Edg_error[i, :]) / len(cur_percent_Edg_error[i, :])
-
-                    Flp_error[i][j] = sum(cur_Flp_error[i, :]) / len(cur_Flp_error[i, :])
-                    percent_Flp_error[i][j] = sum(cur_percent_Flp_error[i, :]) / len(cur_percent_Flp_error[i, :])
-
-            # average percent error over all k-folds
-            avg_percent_Edg_error = np.zeros([len(Edg_error), 1])
-            avg_percent_Flp_error = np.zeros([len(Flp_error), 1])
-
-            rms_percent_Edg_error = np.zeros([len(Edg_error), 1])
-            rms_percent_Flp_error = np.zeros([len(Flp_error), 1])
-
-            # calculate root mean square error
-            for i in range(len(Edg_error)):
-
-                avg_percent_Edg_error[i] = sum(percent_Edg_error[i, :]) / len(percent_Edg_error[i, :])
-                avg_percent_Flp_error[i] = sum(percent_Flp_error[i, :]) / len(percent_Flp_error[i, :])
-
-                squared_total_x = 0.0
-                squared_total_y = 0.0
-                for index in range(len(percent_Edg_error[i, :])):
-                    squared_total_x += percent_Edg_error[i, index] ** 2.0
-                    squared_total_y += percent_Flp_error[i, index] ** 2.0
-
-                rms_percent_Edg_error[i] = (squared_total_x / len(percent_Edg_error[i, :])) ** 0.5
-                rms_percent_Flp_error[i] = (squared_total_y / len(percent_Flp_error[i, :])) ** 0.5
-
-            # maximum percent error over all k-folds
-            max_percent_Edg_error = np.zeros([len(Edg_error), 1])
-            max_percent_Flp_error = np.zeros([len(Flp_error), 1])
-
-            for i in range(len(Edg_error)):
-                max_percent_Edg_error[i] = max(percent_Edg_error[i, :])
-                max_percent_Flp_error[i] = max(percent_Flp_error[i, :])
-
-            # root mean square error over all DEMx, DEMy points
-            total_squared_total_x = 0.0
-            total_squared_total_y = 0.0
-            for index in range(len(rms_percent_Edg_error)):
-                total_squared_total_x += rms_percent_Edg_error[index] ** 2.0
-                total_squared_total_y += rms_percent_Flp_error[index] ** 2.0
-
-            rms_Edg_error = (total_squared_total_x / len(rms_percent_Edg_error)) ** 0.5
-            rms_Flp_error = (total_squared_total_y / len(rms_percent_Flp_error)) ** 0.5
+            # root mean square error over all Edg, Flp points
+            rms_Edg_error = Edg_cv['rms_error']
+            rms_Flp_error = Flp_cv['rms_error']
 
             # root mean square error overall
             rms_error = (((rms_Edg_error ** 2.0 + rms_Flp_error ** 2.0)) / 2.0) ** 0.5
@@ -1572,8 +1366,8 @@ class calc_FAST_sm_fit(Component):
             error_file_name = str(self.opt_dir) + '/error_' + self.approximation_model + '_' + str(
                 self.num_pts) + '.txt'
             ferror = open(error_file_name, "w+")
-            ferror.write(str(rms_Edg_error[0]) + '\n')
-            ferror.write(str(rms_Flp_error[0]))
+            ferror.write(str(rms_Edg_error) + '\n')
+            ferror.write(str(rms_Flp_error))
             ferror.close()
 
             # DEMx plot
@@ -1735,6 +1529,13 @@ class Calculate_FAST_sm_training_points(Component):
         self.load_filename = self.opt_dir + '/' + self.sm_load_file
         self.def_filename = self.opt_dir + '/' + self.sm_def_file
 
+        # 'txt' - sm_<ft>_<i>.txt files, 'bin' - append-only binary store, 'db' - SQLite database
+        # (lhs only, see sm_store.py, sm_db.py)
+        self.sm_training_store = FASTinfo['sm_training_store']
+        if self.training_point_dist == 'lhs':
+            self.store_filename = self.opt_dir + '/' + FASTinfo['sm_store_file']
+            self.db_filename = self.opt_dir + '/' + FASTinfo['sm_db_file']
+
         self.NBlGages = FASTinfo['NBlGages']
         self.BldGagNd = FASTinfo['BldGagNd']
 
@@ -1909,6 +1710,43 @@ class Calculate_FAST_sm_training_points(Component):
         elif self.training_point_dist == 'lhs':
 
             header_len = 1
+
+            # === add training point to binary store / database === #
+
+            if self.sm_training_store in ['bin', 'db']:
+
+                header0 = 'variable points: '
+                for i in range(0, len(self.sm_var_names)):
+
+                    header0 += self.sm_var_names[i]
+                    for j in range(0, len(self.sm_var_index[i])):
+                        header0 += '_' + str(self.sm_var_index[i][j])
+
+                    header0 += ' '
+
+                # calculate chord / blade length
+                sm_var = sm_design_vector(params, self.sm_var_names, self.sm_var_index)
+                chord_cols = sm_chord_columns(self.FASTinfo)
+                sm_var[chord_cols] = sm_var[chord_cols] / params['bladeLength']
+
+                if self.sm_training_store == 'bin':
+
+                    # own shard file, compacted into the store when the fit is created
+                    write_sm_shard(self.store_filename, len(sm_var), len(params['DEMx']), len(params['Edg_max']),
+                                   header0, self.sm_var_spec, sm_var, params['DEMx'], params['DEMy'],
+                                   params['Edg_max'], params['Flp_max'], params['max_tip_def'], rated_tq,
+                                   params['bladeLength'])
+
+                else:
+
+                    insert_sm_point(self.db_filename, sm_db_campaign(self.FASTinfo), self.sm_var_spec, sm_var,
+                                    np.concatenate([params['DEMx'], params['DEMy']]) / rated_tq,
+                                    np.concatenate([params['Edg_max'], params['Flp_max']]) / rated_tq,
+                                    params['max_tip_def'] / params['bladeLength'], rated_tq, params['bladeLength'],
+                                    header0)
+
+                return
+
             # === initialize variable file === #
 
             if not (os.path.isfile(self.var_filename)):
@@ -1928,7 +1766,8 @@ class Calculate_FAST_sm_training_points(Component):
 
                 f.write(header0 + '\n')
 
-                for i in range(0, self.num_pts):
+                # (adaptive sampling can add points beyond num_pts)
+                for i in range(0, max(self.num_pts, self.sm_var_spec + 1)):
                     f.write('-- place holder --' + '\n')
 
                 f.close
@@ -1976,7 +1815,7 @@ class Calculate_FAST_sm_training_points(Component):
 
                     f.write(header0 + '\n')
 
-                    for i in range(0, self.num_pts):
+                    for i in range(0, max(self.num_pts, self.sm_var_spec + 1)):
                         f.write('-- place holder --' + '\n')
 
                     f.close()
@@ -2046,6 +1885,27 @@ class CreateFASTConstraints(Component):
         self.BldGagNd = FASTinfo['BldGagNd']
         self.Run_Once = FASTinfo['Run_Once']
 
+        # moments at every blade node reconstructed from one run per wind file (see FAST_span_loads.py); the strain
+        # gages of the run are at gage_nodes, the reconstructed moments are used as one strain gage at every node
+        self.reconstruct_span_loads = FASTinfo['reconstruct_span_loads']
+        if self.reconstruct_span_loads:
+
+            # only within the error budget measured by check_span_loads.py
+            span_load_error = check_span_load_errors(FASTinfo['opt_dir'], FASTinfo['span_load_max_error'])
+            print('Reconstructed spanwise loads, largest measured error ' + str(span_load_error * 100.0) + ' %')
+
+            self.gage_nodes = FASTinfo['BldGagNd'][0]
+            self.NBlGages = [naero]
+            self.BldGagNd = [list(range(1, naero + 1))]
+            self.template_dir = FASTinfo['template_dir']
+            self.FAST_template_name = FASTinfo['FAST_template_name']
+
+        # reduced results of the cases found in the FAST cache (see FAST_cache.py)
+        self.use_FAST_cache = FASTinfo['use_FAST_cache']
+        if self.use_FAST_cache:
+            self.FAST_cache_dir = FASTinfo['FAST_cache_dir']
+            self.FAST_cache_max_size = FASTinfo['FAST_cache_max_size']
+
         self.dir_saved_plots = FASTinfo['dir_saved_plots']
 
         self.check_results = FASTinfo['check_results']
@@ -2092,12 +1952,41 @@ class CreateFASTConstraints(Component):
         self.add_output('Edg_max', val=np.zeros(nstr))
         self.add_output('Flp_max', val=np.zeros(nstr))
 
+    def span_load_nodes(self, params, caseid):
+
+        # radii / lengths of the AeroDyn nodes of the case (set in CreateFASTConfig, otherwise the template values)
+        cfg = params['cfg_master'].get(caseid, dict())
+        if 'RNodes' in cfg and 'DRNodes' in cfg:
+            return cfg['RNodes'], cfg['DRNodes']
+
+        template = load_FAST_template(self.template_dir, self.FAST_template_name)
+
+        return template.DR_nodes, template.DRNodes
+
+    def channel_range(self, resultsdict, cache_entry, name):
+
+        # (min, max) of an output channel of a case, from its FAST outputs or from its cache entry (cached cases
+        # have no FAST outputs, see FAST_cache.py)
+        if cache_entry is not None:
+            return FAST_cache_channels(cache_entry, 'min')[name], FAST_cache_channels(cache_entry, 'max')[name]
+
+        return min(resultsdict[name]), max(resultsdict[name])
+
     def solve_nonlinear(self, params, unknowns, resids):
 
+        from akima import Akima
+
+        if self.train_sm:
+            FAST_opt_dir = self.sm_dir
+        else:
+            FAST_opt_dir = self.opt_dir
+
         # === Check Results === #
         resultsdict = params[self.caseids[0]]
         if self.check_results:
 
+            import matplotlib.pyplot as plt
+
             bm_param = ['RootMyb1', 'OoPDefl1', 'GenTq', 'RotThrust', 'RotTorq', 'Spn3MLxb1', 'RotPwr', 'GenPwr', 'RootFxc1']
             bm_param_units = ['kN*m', 'm', 'kN*m', 'kN', 'kN*m', 'kN*m', 'kW', 'kW', 'kN']
 
@@ -2147,7 +2036,16 @@ class CreateFASTConstraints(Component):
 
                 print('Calculating rated torque...')
 
-                gen_tq_avg = sum(resultsdict['GenTq'])/len(resultsdict['GenTq'])
+                # (a cached case has no FAST outputs)
+                cache_entry = None
+                if self.use_FAST_cache:
+                    cache_key, cache_entry = read_FAST_cache_case(FAST_opt_dir + '/' + 'sgp' + str(self.sgp[0])
+                                                                  + '/' + self.caseids[0])
+
+                if cache_entry is not None:
+                    gen_tq_avg = FAST_cache_channels(cache_entry, 'mean')['GenTq']
+                else:
+                    gen_tq_avg = sum(resultsdict['GenTq'])/len(resultsdict['GenTq'])
 
                 rated_tq_file = self.opt_dir + '/rated_tq.txt'
 
@@ -2218,11 +2116,6 @@ class CreateFASTConstraints(Component):
             peaks_max_y['bld_gage_' + str(tot_BldGagNd[i])] = []
 
         # === cycle through each set of strain gages (k) and each wind file (i) === #
-        if self.train_sm:
-            FAST_opt_dir = self.sm_dir
-        else:
-            FAST_opt_dir = self.opt_dir
-
         for k in range(0, len(self.NBlGages)):
 
             for i in range(0 + 1, len(self.WNDfile_List) + 1):
@@ -2250,112 +2143,143 @@ class CreateFASTConstraints(Component):
 
                 # === rainflow calculation files === #
 
-                # files = [FAST_wnd_directory + '/fst_runfile.outb']
-                files = [FAST_wnd_directory + '/fst_runfile.out']
+                # cached results of the case (see FAST_cache.py)
+                cache_key = None
+                cache_entry = None
+                if self.use_FAST_cache:
+                    cache_key, cache_entry = read_FAST_cache_case(FAST_wnd_directory)
 
-                # read titles of file, since they don't seem to be in order
-                file_rainflow = open(files[0])
-                line_rainflow = file_rainflow.readlines()
+                if cache_entry is None:
 
-                # extract names fron non-binary FAST output file
-                name_line = 6
-                str_val = re.findall("\w+", line_rainflow[name_line])
+                    # files = [FAST_wnd_directory + '/fst_runfile.outb']
+                    if self.reconstruct_span_loads:
+                        r_nodes, dr_nodes = self.span_load_nodes(params, self.caseids[spec_caseid])
+                        span_file, span_channels = \
+                            reconstruct_FAST_span_loads(FAST_wnd_directory, r_nodes, dr_nodes, self.gage_nodes)
 
-                # create output_array (needed for rainflow calculation)
-                output_array = []
+                        files = [span_file]
+                        resultsdict = dict(resultsdict)
+                        resultsdict.update(span_channels)
+                    else:
+                        files = [FAST_wnd_directory + '/fst_runfile.out']
 
-                # make RootMxb1 first in output_array
-                for j in range (0,len(str_val)):
-                    if str_val[j] == 'RootMxb1':
-                        output_array.append(j)
+                    # read titles of file, since they don't seem to be in order
+                    file_rainflow = open(files[0])
+                    line_rainflow = file_rainflow.readlines()
 
-                # make Spn1MLxb1 next in output array
-                for l in range(0,self.NBlGages[k]):
-                    for j in range(0,len(str_val)):
-                        if str_val[j] == 'Spn{0}MLxb1'.format(str(l+1)):
+                    # extract names fron non-binary FAST output file
+                    name_line = 6
+                    str_val = re.findall("\w+", line_rainflow[name_line])
+
+                    # create output_array (needed for rainflow calculation)
+                    output_array = []
+
+                    # make RootMxb1 first in output_array
+                    for j in range (0,len(str_val)):
+                        if str_val[j] == 'RootMxb1':
                             output_array.append(j)
 
-                # make RootMyb1 next in output_array
-                for j in range(0, len(str_val)):
-                    if str_val[j] == 'RootMyb1':
-                        output_array.append(j)
+                    # make Spn1MLxb1 next in output array
+                    for l in range(0,self.NBlGages[k]):
+                        for j in range(0,len(str_val)):
+                            if str_val[j] == 'Spn{0}MLxb1'.format(str(l+1)):
+                                output_array.append(j)
 
-                # make Spn1MLyb1 next in output array
-                for l in range(0, self.NBlGages[k]):
+                    # make RootMyb1 next in output_array
                     for j in range(0, len(str_val)):
-                        if str_val[j] == 'Spn{0}MLyb1'.format(str(l+1)):
+                        if str_val[j] == 'RootMyb1':
                             output_array.append(j)
 
-                # === perform rainflow calculations === #
-                from rainflow import do_rainflow
+                    # make Spn1MLyb1 next in output array
+                    for l in range(0, self.NBlGages[k]):
+                        for j in range(0, len(str_val)):
+                            if str_val[j] == 'Spn{0}MLyb1'.format(str(l+1)):
+                                output_array.append(j)
 
-                SNslope = np.zeros([1,len(output_array)])
-                for index in range(0,len(output_array)):
-                    for j in range(0,1):
-                        SNslope[j,index] = self.m_value
+                    # === perform rainflow calculations === #
+                    from rainflow import do_rainflow
 
-                if self.wndfiletype[i-1] == 'turb':
-                    Tmax = self.Tmax_turb
-                else:
-                    Tmax = self.Tmax_nonturb
+                    SNslope = np.zeros([1,len(output_array)])
+                    for index in range(0,len(output_array)):
+                        for j in range(0,1):
+                            SNslope[j,index] = self.m_value
+
+                    if self.wndfiletype[i-1] == 'turb':
+                        Tmax = self.Tmax_turb
+                    else:
+                        Tmax = self.Tmax_nonturb
+
+                    allres, peaks_list, orig_data, rm_data, data_name = \
+                        do_rainflow(files, output_array, SNslope, self.dir_saved_plots, Tmax, self.dT, self.rm_time, self.check_rm_time)
 
-                allres, peaks_list, orig_data, rm_data, data_name = \
-                    do_rainflow(files, output_array, SNslope, self.dir_saved_plots, Tmax, self.dT, self.rm_time, self.check_rm_time)
+                    a = allres[0]
 
-                a = allres[0]
+                    # === rainflow check === #
+                    if self.check_rainflow:
 
-                # === rainflow check === #
-                if self.check_rainflow:
+                        import matplotlib.pyplot as plt
 
-                    n = 0;
-                    for m in output_array:
+                        n = 0;
+                        for m in output_array:
 
-                        FAST_b = orig_data[:,m]
-                        FAST_b_time = orig_data[:,0]
-                        FAST_rm = rm_data[:,m]
-                        FAST_rm_time = rm_data[:,0]
+                            FAST_b = orig_data[:,m]
+                            FAST_b_time = orig_data[:,0]
+                            FAST_rm = rm_data[:,m]
+                            FAST_rm_time = rm_data[:,0]
 
-                        # if data_name[m] == 'RootMyb1':
-                        #     f  = open('paper_plots/data_files/turb_DEM.txt', "w+")
-                        #     for index in range(len(FAST_b)):
-                        #         f.write(str(FAST_b[index])+'\n')
-                        #     f.close()
-                        #
-                        #     f = open('paper_plots/data_files/turb_time.txt', "w+")
-                        #     for index in range(len(FAST_b_time)):
-                        #         f.write(str(FAST_b_time[index])+'\n')
-                        #     f.close()
+                            # if data_name[m] == 'RootMyb1':
+                            #     f  = open('paper_plots/data_files/turb_DEM.txt', "w+")
+                            #     for index in range(len(FAST_b)):
+                            #         f.write(str(FAST_b[index])+'\n')
+                            #     f.close()
+                            #
+                            #     f = open('paper_plots/data_files/turb_time.txt', "w+")
+                            #     for index in range(len(FAST_b_time)):
+                            #         f.write(str(FAST_b_time[index])+'\n')
+                            #     f.close()
 
 
 
-                        plt.figure()
-                        plt.plot(FAST_b_time, FAST_b,'--', label='all data output')
-                        plt.plot(FAST_rm_time, FAST_rm, label='used data output')
+                            plt.figure()
+                            plt.plot(FAST_b_time, FAST_b,'--', label='all data output')
+                            plt.plot(FAST_rm_time, FAST_rm, label='used data output')
 
-                        plt.xlabel('Time Step (s)')
-                        plt.ylabel('Data')
-                        # plt.title(data_name[m] + '; DEM = ' + str(a[n][0]) + ' kN*m')
-                        plt.title(data_name[m] + '; DEM = ' + str(a[n][0]) + ' kN*m')
+                            plt.xlabel('Time Step (s)')
+                            plt.ylabel('Data')
+                            # plt.title(data_name[m] + '; DEM = ' + str(a[n][0]) + ' kN*m')
+                            plt.title(data_name[m] + '; DEM = ' + str(a[n][0]) + ' kN*m')
 
-                        plt.legend()
-                        # plt.savefig(self.dir_saved_plots + '/rainflow_check/' + data_name[m] + '.eps')
-                        plt.savefig(self.dir_saved_plots + '/plots/rainflow_check/' + data_name[m] + '.png')
-                        if data_name[m] == 'RootMyb1':
-                            plt.show()
-                        plt.close()
+                            plt.legend()
+                            # plt.savefig(self.dir_saved_plots + '/rainflow_check/' + data_name[m] + '.eps')
+                            plt.savefig(self.dir_saved_plots + '/plots/rainflow_check/' + data_name[m] + '.png')
+                            if data_name[m] == 'RootMyb1':
+                                plt.show()
+                            plt.close()
 
-                        n += 1
+                            n += 1
+
+                        quit()
+
+                    peak_names = [str_val[l] for l in output_array]
+
+                    if cache_key is not None:
+                        put_FAST_cache_entry(self.FAST_cache_dir, cache_key,
+                                             FAST_cache_entry(a, peak_names, peaks_list, resultsdict),
+                                             self.FAST_cache_max_size)
+
+                else:
 
-                    quit()
+                    a = np.array(cache_entry['DEM'])
+                    peak_names = cache_entry['peak_names']
+                    peaks_list = cache_entry['peaks_list']
 
                 # peaks info
                 peaks_array = dict()
 
                 # create peaks master file
-                for j in range(0,len(output_array)):
-                    l = output_array[j]
-                    peaks_array[str_val[l]] = []
-                    peaks_array[str_val[l]].append(peaks_list[j].tolist())
+                for j in range(0, len(peak_names)):
+                    peaks_array[peak_names[j]] = []
+                    peaks_array[peak_names[j]].append(peaks_list[j].tolist())
 
                 for j in range(0, len(peaks_array['RootMxb1'])):
                     peaks_master_x['root'].append(peaks_array['RootMxb1'][j])
@@ -2392,11 +2316,9 @@ class CreateFASTConstraints(Component):
                         Edg_param = 'Spn{0}MLxb1'.format(j)
                         Flp_param = 'Spn{0}MLyb1'.format(j)
 
-                    Edg_max_val = abs(max(resultsdict[Edg_param]))
-                    Edg_min_val = abs(min(resultsdict[Edg_param]))
+                    Edg_min_val, Edg_max_val = np.abs(self.channel_range(resultsdict, cache_entry, Edg_param))
 
-                    Flp_max_val = abs(max(resultsdict[Flp_param]))
-                    Flp_min_val = abs(min(resultsdict[Flp_param]))
+                    Flp_min_val, Flp_max_val = np.abs(self.channel_range(resultsdict, cache_entry, Flp_param))
 
                     if j == 0:
                         Edg_max_array[i-1][0] = max(Edg_max_val, Edg_min_val)
@@ -2483,6 +2405,7 @@ class CreateFASTConstraints(Component):
                 if self.wndfiletype[spec_caseid] == 'turb':
 
                     from scipy.stats import norm
+                    import matplotlib.pyplot as plt
 
                     for j_index in range(0, 2):  # for both x,y bending moments
 
@@ -2706,6 +2629,8 @@ class CreateFASTConstraints(Component):
 
         if self.check_sgp_spline:
 
+            import matplotlib.pyplot as plt
+
             # plot splines
             spline_plot = np.linspace(0,1,200)
             DEMx_spline_plot = Akima(spline_pos, DEMx_max)
@@ -2789,14 +2714,90 @@ class CreateFASTConstraints(Component):
         for i in range(0, len(self.caseids)):
             resultsdict = params[self.caseids[i]]
 
-            maxdeflection = abs(max(resultsdict['OoPDefl1']))
-            mindeflection = abs(min(resultsdict['OoPDefl1']))
+            cache_entry = None
+            if self.use_FAST_cache:
+                cache_key, cache_entry = read_FAST_cache_case(FAST_opt_dir + '/' + 'sgp'
+                                                              + str(self.sgp[i // len(self.WNDfile_List)]) + '/'
+                                                              + self.caseids[i])
+
+            mindeflection, maxdeflection = np.abs(self.channel_range(resultsdict, cache_entry, 'OoPDefl1'))
 
             max_tip_def_array[i - 1] = max(maxdeflection, mindeflection)
 
         unknowns['max_tip_def'] = max(max_tip_def_array)
 
 
+class RunFASTCases(Component):
+    def __init__(self, FASTinfo, caseids):
+        super(RunFASTCases, self).__init__()
+
+        # FAST runs of the cases that are not in the FAST cache (FASTinfo['use_FAST_cache'], see FAST_cache.py). The
+        # cache hits are marked in cfg_master by CreateFASTConfig, so they are only known for a given design; the
+        # hits are left out of caseids before the FST7AeroElasticSolver group of the other cases is built (one
+        # problem per evaluation). The output of a cached case is empty, CreateFASTConstraints reads its cache entry.
+
+        self.caseids = caseids
+
+        self.Tmax_turb = FASTinfo['Tmax_turb']
+        self.Tmax_nonturb = FASTinfo['Tmax_nonturb']
+        self.rm_time = FASTinfo['rm_time']
+        self.wndfiletype = FASTinfo['wnd_type_list']
+        self.dT = FASTinfo['dT']
+        self.output_list = FASTinfo['output_list']
+        self.calculation_type = FASTinfo['calculation_type']
+
+        self.add_param('cfg_master', val=dict(), pass_by_obj=False)
+
+        for i in range(0, len(caseids)):
+            self.add_output(caseids[i], val=dict())
+
+    def solve_nonlinear(self, params, unknowns, resids):
+
+        from FST7_aeroelasticsolver import FST7AeroElasticSolver
+
+        cfg_master = params['cfg_master']
+
+        run_caseids = FAST_cache_run_caseids(cfg_master, self.caseids)
+        run_wndfiletype = [self.wndfiletype[self.caseids.index(caseid)] for caseid in run_caseids]
+
+        for caseid in self.caseids:
+            unknowns[caseid] = dict()
+
+        if len(run_caseids) == 0:
+            return
+
+        # same implementation / processes as the problem of this component
+        if self.calculation_type == 'sequential':
+            FAST_cases = Problem()
+        else:
+            from openmdao.core.petsc_impl import PetscImpl
+            FAST_cases = Problem(impl=PetscImpl, comm=self.comm)
+
+        FAST_cases.root = Group()
+        FAST_cases.root.add('FAST_cfg', IndepVarComp('cfg_master', cfg_master, pass_by_obj=True), promotes=['*'])
+        FAST_cases.root.add('ParallelFASTCases', FST7AeroElasticSolver(run_caseids, self.Tmax_turb, self.Tmax_nonturb,
+                                                                       self.rm_time, run_wndfiletype, self.dT,
+                                                                       self.output_list))
+        FAST_cases.root.connect('cfg_master', 'ParallelFASTCases.cfg_master')
+
+        FAST_cases.setup(check=False)
+        FAST_cases.run()
+
+        # outputs of the cases run by this process, then of the cases run by the other processes
+        results = dict()
+        for caseid in run_caseids:
+            name = 'ParallelFASTCases.' + caseid
+            if not FAST_cases.root.unknowns.metadata(name).get('remote', False):
+                results[caseid] = FAST_cases[name]
+
+        if hasattr(self.comm, 'allgather'):
+            for proc_results in self.comm.allgather(results):
+                results.update(proc_results)
+
+        for caseid in results:
+            unknowns[caseid] = results[caseid]
+
+
 class Blade_Damage(Group):
     def __init__(self, FASTinfo, naero=17, nstr=38):
         super(Blade_Damage, self).__init__()
@@ -2828,8 +2829,12 @@ class Blade_Damage(Group):
         if FASTinfo['Use_FAST_sm']:
 
             # create fit - can check to see if files already created either here or in component
-            pkl_file_name = FASTinfo['opt_dir'] + '/' + 'sm_x' + '_' + FASTinfo['approximation_model'] + '.pkl'
-            if not os.path.isfile(pkl_file_name):
+            if use_fused_sm(FASTinfo):
+                sm_file = sm_file_name(FASTinfo['opt_dir'], 'sm_fused', FASTinfo['approximation_model'], 'smb')
+            else:
+                sm_file = sm_file_name(FASTinfo['opt_dir'], 'sm_x', FASTinfo['approximation_model'],
+                                       FASTinfo['sm_file_type'])
+            if not os.path.isfile(sm_file):
 
                 self.add('FAST_sm_fit', calc_FAST_sm_fit(FASTinfo, naero, nstr))
 
@@ -2850,10 +2855,15 @@ class Blade_Damage(Group):
 
             from FST7_aeroelasticsolver import FST7Workflow, FST7AeroElasticSolver
 
-            self.add('ParallelFASTCases', FST7AeroElasticSolver(caseids, FASTinfo['Tmax_turb'],
-                                                                FASTinfo['Tmax_nonturb'], FASTinfo['rm_time'],
-                                                                FASTinfo['wnd_type_list'], FASTinfo['dT'],
-                                                                FASTinfo['output_list']))
+            # cases found in the FAST cache are not run: the group of FAST runs is built for the other cases when the
+            # cache hits are known (RunFASTCases)
+            if FASTinfo['use_FAST_cache']:
+                self.add('ParallelFASTCases', RunFASTCases(FASTinfo, caseids))
+            else:
+                self.add('ParallelFASTCases', FST7AeroElasticSolver(caseids, FASTinfo['Tmax_turb'],
+                                                                    FASTinfo['Tmax_nonturb'], FASTinfo['rm_time'],
+                                                                    FASTinfo['wnd_type_list'], FASTinfo['dT'],
+                                                                    FASTinfo['output_list']))
 
             self.connect('cfg_master', 'ParallelFASTCases.cfg_master')
 
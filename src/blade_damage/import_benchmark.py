@@ -0,0 +1,56 @@
+# import_benchmark.py measures how long it takes to import the modules used by the surrogate model path
+# (opt_with_surr_model), and fails if the import is slower than the given budget, or if modules only needed for
+# FAST runs / plotting are loaded
+#
+# python import_benchmark.py [budget (s)] [number of repeats]
+
+import json
+import subprocess
+import sys
+
+# modules that should not be loaded when only using the surrogate model
+heavy_modules = ['matplotlib', 'matlab', 'akima', 'smt']
+
+import_script = """
+import sys, time, json
+t0 = time.time()
+import damage_components
+import FAST_util
+t1 = time.time()
+heavy = [m for m in %s if m in sys.modules]
+print(json.dumps([t1 - t0, heavy]))
+""" % json.dumps(heavy_modules)
+
+if __name__ == "__main__":
+
+    budget = 2.0
+    num_repeats = 5
+
+    if len(sys.argv) > 1:
+        budget = float(sys.argv[1])
+    if len(sys.argv) > 2:
+        num_repeats = int(sys.argv[2])
+
+    # each import is done in a new process, as in the training point jobs launched from create_sm.py
+    import_times = []
+    heavy_loaded = []
+    for i in range(num_repeats):
+        output = subprocess.check_output([sys.executable, '-c', import_script])
+        import_time, heavy = json.loads(output.decode().strip().split('\n')[-1])
+        import_times.append(import_time)
+        heavy_loaded = heavy
+
+    import_times.sort()
+    median_time = import_times[len(import_times) // 2]
+
+    print('import time (s): median ' + str(round(median_time, 3)) + ', min ' + str(round(import_times[0], 3))
+          + ', max ' + str(round(import_times[-1], 3)) + ', budget ' + str(budget))
+
+    if heavy_loaded:
+        print('modules loaded at import: ' + ', '.join(heavy_loaded))
+
+    if median_time > budget or heavy_loaded:
+        print('Import benchmark failed.')
+        sys.exit(1)
+
+    print('Import benchmark passed.')
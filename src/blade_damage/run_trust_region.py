@@ -0,0 +1,217 @@
+from openmdao.api import Problem, ScipyOptimizer, ExecComp
+from damage_components import Blade_Damage
+import numpy as np
+from FAST_util import setupFAST, define_des_var_domains, des_var_domains, initialize_rotor_dv
+from sm_util import sm_design_vector, predict_batch
+from sm_trust_region import SMTrustRegion, calc_sm_correction, tr_output_names
+import os
+
+# optimization on the surrogate model inside a trust region; FAST is only run at the trust region center and at each
+# new design (see sm_trust_region.py)
+
+# objective - tr_objective[tr_objective_index] (FAST output name, surrogate model output is tr_objective + '_sm')
+# (root flapwise DEM here, replace with the RotorSE objective when coupled)
+tr_objective = 'DEMy'
+tr_objective_index = 0
+
+tr_des_var_names = ['chord_sub', 'theta_sub']
+
+# ========================================================================================================= #
+
+def initialize_inputs(FASTinfo, blade_damage):
+
+    # same as run.py
+    blade_damage = initialize_rotor_dv(FASTinfo, blade_damage)
+
+    blade_damage['turbine_class'] = FASTinfo['turbine_class']  # (Enum): IEC turbine class
+    blade_damage['turbulence_class'] = FASTinfo['turbulence_class']  # (Enum): IEC turbulence class class
+
+    # === airfoil files ===
+    basepath = os.path.join(os.path.dirname(os.path.realpath(__file__)), '5MW_AFFiles')
+
+    # load all airfoils
+    airfoil_types = [0]*8
+    airfoil_types[0] = os.path.join(basepath, 'Cylinder1.dat')
+    airfoil_types[1] = os.path.join(basepath, 'Cylinder2.dat')
+    airfoil_types[2] = os.path.join(basepath, 'DU40_A17.dat')
+    airfoil_types[3] = os.path.join(basepath, 'DU35_A17.dat')
+    airfoil_types[4] = os.path.join(basepath, 'DU30_A17.dat')
+    airfoil_types[5] = os.path.join(basepath, 'DU25_A17.dat')
+    airfoil_types[6] = os.path.join(basepath, 'DU21_A17.dat')
+    airfoil_types[7] = os.path.join(basepath, 'NACA64_A17.dat')
+
+    # place at appropriate radial stations
+    blade_damage['af_idx'] = np.array([0, 0, 1, 2, 3, 3, 4, 5, 5, 6, 6, 7, 7, 7, 7, 7, 7])
+
+    blade_damage['airfoil_types'] = airfoil_types  # (List): names of airfoil file or initialized CCAirfoils
+
+    # === blade grid ===
+    blade_damage['initial_aero_grid'] = np.array([0.02222276, 0.06666667, 0.11111057, 0.16666667, 0.23333333, 0.3,
+                                                  0.36666667, 0.43333333, 0.5, 0.56666667, 0.63333333, 0.7,
+                                                  0.76666667, 0.83333333, 0.88888943, 0.93333333,
+                                                  0.97777724])  # (Array): initial aerodynamic grid on unit radius
+    blade_damage['initial_str_grid'] = np.array([0.0, 0.00492790457512, 0.00652942887106, 0.00813095316699,
+                                                 0.00983257273154, 0.0114340970275, 0.0130356213234, 0.02222276,
+                                                 0.024446481932, 0.026048006228, 0.06666667, 0.089508406455,
+                                                 0.11111057, 0.146462614229, 0.16666667, 0.195309105255, 0.23333333,
+                                                 0.276686558545, 0.3, 0.333640766319,
+                                                 0.36666667, 0.400404310407, 0.43333333, 0.5, 0.520818918408,
+                                                 0.56666667, 0.602196371696, 0.63333333,
+                                                 0.667358391486, 0.683573824984, 0.7, 0.73242031601, 0.76666667,
+                                                 0.83333333, 0.88888943, 0.93333333, 0.97777724,
+                                                 1.0])  # (Array): initial structural grid on unit radius
+
+    blade_damage['rstar_damage'] = np.array([0.000, 0.022, 0.067, 0.111, 0.167, 0.233, 0.300, 0.367, 0.433, 0.500,
+        0.567, 0.633, 0.700, 0.767, 0.833, 0.889, 0.933, 0.978])  # (Array): nondimensional radial locations of damage equivalent moments
+
+    FASTinfo['nBlades'] = 3
+    blade_damage['nBlades'] = 3
+    blade_damage['bladeLength'] = FASTinfo['bladeLength']
+
+    return blade_damage
+
+# ========================================================================================================= #
+
+def set_top_level_options(FASTinfo, use_surr_model):
+
+    FASTinfo['calc_fixed_DEMs'] = False
+    FASTinfo['calc_fixed_DEMs_seq'] = False
+    FASTinfo['calc_surr_model'] = False
+    FASTinfo['opt_with_surr_model'] = use_surr_model
+    FASTinfo['opt_without_FAST'] = False
+    FASTinfo['opt_with_FAST_in_loop'] = not use_surr_model
+    FASTinfo['opt_with_fixed_DEMs'] = False
+    FASTinfo['opt_with_fixed_DEMs_seq'] = False
+
+    FASTinfo['opt_with_fatigue'] = False
+
+    return FASTinfo
+
+# ========================================================================================================= #
+
+def run_FAST(FASTinfo_FAST, blade_damage_FAST, design):
+
+    # FAST outputs of a single design, keyed on the surrogate model output names
+    for name in tr_des_var_names:
+        blade_damage_FAST[name] = design[name]
+
+    blade_damage_FAST.run()
+
+    FAST_values = dict()
+    for FAST_name, sm_name in tr_output_names:
+        FAST_values[sm_name] = np.array(blade_damage_FAST[FAST_name])
+
+    return FAST_values
+
+# ========================================================================================================= #
+
+def predict_sm(FASTinfo_sm, design):
+
+    # uncorrected surrogate model outputs of a single design
+    params = dict(design)
+    params['turbulence_intensity'] = FASTinfo_sm['turbulence_intensity']
+
+    sv = sm_design_vector(params, FASTinfo_sm['sm_var_names'], FASTinfo_sm['sm_var_index'])
+    DEMx_sm, DEMy_sm, Edg_sm, Flp_sm = predict_batch(sv, FASTinfo_sm)
+
+    return {'DEMx_sm': DEMx_sm[0], 'DEMy_sm': DEMy_sm[0], 'Edg_sm': Edg_sm[0], 'Flp_sm': Flp_sm[0]}
+
+# ========================================================================================================= #
+
+def optimize_sm(FASTinfo_sm, center):
+
+    # optimization of the corrected surrogate model inside the trust region (FASTinfo_sm['tr_bounds'])
+    blade_damage_sm = Problem()
+
+    blade_damage_sm.root = Blade_Damage(FASTinfo=FASTinfo_sm, naero=17, nstr=38)
+    blade_damage_sm.root.add('tr_objective', ExecComp('obj = ' + tr_objective + '_sm[' + str(tr_objective_index) + ']',
+                                                      **{tr_objective + '_sm': np.zeros(18)}), promotes=['*'])
+
+    blade_damage_sm.driver = ScipyOptimizer()
+    blade_damage_sm.driver.options['optimizer'] = 'SLSQP'
+    blade_damage_sm.driver.options['tol'] = 1e-6
+
+    FASTinfo_sm, blade_damage_sm = define_des_var_domains(FASTinfo_sm, blade_damage_sm)
+    blade_damage_sm.driver.add_objective('obj')
+
+    blade_damage_sm.setup(check=False)
+
+    blade_damage_sm = initialize_inputs(FASTinfo_sm, blade_damage_sm)
+    for name in tr_des_var_names:
+        blade_damage_sm[name] = center[name]
+
+    blade_damage_sm.run()
+
+    step = dict()
+    for name in tr_des_var_names:
+        step[name] = np.array(blade_damage_sm[name])
+
+    return step, float(blade_damage_sm['obj'])
+
+# ========================================================================================================= #
+
+if __name__ == "__main__":
+
+    # === surrogate model (already trained) === #
+    FASTinfo_sm = dict()
+    FASTinfo_sm = set_top_level_options(FASTinfo_sm, True)
+    FASTinfo_sm, blade_damage_sm = setupFAST(FASTinfo_sm, 'trained_data')
+
+    # === FAST (one run per design) === #
+    FASTinfo_FAST = dict()
+    FASTinfo_FAST = set_top_level_options(FASTinfo_FAST, False)
+    FASTinfo_FAST, blade_damage_FAST = setupFAST(FASTinfo_FAST, 'trust_region')
+
+    blade_damage_FAST.root = Blade_Damage(FASTinfo=FASTinfo_FAST, naero=17, nstr=38)
+    blade_damage_FAST.setup(check=False)
+    blade_damage_FAST = initialize_inputs(FASTinfo_FAST, blade_damage_FAST)
+
+    # === trust region === #
+    domains = des_var_domains(FASTinfo_sm)
+    for name in list(domains.keys()):
+        if name not in tr_des_var_names:
+            del domains[name]
+
+    trust_region = SMTrustRegion(domains, radius=FASTinfo_sm['tr_radius_init'], radius_min=FASTinfo_sm['tr_radius_min'])
+
+    center = dict()
+    for name in tr_des_var_names:
+        center[name] = np.array(blade_damage_FAST[name])
+
+    FAST_center = run_FAST(FASTinfo_FAST, blade_damage_FAST, center)
+    num_FAST_runs = 1
+
+    for tr_iter in range(FASTinfo_sm['tr_max_iter']):
+
+        # correct the surrogate model to match FAST at the center
+        FASTinfo_sm['sm_correction'] = calc_sm_correction(predict_sm(FASTinfo_sm, center), FAST_center,
+                                                          FASTinfo_sm['sm_correction_type'])
+        FASTinfo_sm['tr_bounds'] = trust_region.bounds(center)
+
+        step, sm_step = optimize_sm(FASTinfo_sm, center)
+
+        # validate the step with FAST
+        FAST_step = run_FAST(FASTinfo_FAST, blade_damage_FAST, step)
+        num_FAST_runs += 1
+
+        # (the corrected surrogate model matches FAST at the center)
+        FAST_center_obj = FAST_center[tr_objective + '_sm'][tr_objective_index]
+        FAST_step_obj = FAST_step[tr_objective + '_sm'][tr_objective_index]
+        rho = trust_region.ratio(FAST_center_obj, FAST_step_obj, FAST_center_obj, sm_step)
+
+        accepted = trust_region.update(rho, trust_region.on_boundary(center, step))
+
+        print('Trust region iteration ' + str(tr_iter) + ': rho = ' + str(rho) + ', radius = '
+              + str(trust_region.radius) + ', step accepted: ' + str(accepted))
+
+        if accepted:
+            center = step
+            FAST_center = FAST_step
+
+        if trust_region.converged():
+            break
+
+    print('Number of FAST runs: ' + str(num_FAST_runs))
+    for name in tr_des_var_names:
+        print(name + ': ' + str(center[name]))
+    print(tr_objective + ': ' + str(FAST_center[tr_objective + '_sm']))
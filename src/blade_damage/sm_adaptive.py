@@ -0,0 +1,189 @@
+# sm_adaptive.py includes functions used to choose surrogate model training points adaptively. A small latin
+# hypercube is run first, then points are added where the leave-one-out (LOO) error of the fit is largest, until the
+# cross-validated RMS error reaches a target (see the adaptive section of create_sm.py). Training points are read
+# from the store set by FASTinfo['sm_training_store'] (sm_master_<ft>.txt files, sm_store.bin or sm_training.db)
+#
+# LOO errors are computed in closed form on the unit-cube points of pointfile.txt:
+#   RBF, kriging, KPLS, KPLSK - e_i = c_i / inv(A)_ii, with A the RBF interpolation matrix and c = inv(A) y (Rippa)
+#   second_order_poly, least_squares - e_i = r_i / (1 - H_ii), with H the hat matrix of the least squares fit
+
+import os
+import numpy as np
+
+from sm_util import load_sm_training_data
+
+# ========================================================================================================= #
+
+def read_point_file(point_file):
+
+    f = open(point_file, "r")
+    lines = f.readlines()
+    f.close()
+
+    points = []
+    for i in range(len(lines)):
+        spec_line = lines[i].split()
+        if len(spec_line) > 0:
+            points.append([float(val) for val in spec_line])
+
+    return np.array(points)
+
+# ========================================================================================================= #
+
+def append_point_file(point_file, points):
+
+    f = open(point_file, "a")
+    for i in range(len(points)):
+        for j in range(len(points[i])):
+            f.write(str(points[i][j]))
+            f.write(' ')
+        f.write('\n')
+    f.close()
+
+# ========================================================================================================= #
+
+def merge_sm_point_files(opt_dir, sm_var_out_dir, point_indices, file_type=['var', 'DEM', 'load', 'def']):
+
+    # append the results of the given training points to the sm_master_<ft>.txt files, and remove the
+    # sm_<ft>_<i>.txt files (same as FAST_Files/remove_results_files.py, but for points added later)
+
+    dir_name = opt_dir + '/' + sm_var_out_dir + '/'
+
+    for ft in file_type:
+
+        file_master = dir_name + 'sm_master_' + ft + '.txt'
+
+        for i in point_indices:
+
+            file_name = dir_name + 'sm_' + ft + '_' + str(i) + '.txt'
+
+            if not os.path.isfile(file_name):
+                continue
+
+            f = open(file_name, "r")
+            lines = f.readlines()
+            f.close()
+
+            if not os.path.isfile(file_master):
+                f_master = open(file_master, "w+")
+                f_master.write(lines[0])
+            else:
+                f_master = open(file_master, "a")
+            f_master.write(lines[i + 1])
+            f_master.close()
+
+            os.remove(file_name)
+
+# ========================================================================================================= #
+
+def loo_errors(x, y, approximation_model, d0=1.0, reg=1e-10):
+
+    # x - (nt, nx) unit-cube training points, y - (nt, ny) outputs
+    # returns the (nt, ny) leave-one-out errors
+
+    if approximation_model in ['second_order_poly', 'least_squares']:
+
+        terms = [np.ones([x.shape[0], 1]), x]
+        if approximation_model == 'second_order_poly':
+            for i in range(x.shape[1]):
+                terms.append(x[:, i:i + 1] * x[:, i:])
+        B = np.hstack(terms)
+
+        B_pinv = np.linalg.pinv(B)
+        H_diag = np.sum(B * B_pinv.T, axis=1)
+        r = y - np.dot(B, np.dot(B_pinv, y))
+
+        return r / np.reshape(1.0 - H_diag, (-1, 1))
+
+    else:
+
+        dx = (x[:, np.newaxis, :] - x[np.newaxis, :, :]) / d0
+        A = np.exp(-np.sum(dx**2.0, axis=2)) + reg * np.eye(x.shape[0])
+
+        A_inv = np.linalg.inv(A)
+        c = np.dot(A_inv, y)
+
+        return c / np.reshape(np.diag(A_inv), (-1, 1))
+
+# ========================================================================================================= #
+
+def cv_rms(loo, y):
+
+    # RMS of the leave-one-out errors, each output normalized by its standard deviation
+    y_std = np.std(y, axis=0)
+    y_std[y_std == 0.0] = 1.0
+
+    return np.sqrt(np.mean((loo / y_std)**2.0))
+
+# ========================================================================================================= #
+
+def select_points(x, point_error, num_new, candidates):
+
+    # greedy choice of candidate points (unit cube) far from the training points x, weighted by the error at the
+    # nearest training point; each chosen point inherits the error of its nearest training point
+    x = np.array(x)
+    point_error = np.array(point_error)
+    candidates = np.array(candidates)
+
+    new_points = []
+    for k in range(num_new):
+
+        dist = np.sqrt(np.sum((candidates[:, np.newaxis, :] - x[np.newaxis, :, :])**2.0, axis=2))
+        nearest = np.argmin(dist, axis=1)
+        score = dist[np.arange(len(candidates)), nearest] * point_error[nearest]
+
+        best = np.argmax(score)
+        new_points.append(candidates[best])
+
+        x = np.vstack([x, candidates[best]])
+        point_error = np.append(point_error, point_error[nearest[best]])
+        candidates = np.delete(candidates, best, axis=0)
+
+    return np.array(new_points)
+
+# ========================================================================================================= #
+
+def adaptive_sampling_step(FASTinfo, target_rms, num_new, num_candidates=2000):
+
+    # computes the cross-validated RMS of the current training points (FASTinfo['approximation_model']); if it is
+    # above target_rms, adds num_new points to pointfile.txt and returns their indices (empty if converged or
+    # FASTinfo['num_pts'] points reached)
+
+    point_file = FASTinfo['opt_dir'] + '/pointfile.txt'
+    max_pts = FASTinfo['num_pts']
+
+    points = read_point_file(point_file)
+
+    # points with all outputs, DEMs / loads over rated torque (same scale as the sm_master_<ft>.txt files)
+    var_values, DEMx, DEMy, Edg, Flp, tip_def, pt_index = \
+        load_sm_training_data(FASTinfo, len(points), 1.0, 1.0, return_pt=True)
+
+    # design variables that are not varied (ex. turbulence intensity) are left out of the distances
+    active = np.where(np.ptp(var_values, axis=0) > 0.0)[0]
+
+    x = points[pt_index][:, active]
+    y = np.hstack([DEMx, DEMy, Edg, Flp])
+
+    loo = loo_errors(x, y, FASTinfo['approximation_model'])
+    rms = cv_rms(loo, y)
+
+    if rms <= target_rms or len(points) >= max_pts:
+        return rms, []
+
+    y_std = np.std(y, axis=0)
+    y_std[y_std == 0.0] = 1.0
+    point_error = np.sqrt(np.mean((loo / y_std)**2.0, axis=1))
+
+    from pyDOE import lhs
+
+    candidates = lhs(points.shape[1], samples=num_candidates)
+    num_new = min(num_new, max_pts - len(points))
+    new_points = select_points(x, point_error, num_new, candidates[:, active])
+
+    # fill in non-varied design variables
+    new_full = candidates[:num_new].copy()
+    new_full[:, active] = new_points
+
+    append_point_file(point_file, new_full)
+
+    return rms, list(range(len(points), len(points) + num_new))
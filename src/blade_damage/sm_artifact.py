@@ -0,0 +1,629 @@
+# sm_artifact.py includes a compact, versioned binary format (.smb) for the surrogate models of FAST outputs, and
+# light-weight predictors that evaluate the stored fits without smt.
+#
+# file layout:
+#   magic (8 bytes), format version (uint32), header length (uint32), json header, padding,
+#   float64 blocks (each aligned to 8 bytes)
+# the float64 blocks are memory-mapped when the file is loaded, so a saved file is never rewritten in place: it is
+# written to a temporary file, then renamed over the old file (processes that still map the old file keep reading it)
+
+import os
+import json
+import struct
+import numpy as np
+
+# ========================================================================================================= #
+
+sm_artifact_magic = b'BDSMBIN\x00'
+sm_artifact_version = 1
+
+# approximation model -> stored model type
+sm_artifact_kind = {'second_order_poly': 'poly', 'least_squares': 'poly', 'RBF': 'rbf',
+                    'kriging': 'kriging', 'KPLS': 'kriging', 'KPLSK': 'kriging'}
+
+# ========================================================================================================= #
+
+class PolySM(object):
+
+    # least squares polynomial (degree 1 or 2) in standardized inputs
+
+    def __init__(self, X_offset, X_scale, coef, degree):
+
+        self.X_offset = X_offset
+        self.X_scale = X_scale
+        self.coef = coef
+        self.degree = int(degree)
+
+    def basis(self, x):
+
+        u = (x - self.X_offset) / self.X_scale
+
+        terms = [np.ones([u.shape[0], 1]), u]
+        if self.degree == 2:
+            for i in range(u.shape[1]):
+                terms.append(u[:, i:i + 1] * u[:, i:])
+
+        return np.hstack(terms)
+
+    def basis_derivatives(self, x, kx):
+
+        u = (x - self.X_offset) / self.X_scale
+        n, nx = u.shape
+
+        terms = [np.zeros([n, 1]), np.zeros([n, nx])]
+        terms[1][:, kx] = 1.0
+        if self.degree == 2:
+            for i in range(nx):
+                d_term = np.zeros([n, nx - i])
+                if i == kx:
+                    d_term += u[:, i:]
+                    d_term[:, 0] += u[:, i]
+                elif kx > i:
+                    d_term[:, kx - i] = u[:, i]
+                terms.append(d_term)
+
+        return np.hstack(terms) / self.X_scale[kx]
+
+    def predict_values(self, x):
+
+        return np.dot(self.basis(np.atleast_2d(x)), self.coef)
+
+    def predict_derivatives(self, x, kx):
+
+        return np.dot(self.basis_derivatives(np.atleast_2d(x), kx), self.coef)
+
+# ========================================================================================================= #
+
+class RBFSM(object):
+
+    # gaussian radial basis functions, exp(-sum(((x - xt) / d0)^2)), with optional constant / linear trend
+
+    def __init__(self, xt, d0, sol, poly_degree):
+
+        self.xt = xt
+        self.d0 = d0
+        self.sol = sol
+        self.poly_degree = int(poly_degree)
+
+    def predict_values(self, x):
+
+        x = np.atleast_2d(x)
+        nt = self.xt.shape[0]
+
+        dx = (x[:, np.newaxis, :] - self.xt[np.newaxis, :, :]) / self.d0
+        phi = np.exp(-np.sum(dx**2.0, axis=2))
+
+        y = np.dot(phi, self.sol[:nt])
+        if self.poly_degree >= 0:
+            y += self.sol[nt]
+        if self.poly_degree == 1:
+            y += np.dot(x, self.sol[nt + 1:])
+
+        return y
+
+    def predict_derivatives(self, x, kx):
+
+        x = np.atleast_2d(x)
+        nt = self.xt.shape[0]
+
+        dx = (x[:, np.newaxis, :] - self.xt[np.newaxis, :, :]) / self.d0
+        phi = np.exp(-np.sum(dx**2.0, axis=2))
+        d_phi = -2.0 * phi * dx[:, :, kx] / self.d0[kx]
+
+        dy = np.dot(d_phi, self.sol[:nt])
+        if self.poly_degree == 1:
+            dy += self.sol[nt + 1 + kx]
+
+        return dy
+
+# ========================================================================================================= #
+
+class KrigingSM(object):
+
+    # kriging predictor (KRG, KPLS, KPLSK), r = exp(-sum(theta * |dx|^power)) with constant / linear regression
+    # theta is given per input dimension (KPLS components are folded back into the input space)
+
+    def __init__(self, X_offset, X_scale, X_norma, y_mean, y_std, theta, beta, gamma, power, poly_degree):
+
+        self.X_offset = X_offset
+        self.X_scale = X_scale
+        self.X_norma = X_norma
+        self.y_mean = y_mean
+        self.y_std = y_std
+        self.theta = theta
+        self.beta = beta
+        self.gamma = gamma
+        self.power = float(power)
+        self.poly_degree = int(poly_degree)
+
+    def correlation(self, x):
+
+        u = (np.atleast_2d(x) - self.X_offset) / self.X_scale
+        dx = u[:, np.newaxis, :] - self.X_norma[np.newaxis, :, :]
+        r = np.exp(-np.sum(self.theta * np.abs(dx)**self.power, axis=2))
+
+        return u, dx, r
+
+    def predict_values(self, x):
+
+        u, dx, r = self.correlation(x)
+
+        y = np.dot(r, self.gamma) + self.beta[0]
+        if self.poly_degree == 1:
+            y += np.dot(u, self.beta[1:])
+
+        return self.y_mean + self.y_std * y
+
+    def predict_derivatives(self, x, kx):
+
+        u, dx, r = self.correlation(x)
+
+        if self.power == 2.0:
+            d_r = -2.0 * self.theta[kx] * dx[:, :, kx] * r
+        else:
+            d_r = -self.theta[kx] * np.sign(dx[:, :, kx]) * r
+
+        dy = np.dot(d_r, self.gamma)
+        if self.poly_degree == 1:
+            dy += self.beta[1 + kx]
+
+        return self.y_std * dy / self.X_scale[kx]
+
+# ========================================================================================================= #
+
+class FusedSM(object):
+
+    # several surrogate models trained on the same inputs with the same basis (polynomial or RBF), evaluated as
+    # one model with a stacked weight matrix; predictions are split back into the outputs of each model
+
+    def __init__(self, sm, names, sizes):
+
+        self.sm = sm
+        self.names = list(names)
+        self.sizes = [int(size) for size in sizes]
+
+    def split(self, y):
+
+        y_list = []
+        start = 0
+        for size in self.sizes:
+            y_list.append(y[:, start:start + size])
+            start += size
+
+        return y_list
+
+    def predict_values(self, x):
+
+        return self.split(self.sm.predict_values(x))
+
+    def predict_derivatives(self, x, kx):
+
+        return self.split(self.sm.predict_derivatives(x, kx))
+
+    def output(self, name):
+
+        return FusedSMOutput(self, self.names.index(name))
+
+# ========================================================================================================= #
+
+class FusedSMOutput(object):
+
+    # one of the models in a FusedSM, with the same interface as a single surrogate model
+
+    def __init__(self, fused_sm, index):
+
+        self.fused_sm = fused_sm
+        self.index = index
+
+    def predict_values(self, x):
+
+        return self.fused_sm.predict_values(x)[self.index]
+
+    def predict_derivatives(self, x, kx):
+
+        return self.fused_sm.predict_derivatives(x, kx)[self.index]
+
+# ========================================================================================================= #
+
+class ColumnSM(object):
+
+    # one surrogate model per output column (trained separately, see sm_train.py), with the same interface as a
+    # single surrogate model
+
+    def __init__(self, models):
+
+        self.models = list(models)
+
+    def predict_values(self, x):
+
+        return np.hstack([model.predict_values(x) for model in self.models])
+
+    def predict_derivatives(self, x, kx):
+
+        return np.hstack([model.predict_derivatives(x, kx) for model in self.models])
+
+# ========================================================================================================= #
+
+class PCASM(object):
+
+    # surrogate model of the principal component scores of the outputs (see fit_output_pca), with the same interface
+    # as a single surrogate model; the outputs are reconstructed as y_mean + scores * components
+
+    def __init__(self, sm, y_mean, components):
+
+        self.sm = sm
+        self.y_mean = y_mean
+        self.components = components
+
+    def predict_values(self, x):
+
+        return self.y_mean + np.dot(self.sm.predict_values(x), self.components)
+
+    def predict_derivatives(self, x, kx):
+
+        return np.dot(self.sm.predict_derivatives(x, kx), self.components)
+
+# ========================================================================================================= #
+
+def fit_output_pca(yt, num_components):
+
+    # yt - (nt, ny) training outputs (ex. DEMs at each strain gage)
+    # num_components - number of principal components, or (< 1) fraction of the variance of the standardized
+    # outputs that is kept
+    # returns y_mean (ny,), components (nc, ny) and the scores (nt, nc) of the training points
+
+    y_mean = np.mean(yt, axis=0)
+    y_std = np.std(yt, axis=0)
+    y_std[y_std == 0.0] = 1.0
+
+    U, s, Vt = np.linalg.svd((yt - y_mean) / y_std, full_matrices=False)
+
+    if num_components < 1.0:
+        variance = np.cumsum(s**2.0)
+        if variance[-1] > 0.0:
+            num_components = np.searchsorted(variance / variance[-1], num_components) + 1
+        else:
+            num_components = 1
+
+    num_components = max(1, min(int(num_components), len(s)))
+
+    return y_mean, Vt[:num_components] * y_std, U[:, :num_components] * s[:num_components]
+
+# ========================================================================================================= #
+
+def stack_output_pca(y_mean_list, components_list):
+
+    # mean / block diagonal components of several output blocks, for one PCASM of stacked outputs (FusedSM)
+    num_components = sum([np.shape(components)[0] for components in components_list])
+    num_outputs = sum([np.shape(components)[1] for components in components_list])
+
+    components_all = np.zeros([num_components, num_outputs])
+    row = 0
+    col = 0
+    for components in components_list:
+        components_all[row:row + components.shape[0], col:col + components.shape[1]] = components
+        row += components.shape[0]
+        col += components.shape[1]
+
+    return np.concatenate(y_mean_list), components_all
+
+# ========================================================================================================= #
+
+# approximation models that can be fused
+sm_fused_models = ['second_order_poly', 'least_squares', 'RBF']
+
+def fit_fused_sm(xt, yt_list, names, approximation_model, d0=5.0, reg=1e-10):
+
+    # xt - (nt, nx) training inputs, yt_list - (nt, ny_i) training outputs of each model
+    # the basis / kernel matrix is built and factorized once for all outputs
+
+    if approximation_model not in sm_fused_models:
+        raise Exception('Only ' + ', '.join(sm_fused_models) + ' fits can be fused.')
+
+    xt = np.array(xt, dtype=float)
+    yt = np.hstack(yt_list)
+
+    if approximation_model == 'RBF':
+
+        # same interpolation problem as smt RBF (no polynomial trend)
+        d0 = np.array(np.atleast_1d(d0), dtype=float)
+        if len(d0) == 1:
+            d0 = d0 * np.ones(xt.shape[1])
+
+        sm = RBFSM(xt, d0, None, -1)
+        dx = (xt[:, np.newaxis, :] - xt[np.newaxis, :, :]) / d0
+        mtx = np.exp(-np.sum(dx**2.0, axis=2)) + reg * np.eye(xt.shape[0])
+        sm.sol = np.linalg.solve(mtx, yt)
+
+    else:
+
+        X_offset = np.mean(xt, axis=0)
+        X_scale = np.std(xt, axis=0)
+        X_scale[X_scale == 0.0] = 1.0
+
+        if approximation_model == 'second_order_poly':
+            sm = PolySM(X_offset, X_scale, None, 2)
+        else:
+            sm = PolySM(X_offset, X_scale, None, 1)
+        sm.coef = np.linalg.lstsq(sm.basis(xt), yt, rcond=None)[0]
+
+    return FusedSM(sm, names, [np.shape(y)[1] for y in yt_list])
+
+# ========================================================================================================= #
+
+def sm_training_data(sm):
+
+    # training inputs / outputs of an smt surrogate model
+    if hasattr(sm, 'training_points'):
+        xt, yt = sm.training_points[None][0]
+    else:
+        xt, yt = sm.training_pts['exact'][0]
+
+    return np.array(xt, dtype=float), np.atleast_2d(np.array(yt, dtype=float).T).T
+
+# ========================================================================================================= #
+
+def sm_to_blocks(sm, approximation_model):
+
+    # reduce a trained smt surrogate model to the float64 arrays needed for prediction
+
+    if approximation_model not in sm_artifact_kind:
+        raise Exception('Unknown approximation model ' + str(approximation_model) + ', cannot store fit.')
+
+    kind = sm_artifact_kind[approximation_model]
+    attrs = {'kind': kind, 'approximation_model': approximation_model}
+
+    if kind == 'poly':
+
+        # polynomial coefficients are recomputed from the training data (same least squares problem as smt)
+        xt, yt = sm_training_data(sm)
+
+        X_offset = np.mean(xt, axis=0)
+        X_scale = np.std(xt, axis=0)
+        X_scale[X_scale == 0.0] = 1.0
+
+        if approximation_model == 'second_order_poly':
+            attrs['degree'] = 2
+        else:
+            attrs['degree'] = 1
+
+        poly = PolySM(X_offset, X_scale, None, attrs['degree'])
+        coef = np.linalg.lstsq(poly.basis(xt), yt, rcond=None)[0]
+
+        blocks = {'X_offset': X_offset, 'X_scale': X_scale, 'coef': coef}
+
+    elif kind == 'rbf':
+
+        xt, yt = sm_training_data(sm)
+
+        d0 = np.array(np.atleast_1d(sm.options['d0']), dtype=float)
+        if len(d0) == 1:
+            d0 = d0 * np.ones(xt.shape[1])
+
+        attrs['poly_degree'] = sm.options['poly_degree']
+
+        blocks = {'xt': xt, 'd0': d0, 'sol': np.array(sm.sol, dtype=float)}
+
+    else:
+
+        corr = sm.options['corr']
+        if corr == 'squar_exp':
+            attrs['power'] = 2.0
+        elif corr == 'abs_exp':
+            attrs['power'] = 1.0
+        else:
+            raise Exception('Correlation function ' + str(corr) + ' cannot be stored, use squar_exp or abs_exp.')
+
+        poly = sm.options['poly']
+        if poly == 'constant':
+            attrs['poly_degree'] = 0
+        elif poly == 'linear':
+            attrs['poly_degree'] = 1
+        else:
+            raise Exception('Regression model ' + str(poly) + ' cannot be stored, use constant or linear.')
+
+        # normalization (attribute names changed between smt versions)
+        if hasattr(sm, 'X_offset'):
+            X_offset, X_scale = sm.X_offset, sm.X_scale
+        else:
+            X_offset, X_scale = sm.X_mean, sm.X_std
+
+        X_norma = np.array(sm.X_norma, dtype=float)
+        theta = np.array(sm.optimal_theta, dtype=float).flatten()
+
+        # KPLS - fold the hyperparameters of the PLS components back into the input space
+        if len(theta) != X_norma.shape[1]:
+            if attrs['power'] == 2.0:
+                theta = np.dot(sm.coeff_pls**2.0, theta)
+            else:
+                theta = np.dot(np.abs(sm.coeff_pls), theta)
+
+        blocks = {'X_offset': np.array(X_offset, dtype=float).flatten(),
+                  'X_scale': np.array(X_scale, dtype=float).flatten(),
+                  'X_norma': X_norma,
+                  'y_mean': np.array(sm.y_mean, dtype=float).flatten(),
+                  'y_std': np.array(sm.y_std, dtype=float).flatten(),
+                  'theta': theta,
+                  'beta': np.array(sm.optimal_par['beta'], dtype=float),
+                  'gamma': np.array(sm.optimal_par['gamma'], dtype=float)}
+
+    return attrs, blocks
+
+# ========================================================================================================= #
+
+def blocks_to_sm(attrs, blocks):
+
+    kind = attrs['kind']
+
+    if kind == 'columns':
+        models = []
+        for i in range(len(attrs['column_attrs'])):
+            prefix = 'column' + str(i) + '/'
+            column_blocks = dict()
+            for name in blocks:
+                if name.startswith(prefix):
+                    column_blocks[name[len(prefix):]] = blocks[name]
+            models.append(blocks_to_sm(attrs['column_attrs'][i], column_blocks))
+        return ColumnSM(models)
+    elif 'fused_names' in attrs:
+        sm_attrs = dict(attrs)
+        del sm_attrs['fused_names'], sm_attrs['fused_sizes']
+        return FusedSM(blocks_to_sm(sm_attrs, blocks), attrs['fused_names'], attrs['fused_sizes'])
+    elif kind == 'pca':
+        inner_blocks = dict()
+        for name in blocks:
+            if name.startswith('inner/'):
+                inner_blocks[name[len('inner/'):]] = blocks[name]
+        return PCASM(blocks_to_sm(attrs['inner_attrs'], inner_blocks), blocks['pca_mean'], blocks['pca_components'])
+    elif kind == 'poly':
+        return PolySM(blocks['X_offset'], blocks['X_scale'], blocks['coef'], attrs['degree'])
+    elif kind == 'rbf':
+        return RBFSM(blocks['xt'], blocks['d0'], blocks['sol'], attrs['poly_degree'])
+    elif kind == 'kriging':
+        return KrigingSM(blocks['X_offset'], blocks['X_scale'], blocks['X_norma'], blocks['y_mean'],
+                         blocks['y_std'], blocks['theta'], blocks['beta'], blocks['gamma'],
+                         attrs['power'], attrs['poly_degree'])
+    else:
+        raise Exception('Unknown surrogate model type ' + str(kind) + ' in stored fit.')
+
+# ========================================================================================================= #
+
+def predictor_to_blocks(sm, approximation_model):
+
+    # PolySM / RBFSM (fit without smt, see fit_fused_sm), or a predictor rebuilt from blocks (see sm_train.py)
+    attrs = {'approximation_model': approximation_model}
+
+    if isinstance(sm, PolySM):
+        attrs['kind'] = 'poly'
+        attrs['degree'] = sm.degree
+        blocks = {'X_offset': sm.X_offset, 'X_scale': sm.X_scale, 'coef': sm.coef}
+    elif isinstance(sm, KrigingSM):
+        attrs['kind'] = 'kriging'
+        attrs['power'] = sm.power
+        attrs['poly_degree'] = sm.poly_degree
+        blocks = {'X_offset': sm.X_offset, 'X_scale': sm.X_scale, 'X_norma': sm.X_norma, 'y_mean': sm.y_mean,
+                  'y_std': sm.y_std, 'theta': sm.theta, 'beta': sm.beta, 'gamma': sm.gamma}
+    else:
+        attrs['kind'] = 'rbf'
+        attrs['poly_degree'] = sm.poly_degree
+        blocks = {'xt': sm.xt, 'd0': sm.d0, 'sol': sm.sol}
+
+    return attrs, blocks
+
+# ========================================================================================================= #
+
+def fused_sm_to_blocks(fused_sm, approximation_model):
+
+    attrs, blocks = model_to_blocks(fused_sm.sm, approximation_model)
+    attrs['fused_names'] = fused_sm.names
+    attrs['fused_sizes'] = fused_sm.sizes
+
+    return attrs, blocks
+
+# ========================================================================================================= #
+
+def pca_sm_to_blocks(pca_sm, approximation_model):
+
+    inner_attrs, inner_blocks = model_to_blocks(pca_sm.sm, approximation_model)
+
+    attrs = {'kind': 'pca', 'approximation_model': approximation_model, 'inner_attrs': inner_attrs}
+    blocks = {'pca_mean': pca_sm.y_mean, 'pca_components': pca_sm.components}
+    for name in inner_blocks:
+        blocks['inner/' + name] = inner_blocks[name]
+
+    return attrs, blocks
+
+# ========================================================================================================= #
+
+def column_sm_to_blocks(column_sm, approximation_model):
+
+    attrs = {'kind': 'columns', 'approximation_model': approximation_model, 'column_attrs': []}
+    blocks = dict()
+
+    for i in range(len(column_sm.models)):
+        column_attrs, column_blocks = model_to_blocks(column_sm.models[i], approximation_model)
+        attrs['column_attrs'].append(column_attrs)
+        for name in column_blocks:
+            blocks['column' + str(i) + '/' + name] = column_blocks[name]
+
+    return attrs, blocks
+
+# ========================================================================================================= #
+
+def model_to_blocks(sm, approximation_model):
+
+    if isinstance(sm, FusedSM):
+        return fused_sm_to_blocks(sm, approximation_model)
+    elif isinstance(sm, ColumnSM):
+        return column_sm_to_blocks(sm, approximation_model)
+    elif isinstance(sm, PCASM):
+        return pca_sm_to_blocks(sm, approximation_model)
+    elif isinstance(sm, (PolySM, RBFSM, KrigingSM)):
+        return predictor_to_blocks(sm, approximation_model)
+
+    return sm_to_blocks(sm, approximation_model)
+
+# ========================================================================================================= #
+
+def save_sm_artifact(file_name, sm, approximation_model):
+
+    attrs, blocks = model_to_blocks(sm, approximation_model)
+
+    # block offsets (in float64 values) from the start of the data section
+    block_names = sorted(blocks.keys())
+    header = {'attrs': attrs, 'blocks': []}
+    offset = 0
+    for name in block_names:
+        blocks[name] = np.ascontiguousarray(blocks[name], dtype='<f8')
+        header['blocks'].append([name, offset, list(blocks[name].shape)])
+        offset += blocks[name].size
+    header['size'] = offset
+
+    header_bytes = json.dumps(header).encode('utf-8')
+    pad = (-(len(sm_artifact_magic) + 8 + len(header_bytes))) % 8
+
+    tmp_file_name = file_name + '.' + str(os.getpid()) + '.tmp'
+    file_handle = open(tmp_file_name, "wb")
+    file_handle.write(sm_artifact_magic)
+    file_handle.write(struct.pack('<II', sm_artifact_version, len(header_bytes) + pad))
+    file_handle.write(header_bytes + b' ' * pad)
+    for name in block_names:
+        file_handle.write(blocks[name].tobytes())
+    file_handle.flush()
+    os.fsync(file_handle.fileno())
+    file_handle.close()
+
+    os.rename(tmp_file_name, file_name)
+
+# ========================================================================================================= #
+
+def load_sm_artifact(file_name):
+
+    file_handle = open(file_name, "rb")
+    magic = file_handle.read(len(sm_artifact_magic))
+    if magic != sm_artifact_magic:
+        file_handle.close()
+        raise Exception(file_name + ' is not a surrogate model file.')
+
+    version, header_len = struct.unpack('<II', file_handle.read(8))
+    if version > sm_artifact_version:
+        file_handle.close()
+        raise Exception(file_name + ' has file format version ' + str(version) + ', only versions up to '
+                        + str(sm_artifact_version) + ' can be read.')
+
+    header = json.loads(file_handle.read(header_len).decode('utf-8'))
+    data_start = file_handle.tell()
+    file_handle.close()
+
+    # (a zero-length file region cannot be memory-mapped)
+    if header['size'] > 0:
+        data = np.memmap(file_name, dtype='<f8', mode='r', offset=data_start, shape=(header['size'],))
+    else:
+        data = np.zeros(0)
+
+    blocks = dict()
+    for name, offset, shape in header['blocks']:
+        size = int(np.prod(shape))
+        blocks[name] = data[offset:offset + size].reshape(shape)
+
+    return blocks_to_sm(header['attrs'], blocks)
@@ -0,0 +1,315 @@
+# sm_db.py includes a SQLite database of surrogate model training points (sm_training.db in
+# sm_var_dir_<turb>_<class>_<af>), written by Calculate_FAST_sm_training_points when
+# FASTinfo['sm_training_store'] = 'db', and shared by the fit, merge (combine_sm_db) and export (sm_db_to_master)
+# functions below.
+#
+# one row per training point, keyed on (campaign, pt), where campaign is the optimization description
+# (ex. test_5MW); rows are indexed by turbine template, turbulence class and point id.
+# values are stored the same way as in the sm_master_<ft>.txt files:
+#   var - chord_sub / bladeLength, theta_sub, turbulence intensity
+#   DEM - DEMx, DEMy / rated torque, load - Edg_max, Flp_max / rated torque, def - max tip deflection / bladeLength
+#
+# on a local disk, the database is opened in WAL mode, so parallel training jobs can write to it at the same time
+# as it is read. WAL needs shared memory between the processes using the database, which network / cluster file
+# systems (NFS, Lustre, GPFS, ...) do not provide, and can corrupt the database there, so on those file systems the
+# default rollback journal (journal_mode=DELETE) is used; writers then wait for readers. SQLite locking on network
+# file systems is only as reliable as their fcntl locks: when in doubt, use FASTinfo['sm_training_store'] = 'bin'.
+
+import os
+import sqlite3
+import numpy as np
+
+from sm_util import read_sm_master
+
+# ========================================================================================================= #
+
+sm_db_file_name = 'sm_training.db'
+
+# seconds a writer waits for another writer to finish
+sm_db_timeout = 600.0
+
+# file system types (/proc/mounts) that WAL mode is not used on
+sm_db_shared_fs = ['nfs', 'nfs4', 'cifs', 'smbfs', 'smb3', 'lustre', 'gpfs', 'beegfs', 'ceph', 'fuse.glusterfs',
+                   'glusterfs', 'panfs', 'afs', 'fuse.sshfs']
+
+sm_db_schema = [
+    'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)',
+    'CREATE TABLE IF NOT EXISTS points (campaign TEXT NOT NULL, pt INTEGER NOT NULL, template TEXT, '
+    'turbulence_class TEXT, turbine_class TEXT, airfoil TEXT, var BLOB, DEM BLOB, load BLOB, def REAL, '
+    'rated_tq REAL, bladeLength REAL, PRIMARY KEY (campaign, pt))',
+    'CREATE INDEX IF NOT EXISTS points_index ON points (template, turbulence_class, pt)',
+]
+
+# ========================================================================================================= #
+
+def sm_db_fs_type(file_name):
+
+    # type of the file system the database is on (longest matching mount point of /proc/mounts), None if unknown
+    path = os.path.realpath(os.path.dirname(os.path.abspath(file_name)))
+
+    try:
+        f = open('/proc/mounts', "r")
+        mounts = f.readlines()
+        f.close()
+    except EnvironmentError:
+        return None
+
+    fs_type = None
+    mount_len = -1
+    for line in mounts:
+        fields = line.split()
+        if len(fields) < 3:
+            continue
+        # (spaces in mount points are written as \040)
+        mount_point = fields[1].replace('\\040', ' ')
+        if (path == mount_point or path.startswith(mount_point.rstrip('/') + '/')) and len(mount_point) > mount_len:
+            fs_type = fields[2]
+            mount_len = len(mount_point)
+
+    return fs_type
+
+# ========================================================================================================= #
+
+def sm_db_journal_mode(file_name):
+
+    # WAL on local disks, rollback journal on network / cluster file systems (see top of file)
+    if sm_db_fs_type(file_name) in sm_db_shared_fs:
+        return 'DELETE'
+
+    return 'WAL'
+
+# ========================================================================================================= #
+
+def connect_sm_db(file_name):
+
+    db = sqlite3.connect(file_name, timeout=sm_db_timeout)
+    db.execute('PRAGMA journal_mode=' + sm_db_journal_mode(file_name))
+    db.execute('PRAGMA synchronous=NORMAL')
+
+    for statement in sm_db_schema:
+        db.execute(statement)
+    db.commit()
+
+    return db
+
+# ========================================================================================================= #
+
+def sm_db_campaign(FASTinfo):
+
+    # columns that identify where a training point came from
+    return {'campaign': FASTinfo['description'], 'template': FASTinfo['FAST_template_name'],
+            'turbulence_class': FASTinfo['turbulence_class'], 'turbine_class': FASTinfo['turbine_class'],
+            'airfoil': FASTinfo['airfoil_group_name']}
+
+# ========================================================================================================= #
+
+def insert_sm_point(file_name, campaign, pt, var, DEM, load, tip_def, rated_tq=0.0, bladeLength=0.0,
+                    var_header=None):
+
+    # campaign - dict from sm_db_campaign
+    db = connect_sm_db(file_name)
+
+    db.execute('INSERT OR REPLACE INTO points (campaign, pt, template, turbulence_class, turbine_class, airfoil, '
+               'var, DEM, load, def, rated_tq, bladeLength) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+               (campaign['campaign'], int(pt), campaign['template'], campaign['turbulence_class'],
+                campaign['turbine_class'], campaign['airfoil'], sm_db_blob(var), sm_db_blob(DEM), sm_db_blob(load),
+                float(np.asarray(tip_def).flatten()[0]), float(np.asarray(rated_tq).flatten()[0]),
+                float(np.asarray(bladeLength).flatten()[0])))
+
+    if var_header is not None:
+        db.execute('INSERT OR IGNORE INTO meta (key, value) VALUES (?, ?)', ('var_header', var_header))
+
+    db.commit()
+    db.close()
+
+# ========================================================================================================= #
+
+def sm_db_blob(values):
+
+    return sqlite3.Binary(np.ascontiguousarray(np.asarray(values, dtype='<f8').flatten()).tobytes())
+
+# ========================================================================================================= #
+
+def sm_db_where(campaigns=None, template=None, turbulence_class=None, pt_min=None, pt_max=None, pt_list=None):
+
+    # WHERE clause / arguments of a training point query (None - no restriction)
+    # pt_max can be one value for all campaigns, or one value per campaign (same order as campaigns)
+    conditions = []
+    args = []
+
+    if campaigns is not None:
+        if pt_max is not None and hasattr(pt_max, '__len__'):
+            campaign_conditions = []
+            for i in range(len(campaigns)):
+                campaign_conditions.append('(campaign = ? AND pt < ?)')
+                args += [campaigns[i], int(pt_max[i])]
+            conditions.append('(' + ' OR '.join(campaign_conditions) + ')')
+            pt_max = None
+        else:
+            conditions.append('campaign IN (' + ', '.join(['?'] * len(campaigns)) + ')')
+            args += list(campaigns)
+
+    if template is not None:
+        conditions.append('template = ?')
+        args.append(template)
+
+    if turbulence_class is not None:
+        conditions.append('turbulence_class = ?')
+        args.append(turbulence_class)
+
+    if pt_min is not None:
+        conditions.append('pt >= ?')
+        args.append(int(pt_min))
+
+    if pt_max is not None:
+        conditions.append('pt < ?')
+        args.append(int(pt_max))
+
+    if pt_list is not None:
+        conditions.append('pt IN (' + ', '.join(['?'] * len(pt_list)) + ')')
+        args += [int(pt) for pt in pt_list]
+
+    if len(conditions) == 0:
+        return '', args
+
+    return ' WHERE ' + ' AND '.join(conditions), args
+
+# ========================================================================================================= #
+
+def query_sm_db(file_name, campaigns=None, template=None, turbulence_class=None, pt_min=None, pt_max=None,
+                pt_list=None):
+
+    # returns a dict of dense arrays, ordered by campaign and point id:
+    # 'campaign', 'pt' (N,), 'var' (N, num_var), 'DEM' (N, 2*18), 'load' (N, 2*nstr), 'def', 'rated_tq',
+    # 'bladeLength' (N,)
+    db = connect_sm_db(file_name)
+
+    where, args = sm_db_where(campaigns, template, turbulence_class, pt_min, pt_max, pt_list)
+    rows = db.execute('SELECT campaign, pt, var, DEM, load, def, rated_tq, bladeLength FROM points' + where +
+                      ' ORDER BY campaign, pt', args).fetchall()
+    db.close()
+
+    points = {'campaign': np.array([row[0] for row in rows]), 'pt': np.array([row[1] for row in rows], dtype=int),
+              'def': np.array([row[5] for row in rows]), 'rated_tq': np.array([row[6] for row in rows]),
+              'bladeLength': np.array([row[7] for row in rows])}
+
+    # blobs of all rows are decoded at once
+    for col, name in [[2, 'var'], [3, 'DEM'], [4, 'load']]:
+        if len(rows) == 0:
+            points[name] = np.zeros([0, 0])
+        else:
+            values = np.frombuffer(b''.join([bytes(row[col]) for row in rows]), dtype='<f8')
+            points[name] = values.reshape(len(rows), -1).copy()
+
+    return points
+
+# ========================================================================================================= #
+
+def sm_db_var_header(file_name):
+
+    db = connect_sm_db(file_name)
+    row = db.execute('SELECT value FROM meta WHERE key = ?', ('var_header',)).fetchone()
+    db.close()
+
+    if row is None:
+        return 'variable points: '
+
+    return row[0]
+
+# ========================================================================================================= #
+
+def sm_db_to_master(file_name, dir_name, **query):
+
+    # writes sm_master_{var,DEM,load,def}.txt (same format as FAST_Files/remove_results_files.py) for the training
+    # points selected by query (see query_sm_db)
+    points = query_sm_db(file_name, **query)
+
+    var_header = sm_db_var_header(file_name) + '\n'
+
+    master_values = [['var', 'num_pt_', points['var']], ['DEM', 'pt_', points['DEM']],
+                     ['load', 'pt_', points['load']], ['def', 'pt_', np.reshape(points['def'], (-1, 1))]]
+
+    for ft, label, values in master_values:
+
+        f = open(dir_name + '/sm_master_' + ft + '.txt', "w+")
+        f.write(var_header)
+        for i in range(len(points['pt'])):
+            f.write(label + str(points['pt'][i]) + ' ' + ' '.join([repr(float(val)) for val in values[i]]) + '\n')
+        f.close()
+
+# ========================================================================================================= #
+
+def combine_sm_db(src_files, dest_file, src_num=None):
+
+    # copies the training points of each source database (first src_num[i] points, all if None) to the destination
+    # database, replaces FAST_Files/combine_sm_results.py for training points stored in databases
+    db = connect_sm_db(dest_file)
+
+    for i in range(len(src_files)):
+
+        db.execute('ATTACH DATABASE ? AS src', (src_files[i],))
+
+        if src_num is None:
+            db.execute('INSERT OR REPLACE INTO points SELECT * FROM src.points')
+        else:
+            db.execute('INSERT OR REPLACE INTO points SELECT * FROM src.points WHERE pt < ?', (int(src_num[i]),))
+        db.execute('INSERT OR IGNORE INTO meta SELECT * FROM src.meta')
+
+        db.commit()
+        db.execute('DETACH DATABASE src')
+
+    db.close()
+
+# ========================================================================================================= #
+
+def import_sm_master(dir_name, file_name, campaign):
+
+    # adds the training points of existing sm_master_<ft>.txt files to the database
+    pt_var, var = read_sm_master(dir_name + '/sm_master_var.txt')
+    pt_DEM, DEM = read_sm_master(dir_name + '/sm_master_DEM.txt')
+    pt_load, load = read_sm_master(dir_name + '/sm_master_load.txt')
+    pt_def, tip_def = read_sm_master(dir_name + '/sm_master_def.txt')
+
+    f = open(dir_name + '/sm_master_var.txt', "r")
+    var_header = f.readline().strip('\n')
+    f.close()
+
+    DEM_row = dict(zip(pt_DEM, range(len(pt_DEM))))
+    load_row = dict(zip(pt_load, range(len(pt_load))))
+    def_row = dict(zip(pt_def, range(len(pt_def))))
+
+    rows = []
+    for i in range(len(pt_var)):
+
+        pt = pt_var[i]
+        if pt not in DEM_row or pt not in load_row:
+            continue
+
+        # (a point without a tip deflection is not a training point of every output, same as a missing DEM / load)
+        if pt not in def_row:
+            print('Warning: training point ' + str(pt) + ' has no tip deflection in ' + dir_name
+                  + '/sm_master_def.txt, it is not imported.')
+            continue
+
+        pt_tip_def = float(tip_def[def_row[pt]][0])
+
+        rows.append((campaign['campaign'], int(pt), campaign['template'], campaign['turbulence_class'],
+                     campaign['turbine_class'], campaign['airfoil'], sm_db_blob(var[i]), sm_db_blob(DEM[DEM_row[pt]]),
+                     sm_db_blob(load[load_row[pt]]), pt_tip_def, 0.0, 0.0))
+
+    db = connect_sm_db(file_name)
+    db.executemany('INSERT OR REPLACE INTO points (campaign, pt, template, turbulence_class, turbine_class, airfoil, '
+                   'var, DEM, load, def, rated_tq, bladeLength) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+    db.execute('INSERT OR IGNORE INTO meta (key, value) VALUES (?, ?)', ('var_header', var_header))
+    db.commit()
+    db.close()
+
+# ========================================================================================================= #
+
+if __name__ == "__main__":
+
+    # python sm_db.py <opt_dir>/<sm_var_out_dir>
+    # writes the sm_master_<ft>.txt files used by calc_FAST_sm_fit from the database
+    import sys
+
+    sm_db_to_master(os.path.join(sys.argv[1], sm_db_file_name), sys.argv[1])
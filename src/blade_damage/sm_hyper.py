@@ -0,0 +1,229 @@
+# sm_hyper.py includes a grid search over the hyperparameters of the surrogate models (FASTinfo['sm_hyper_search'],
+# see calc_FAST_sm_fit):
+#   RBF - d0, kriging - theta0 (initial value, all dimensions), KPLS, KPLSK - theta0 and number of PLS components
+#
+# each candidate is scored by its cross validated rms error (same folds for all candidates, all fits in one pool of
+# processes, see compare_sm_models in sm_train.py). Scores are appended to <opt_dir>/sm_hyper_cache.txt as they
+# are computed, keyed on the training data, so an interrupted or extended search only scores new candidates.
+# The best settings are saved in <opt_dir>/sm_hyper_<approximation_model>.json, next to the surrogate model files,
+# and later fits load them from there (load_sm_hyper) when no new search is run.
+
+import os
+import json
+import zlib
+import numpy as np
+from multiprocessing import Pool
+
+from sm_train import compare_sm_task, cv_fold_points, cv_error_stats, sm_kfolds, sm_spec, sm_train_num_procs, \
+    approximation_sm
+
+# ========================================================================================================= #
+
+# default candidate values of each hyperparameter
+sm_hyper_grid_values = {'d0': [0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 50.0],
+                        'theta0': [1e-3, 1e-2, 1e-1, 1.0],
+                        'n_comp': [1, 2, 3]}
+
+# hyperparameters searched for each approximation model
+sm_hyper_names = {'RBF': ['d0'], 'kriging': ['theta0'], 'KPLS': ['theta0', 'n_comp'],
+                  'KPLSK': ['theta0', 'n_comp']}
+
+sm_hyper_cache_file_name = 'sm_hyper_cache.txt'
+
+# ========================================================================================================= #
+
+def sm_hyper_file_name(opt_dir, approximation_model):
+
+    return opt_dir + '/sm_hyper_' + approximation_model + '.json'
+
+# ========================================================================================================= #
+
+def sm_hyper_grid(approximation_model, num_var, grid_values=None):
+
+    # list of candidate settings (dicts of hyperparameter values), empty for models without hyperparameters
+    if grid_values is None:
+        grid_values = sm_hyper_grid_values
+
+    if approximation_model not in sm_hyper_names:
+        return []
+
+    candidates = [dict()]
+    for name in sm_hyper_names[approximation_model]:
+
+        values = grid_values[name]
+        if name == 'n_comp':
+            values = [value for value in values if value <= num_var]
+
+        new_candidates = []
+        for candidate in candidates:
+            for value in values:
+                new_candidate = dict(candidate)
+                new_candidate[name] = value
+                new_candidates.append(new_candidate)
+        candidates = new_candidates
+
+    return candidates
+
+# ========================================================================================================= #
+
+def sm_hyper_key(approximation_model, settings, xt, yt_list, num_folds, seed):
+
+    # identifies a score: candidate, training data and folds
+    crc = zlib.crc32(np.ascontiguousarray(xt, dtype='<f8').tobytes())
+    for yt in yt_list:
+        crc = zlib.crc32(np.ascontiguousarray(yt, dtype='<f8').tobytes(), crc)
+
+    return json.dumps([approximation_model, settings, crc & 0xffffffff, list(np.shape(xt)), num_folds, seed],
+                      sort_keys=True)
+
+# ========================================================================================================= #
+
+def read_sm_hyper_cache(cache_file):
+
+    # key -> [rms_error, max_error]
+    scores = dict()
+    if not os.path.isfile(cache_file):
+        return scores
+
+    f = open(cache_file, "r")
+    for line in f:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            # line cut off by an interrupted search
+            continue
+        scores[entry['key']] = [entry['rms_error'], entry['max_error']]
+    f.close()
+
+    return scores
+
+# ========================================================================================================= #
+
+def append_sm_hyper_cache(cache_file, key, approximation_model, settings, rms_error, max_error):
+
+    f = open(cache_file, "a")
+    f.write(json.dumps({'key': key, 'approximation_model': approximation_model, 'settings': settings,
+                        'rms_error': rms_error, 'max_error': max_error}, sort_keys=True) + '\n')
+    f.close()
+
+# ========================================================================================================= #
+
+def search_sm_hyper(approximation_model, names, xt, yt_list, cache_file, num_folds=5, num_procs=1, grid_values=None,
+                    theta0_val=[1e-2], seed=0):
+
+    # xt - (nt, nx) training inputs, yt_list - (nt, ny_i) training outputs of each model
+    # returns the best settings ({} for models without hyperparameters) and their cross validated rms error
+
+    xt = np.ascontiguousarray(xt, dtype=float)
+    yt_list = [np.ascontiguousarray(yt, dtype=float) for yt in yt_list]
+
+    num_pts = len(xt) - len(xt) % num_folds
+    candidates = sm_hyper_grid(approximation_model, xt.shape[1], grid_values)
+    if len(candidates) == 0:
+        return dict(), np.nan
+
+    keys = [sm_hyper_key(approximation_model, settings, xt, yt_list, num_folds, seed) for settings in candidates]
+    scores = read_sm_hyper_cache(cache_file)
+
+    kfolds = sm_kfolds(num_pts, num_folds, seed)
+    fold_pts = cv_fold_points(kfolds, num_pts)
+
+    # fits of the candidates that have not been scored yet
+    tasks = []
+    num_tasks = dict()
+    for c in range(len(candidates)):
+        if keys[c] in scores:
+            continue
+        spec = sm_spec(approximation_sm(approximation_model, theta0_val, xt.shape[1], candidates[c]))
+        num_tasks[c] = num_folds * len(names)
+        for j in range(num_folds):
+            for i in range(len(names)):
+                tasks.append((c, num_pts, j, names[i], spec, xt, yt_list[i], fold_pts[j][0], fold_pts[j][1]))
+
+    print('Hyperparameter search (' + approximation_model + '): ' + str(len(candidates)) + ' candidates, '
+          + str(len(candidates) - len(num_tasks)) + ' already scored')
+
+    yt_cv = dict()
+    failed = dict()
+    for c in num_tasks:
+        yt_cv[c] = [np.zeros([num_pts, yt.shape[1]]) for yt in yt_list]
+
+    def add_result(result):
+
+        # scores a candidate (and saves the score) once all of its fits are done
+        c, pts, fold, name, yt_fold, train_time, predict_time = result
+
+        if yt_fold is None:
+            failed[c] = train_time
+        else:
+            yt_cv[c][names.index(name)][fold_pts[fold][1]] = yt_fold
+
+        num_tasks[c] -= 1
+        if num_tasks[c] > 0:
+            return
+
+        if c in failed:
+            print('  ' + json.dumps(candidates[c], sort_keys=True) + ' failed: ' + failed[c])
+            rms_error = np.inf
+            max_error = np.inf
+        else:
+            rms_error = []
+            max_error = []
+            for i in range(len(names)):
+                stats = cv_error_stats(yt_list[i][:num_pts], yt_cv[c][i], kfolds)
+                rms_error.append(stats['rms_error'])
+                max_error.append(np.max(stats['max_percent_error']))
+            rms_error = float(np.sqrt(np.mean(np.array(rms_error) ** 2.0)))
+            max_error = float(np.max(max_error))
+
+        scores[keys[c]] = [rms_error, max_error]
+        append_sm_hyper_cache(cache_file, keys[c], approximation_model, candidates[c], rms_error, max_error)
+        del yt_cv[c]
+
+    num_procs = sm_train_num_procs(num_procs, max(len(tasks), 1))
+
+    if num_procs == 1:
+        for task in tasks:
+            add_result(compare_sm_task(task))
+    else:
+        pool = Pool(num_procs)
+        try:
+            for result in pool.imap_unordered(compare_sm_task, tasks):
+                add_result(result)
+        finally:
+            pool.close()
+            pool.join()
+
+    rms_error = np.array([scores[key][0] for key in keys], dtype=float)
+    best = int(np.argmin(rms_error))
+
+    for c in range(len(candidates)):
+        print('  ' + json.dumps(candidates[c], sort_keys=True) + ': rms error ' + str(rms_error[c] * 100.0) + ' %')
+
+    if not np.isfinite(rms_error[best]):
+        raise Exception('All ' + approximation_model + ' hyperparameter candidates failed.')
+
+    return candidates[best], float(rms_error[best])
+
+# ========================================================================================================= #
+
+def save_sm_hyper(file_name, approximation_model, settings, rms_error):
+
+    f = open(file_name, "w+")
+    json.dump({'approximation_model': approximation_model, 'settings': settings, 'rms_error': rms_error}, f,
+              sort_keys=True, indent=4)
+    f.close()
+
+# ========================================================================================================= #
+
+def load_sm_hyper(file_name):
+
+    # best settings of a previous search ({} if there was none)
+    if not os.path.isfile(file_name):
+        return dict()
+
+    f = open(file_name, "r")
+    settings = json.load(f)['settings']
+    f.close()
+
+    return settings
@@ -0,0 +1,222 @@
+# sm_server.py holds the surrogate models of FAST outputs in memory and serves DEM / extreme load predictions
+# to optimizations running in other processes (use_FAST_surr_model with FASTinfo['use_sm_server'] = True)
+#
+# start the server (one per node) with
+#   python sm_server.py [socket file]
+# models are loaded the first time a given opt_dir / approximation model is requested, and stay in memory
+#
+# the connection accepts pickles, so only the user that started the server may use it: the default socket is in a
+# directory only that user can access ($XDG_RUNTIME_DIR/blade_damage_sm, or <tmp>/blade_damage_sm_<uid>, mode 0700),
+# and each server start writes a random authentication key to <socket file>.key (mode 0600), which clients read
+# (or take from the BLADE_DAMAGE_SM_AUTHKEY environment variable, hex encoded)
+
+import os
+import sys
+import binascii
+import tempfile
+from multiprocessing import AuthenticationError
+from multiprocessing.managers import BaseManager
+
+from sm_util import predict_batch, predict_batch_derivatives, sm_cache_stats
+
+# ========================================================================================================= #
+
+sm_server_socket_name = 'sm_server.sock'
+sm_server_authkey_env = 'BLADE_DAMAGE_SM_AUTHKEY'
+
+# FASTinfo entries needed to make a prediction
+sm_server_keys = ['opt_dir', 'approximation_model', 'sm_file_type', 'fused_sm', 'num_var', 'var_index',
+                  'sm_var_names', 'bladeLength']
+
+# ========================================================================================================= #
+
+class SMServer(object):
+
+    def predict(self, designs, FASTinfo, bladeLength=None):
+
+        return predict_batch(designs, FASTinfo, bladeLength)
+
+    def predict_derivatives(self, designs, FASTinfo, bladeLength=None):
+
+        return predict_batch_derivatives(designs, FASTinfo, bladeLength)
+
+    def cache_stats(self):
+
+        return sm_cache_stats()
+
+# ========================================================================================================= #
+
+class SMServerManager(BaseManager):
+    pass
+
+# ========================================================================================================= #
+
+def sm_server_dir():
+
+    # per-user directory of the default socket, created with mode 0700; an existing directory that belongs to
+    # another user or can be accessed by other users is not used
+    if os.environ.get('XDG_RUNTIME_DIR'):
+        dir_name = os.path.join(os.environ['XDG_RUNTIME_DIR'], 'blade_damage_sm')
+    else:
+        dir_name = os.path.join(tempfile.gettempdir(), 'blade_damage_sm_' + str(os.getuid()))
+
+    try:
+        os.mkdir(dir_name, 0o700)
+    except OSError:
+        pass
+
+    stat = os.lstat(dir_name)
+    if not os.path.isdir(dir_name) or os.path.islink(dir_name) or stat.st_uid != os.getuid() \
+            or stat.st_mode & 0o077:
+        raise Exception(dir_name + ' is not a directory private to this user, cannot use it for the surrogate model '
+                        'server.')
+
+    return dir_name
+
+# ========================================================================================================= #
+
+def sm_server_address(address=None):
+
+    if address is None:
+        return os.path.join(sm_server_dir(), sm_server_socket_name)
+
+    return os.path.abspath(address)
+
+# ========================================================================================================= #
+
+def sm_server_key_file(address):
+
+    return address + '.key'
+
+# ========================================================================================================= #
+
+def write_sm_server_authkey(address):
+
+    # new random key for each server start, readable by this user only
+    authkey = os.urandom(32)
+
+    key_file = sm_server_key_file(address)
+    if os.path.lexists(key_file):
+        os.remove(key_file)
+
+    fd = os.open(key_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    try:
+        os.write(fd, binascii.hexlify(authkey))
+    finally:
+        os.close(fd)
+
+    return authkey
+
+# ========================================================================================================= #
+
+def read_sm_server_authkey(address):
+
+    # None if there is no key (server not started)
+    if os.environ.get(sm_server_authkey_env):
+        return binascii.unhexlify(os.environ[sm_server_authkey_env].strip())
+
+    key_file = sm_server_key_file(address)
+    if not os.path.isfile(key_file):
+        return None
+
+    f = open(key_file, "rb")
+    authkey = binascii.unhexlify(f.read().strip())
+    f.close()
+
+    return authkey
+
+# ========================================================================================================= #
+
+def serve_sm(address=None):
+
+    address = sm_server_address(address)
+
+    if os.path.exists(address):
+        os.remove(address)
+
+    sm_server = SMServer()
+    SMServerManager.register('get_sm_server', callable=lambda: sm_server)
+
+    manager = SMServerManager(address=address, authkey=write_sm_server_authkey(address))
+    server = manager.get_server()
+
+    print('Surrogate model server listening on ' + address)
+    server.serve_forever()
+
+# ========================================================================================================= #
+
+# connection of this process to the server; False if the server could not be reached
+_sm_client = dict()
+
+def get_sm_client(address=None):
+
+    address = sm_server_address(address)
+
+    if address not in _sm_client:
+
+        _sm_client[address] = False
+
+        authkey = read_sm_server_authkey(address)
+
+        if os.path.exists(address) and authkey is not None:
+            SMServerManager.register('get_sm_server')
+            manager = SMServerManager(address=address, authkey=authkey)
+            try:
+                manager.connect()
+                _sm_client[address] = manager.get_sm_server()
+            except (EnvironmentError, EOFError, AuthenticationError):
+                print('Surrogate model server at ' + address + ' not available, loading models in this process.')
+
+    return _sm_client[address]
+
+# ========================================================================================================= #
+
+def sm_server_info(FASTinfo):
+
+    sm_info = dict()
+    for key in sm_server_keys:
+        sm_info[key] = FASTinfo[key]
+
+    # (relative paths would be resolved against the working directory of the server)
+    sm_info['opt_dir'] = os.path.abspath(FASTinfo['opt_dir'])
+
+    return sm_info
+
+# ========================================================================================================= #
+
+def predict_batch_client(designs, FASTinfo, bladeLength=None):
+
+    # same as predict_batch, but uses the server if it is running
+    sm_client = get_sm_client(FASTinfo['sm_server_address'])
+
+    if sm_client:
+        try:
+            return sm_client.predict(designs, sm_server_info(FASTinfo), bladeLength)
+        except (EnvironmentError, EOFError):
+            _sm_client[sm_server_address(FASTinfo['sm_server_address'])] = False
+
+    return predict_batch(designs, FASTinfo, bladeLength)
+
+# ========================================================================================================= #
+
+def predict_batch_derivatives_client(designs, FASTinfo, bladeLength=None):
+
+    # same as predict_batch_derivatives, but uses the server if it is running
+    sm_client = get_sm_client(FASTinfo['sm_server_address'])
+
+    if sm_client:
+        try:
+            return sm_client.predict_derivatives(designs, sm_server_info(FASTinfo), bladeLength)
+        except (EnvironmentError, EOFError):
+            _sm_client[sm_server_address(FASTinfo['sm_server_address'])] = False
+
+    return predict_batch_derivatives(designs, FASTinfo, bladeLength)
+
+# ========================================================================================================= #
+
+if __name__ == "__main__":
+
+    if len(sys.argv) > 1:
+        serve_sm(sys.argv[1])
+    else:
+        serve_sm()
@@ -0,0 +1,371 @@
+# sm_store.py includes an append-only binary file for surrogate model training points (sm_store.bin in
+# sm_var_dir_<turb>_<class>_<af>), written by Calculate_FAST_sm_training_points when
+# FASTinfo['sm_training_store'] = 'bin'. Each training point is one fixed-width record appended to the file, so
+# training jobs no longer rewrite the place holder lines of the sm_<ft>_<i>.txt files.
+#
+# file layout:
+#   magic (8 bytes), format version (uint32), header length (uint32), json header, padding, records
+# record:
+#   point id (int64), crc32 of the write time and values (uint32), unused (uint32), write time (float64, seconds
+#   since the epoch), values (float64):
+#   design variables (chord_sub / bladeLength, theta_sub, turbulence intensity), DEMx, DEMy, Edg_max, Flp_max,
+#   max tip deflection, rated torque, blade length
+#
+# each record is appended with a single write and fsync'd; partially written records (crashed jobs) fail the crc
+# check and are skipped by the reader. If a point is written more than once, the record written last (write time,
+# so the clocks of the nodes writing shards need to be synchronized) is used, whatever its position in the files.
+#
+# training jobs write each point to its own shard (sm_store.bin.shards/pt_<i>_<host>_<pid>.bin, renamed into place
+# when complete), so parallel jobs never write to the same file. compact_sm_store moves the shards into the store;
+# it runs when the training points are loaded for the fit, or with python sm_store.py <dir>. Readers include
+# shards that have not been compacted yet, and hold the compaction lock (shared) while reading the store and shards.
+
+import os
+import json
+import socket
+import struct
+import time
+import zlib
+import numpy as np
+
+# ========================================================================================================= #
+
+sm_store_magic = b'BDSMPTS\x00'
+sm_store_version = 2
+
+sm_store_file_name = 'sm_store.bin'
+
+# ========================================================================================================= #
+
+def sm_store_fields(header):
+
+    # [name, number of values] of each record field
+    return [['var', header['num_var']], ['DEMx', header['num_DEM']], ['DEMy', header['num_DEM']],
+            ['Edg', header['nstr']], ['Flp', header['nstr']], ['tip_def', 1], ['rated_tq', 1],
+            ['bladeLength', 1]]
+
+# ========================================================================================================= #
+
+def sm_store_dtype(header):
+
+    num_values = 0
+    for name, size in sm_store_fields(header):
+        num_values += size
+
+    return np.dtype([('pt', '<i8'), ('crc', '<u4'), ('unused', '<u4'), ('time', '<f8'),
+                     ('values', '<f8', (num_values,))])
+
+# ========================================================================================================= #
+
+def sm_store_header_bytes(header):
+
+    header_bytes = json.dumps(header, sort_keys=True).encode('utf-8')
+    pad = (-(len(sm_store_magic) + 8 + len(header_bytes))) % 8
+
+    return sm_store_magic + struct.pack('<II', sm_store_version, len(header_bytes) + pad) + header_bytes + b' ' * pad
+
+# ========================================================================================================= #
+
+def read_sm_store_header(file_handle, file_name):
+
+    magic = file_handle.read(len(sm_store_magic))
+    if magic != sm_store_magic:
+        raise Exception(file_name + ' is not a training point store.')
+
+    version, header_len = struct.unpack('<II', file_handle.read(8))
+    if version != sm_store_version:
+        raise Exception(file_name + ' has file format version ' + str(version) + ', only version '
+                        + str(sm_store_version) + ' can be read (the training points need to be written again).')
+
+    return json.loads(file_handle.read(header_len).decode('utf-8'))
+
+# ========================================================================================================= #
+
+def create_sm_store(file_name, num_var, num_DEM, nstr, var_header=''):
+
+    # creates the store if it does not exist yet (safe when several training jobs start at once), and checks that
+    # an existing store has the same record layout
+    header = {'num_var': int(num_var), 'num_DEM': int(num_DEM), 'nstr': int(nstr), 'var_header': var_header}
+
+    if not os.path.isfile(file_name):
+
+        # write the header to a temporary file, then link it into place (only one job succeeds)
+        tmp_file_name = file_name + '.' + str(os.getpid()) + '.tmp'
+        f = open(tmp_file_name, "wb")
+        f.write(sm_store_header_bytes(header))
+        f.flush()
+        os.fsync(f.fileno())
+        f.close()
+
+        try:
+            os.link(tmp_file_name, file_name)
+        except OSError:
+            pass
+        os.remove(tmp_file_name)
+
+    f = open(file_name, "rb")
+    file_header = read_sm_store_header(f, file_name)
+    f.close()
+
+    check_sm_store_layout(file_name, file_header, header)
+
+    return file_header
+
+# ========================================================================================================= #
+
+def check_sm_store_layout(file_name, file_header, header):
+
+    for key in ['num_var', 'num_DEM', 'nstr']:
+        if file_header[key] != header[key]:
+            raise Exception(file_name + ' has ' + key + ' = ' + str(file_header[key]) + ', but training points with '
+                            + key + ' = ' + str(header[key]) + ' are being written.')
+
+# ========================================================================================================= #
+
+def sm_store_record(pt, var, DEMx, DEMy, Edg, Flp, tip_def, rated_tq, bladeLength):
+
+    values = np.concatenate([np.asarray(var, dtype='<f8').flatten(), np.asarray(DEMx, dtype='<f8').flatten(),
+                             np.asarray(DEMy, dtype='<f8').flatten(), np.asarray(Edg, dtype='<f8').flatten(),
+                             np.asarray(Flp, dtype='<f8').flatten(), np.asarray(tip_def, dtype='<f8').flatten(),
+                             np.asarray(rated_tq, dtype='<f8').flatten(),
+                             np.asarray(bladeLength, dtype='<f8').flatten()])
+
+    # (the write time orders copies of the same point)
+    value_bytes = struct.pack('<d', time.time()) + values.tobytes()
+
+    return struct.pack('<qII', int(pt), zlib.crc32(value_bytes) & 0xffffffff, 0) + value_bytes
+
+# ========================================================================================================= #
+
+def append_sm_records(file_name, record_bytes):
+
+    # one write, appended atomically with respect to other writers on a local file system
+    fd = os.open(file_name, os.O_WRONLY | os.O_APPEND)
+    try:
+        os.write(fd, record_bytes)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+# ========================================================================================================= #
+
+def sm_shard_dir(file_name):
+
+    return file_name + '.shards'
+
+# ========================================================================================================= #
+
+def write_sm_shard(file_name, num_var, num_DEM, nstr, var_header, pt, var, DEMx, DEMy, Edg, Flp, tip_def, rated_tq,
+                   bladeLength):
+
+    # writes one training point as its own small store file (shard) next to the store, without touching the store
+    # or files of other jobs; the shard is written to a temporary file, then renamed into place, so compaction
+    # only ever sees complete shards (safe on shared / network file systems)
+    shard_dir = sm_shard_dir(file_name)
+    if not os.path.isdir(shard_dir):
+        try:
+            os.mkdir(shard_dir)
+        except OSError:
+            pass
+
+    header = {'num_var': int(num_var), 'num_DEM': int(num_DEM), 'nstr': int(nstr), 'var_header': var_header}
+    record = sm_store_record(pt, var, DEMx, DEMy, Edg, Flp, tip_def, rated_tq, bladeLength)
+
+    shard_name = 'pt_' + str(int(pt)) + '_' + socket.gethostname() + '_' + str(os.getpid())
+
+    tmp_file_name = shard_dir + '/.' + shard_name + '.tmp'
+    f = open(tmp_file_name, "wb")
+    f.write(sm_store_header_bytes(header) + record)
+    f.flush()
+    os.fsync(f.fileno())
+    f.close()
+
+    os.rename(tmp_file_name, shard_dir + '/' + shard_name + '.bin')
+
+# ========================================================================================================= #
+
+def sm_shard_files(file_name):
+
+    shard_dir = sm_shard_dir(file_name)
+    if not os.path.isdir(shard_dir):
+        return []
+
+    shard_files = []
+    for shard_name in sorted(os.listdir(shard_dir)):
+        if shard_name.endswith('.bin'):
+            shard_files.append(shard_dir + '/' + shard_name)
+
+    return shard_files
+
+# ========================================================================================================= #
+
+def lock_sm_store(file_name, exclusive):
+
+    # advisory lock of the store: exclusive while compacting, shared while reading, so a reader never lists a shard
+    # that is moved into the store after the store has been read. Shard writers do not take the lock.
+    import fcntl
+
+    lock_file = open(file_name + '.lock', "a")
+    fcntl.flock(lock_file.fileno(), [fcntl.LOCK_SH, fcntl.LOCK_EX][exclusive])
+
+    return lock_file
+
+# ========================================================================================================= #
+
+def unlock_sm_store(lock_file):
+
+    import fcntl
+
+    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+    lock_file.close()
+
+# ========================================================================================================= #
+
+def compact_sm_store(file_name):
+
+    # moves the records of all shards into the store (creating it if needed), then removes the shards; one
+    # compaction runs at a time, writers are never blocked. If compaction stops between appending and removing a
+    # shard, the record is appended again next time (same write time, so either copy can be used).
+    lock_file = lock_sm_store(file_name, True)
+
+    try:
+        shard_files = sm_shard_files(file_name)
+
+        store_header = None
+        record_bytes = []
+        for shard_file in shard_files:
+
+            header, records = read_sm_store_records(shard_file)
+
+            # (the shard needs the record layout of the store)
+            if store_header is None:
+                store_header = create_sm_store(file_name, header['num_var'], header['num_DEM'], header['nstr'],
+                                               header['var_header'])
+            check_sm_store_layout(file_name, store_header, header)
+
+            record_bytes.append(records.tobytes())
+
+        if len(record_bytes) > 0:
+            append_sm_records(file_name, b''.join(record_bytes))
+
+        for shard_file in shard_files:
+            os.remove(shard_file)
+
+    finally:
+        unlock_sm_store(lock_file)
+
+    return len(shard_files)
+
+# ========================================================================================================= #
+
+def read_sm_store_records(file_name):
+
+    # header and records (with a valid crc) of a store or shard file
+
+    f = open(file_name, "rb")
+    header = read_sm_store_header(f, file_name)
+    data = f.read()
+    f.close()
+
+    dtype = sm_store_dtype(header)
+
+    # a record cut off at the end of the file is ignored
+    num_records = len(data) // dtype.itemsize
+    records = np.frombuffer(data, dtype=dtype, count=num_records)
+
+    valid = np.zeros(num_records, dtype=bool)
+    for i in range(num_records):
+        record_bytes = records['time'][i].tobytes() + records['values'][i].tobytes()
+        valid[i] = (zlib.crc32(record_bytes) & 0xffffffff) == records['crc'][i]
+
+    return header, records[valid]
+
+# ========================================================================================================= #
+
+def read_sm_store(file_name):
+
+    # returns the header and a dict of dense arrays, sorted by point id:
+    # 'pt' (N,), 'var' (N, num_var), 'DEMx', 'DEMy' (N, num_DEM), 'Edg', 'Flp' (N, nstr),
+    # 'tip_def', 'rated_tq', 'bladeLength' (N,)
+    # shards that have not been compacted yet are included
+
+    header = None
+    records = []
+
+    # (no compaction while the store and shards are read)
+    lock_file = lock_sm_store(file_name, False)
+
+    try:
+        if os.path.isfile(file_name):
+            header, store_records = read_sm_store_records(file_name)
+            records.append(store_records)
+
+        for shard_file in sm_shard_files(file_name):
+            shard_header, shard_records = read_sm_store_records(shard_file)
+            if header is None:
+                header = shard_header
+            records.append(shard_records)
+
+    finally:
+        unlock_sm_store(lock_file)
+
+    if header is None:
+        raise Exception('No training points found in ' + file_name + '.')
+
+    records = np.concatenate(records)
+
+    # record of each point written last (sorted by point id, then write time)
+    order = np.lexsort((records['time'], records['pt']))
+    records = records[order]
+    last = np.ones(len(records), dtype=bool)
+    last[:-1] = records['pt'][1:] != records['pt'][:-1]
+    pt = records['pt'][last]
+    values = records['values'][last]
+
+    points = {'pt': pt}
+    col = 0
+    for name, size in sm_store_fields(header):
+        if size == 1:
+            points[name] = values[:, col].copy()
+        else:
+            points[name] = values[:, col:col + size].copy()
+        col += size
+
+    return header, points
+
+# ========================================================================================================= #
+
+def sm_store_to_master(file_name, dir_name):
+
+    # writes sm_master_{var,DEM,load,def}.txt (same format as FAST_Files/remove_results_files.py) from the store
+    header, points = read_sm_store(file_name)
+
+    var_header = header['var_header'] + '\n'
+
+    DEM = np.hstack([points['DEMx'], points['DEMy']]) / np.reshape(points['rated_tq'], (-1, 1))
+    load = np.hstack([points['Edg'], points['Flp']]) / np.reshape(points['rated_tq'], (-1, 1))
+    tip_def = np.reshape(points['tip_def'] / points['bladeLength'], (-1, 1))
+
+    master_values = [['var', 'num_pt_', points['var']], ['DEM', 'pt_', DEM], ['load', 'pt_', load],
+                     ['def', 'pt_', tip_def]]
+
+    for ft, label, values in master_values:
+
+        f = open(dir_name + '/sm_master_' + ft + '.txt', "w+")
+        f.write(var_header)
+        for i in range(len(points['pt'])):
+            f.write(label + str(points['pt'][i]) + ' ' + ' '.join([repr(float(val)) for val in values[i]]) + '\n')
+        f.close()
+
+# ========================================================================================================= #
+
+if __name__ == "__main__":
+
+    # python sm_store.py <opt_dir>/<sm_var_out_dir>
+    # compacts the shards written by training jobs, and writes the sm_master_<ft>.txt files from the store
+    import sys
+
+    num_shards = compact_sm_store(sys.argv[1] + '/' + sm_store_file_name)
+    print(str(num_shards) + ' training point shards compacted.')
+
+    sm_store_to_master(sys.argv[1] + '/' + sm_store_file_name, sys.argv[1])
@@ -0,0 +1,518 @@
+# sm_train.py includes functions used to train the surrogate models of FAST outputs (sm_x, sm_y, sm_x_load,
+# sm_y_load) in parallel processes (see calc_FAST_sm_fit and FASTinfo['sm_train_procs'])
+#
+# the models are independent, so each is trained in its own process; with per_column, each output column gets its
+# own model (trained in its own process, combined in a ColumnSM). A model is trained the same way in a worker
+# process as in the main process, and a worker returns the trained smt model itself, so the fits are identical to
+# serial training. Trained smt models that can not be pickled (RBF in older smt versions) are returned as the arrays
+# needed for prediction instead (sm_to_blocks in sm_artifact.py), and the main process rebuilds light-weight
+# predictors from them (same predictions to round-off).
+#
+# cross_validate_sm trains one model per fold (and output) on the points outside the fold, predicts all points in
+# the fold with one call, and runs the folds in parallel processes; cv_error_stats reduces the held-out errors.
+# compare_sm_models cross validates several approximation models (and training set sizes) on the same folds in one
+# pool of processes, and reports the error, training time and prediction time of each (see compare_sm.py). Models
+# that are fit with fit_fused_sm in calc_FAST_sm_fit (fused_models) are compared as fused fits of all outputs.
+
+import time
+import pickle
+import numpy as np
+from multiprocessing import Pool, cpu_count
+
+from sm_artifact import ColumnSM, sm_to_blocks, blocks_to_sm, fit_fused_sm
+
+# ========================================================================================================= #
+
+# approximation models of calc_FAST_sm_fit
+sm_approximation_models = ['second_order_poly', 'least_squares', 'RBF', 'kriging', 'KPLS', 'KPLSK']
+
+# ========================================================================================================= #
+
+def sm_spec(sm):
+
+    # class and options of an untrained surrogate model; passed to the worker processes instead of the model, since
+    # some smt models (RBF) can not be copied / pickled before they are trained
+    return sm.__class__, sm.options.clone()
+
+# ========================================================================================================= #
+
+def sm_from_spec(spec):
+
+    sm_class, options = spec
+
+    sm = sm_class()
+    sm.options = options.clone()
+
+    return sm
+
+# ========================================================================================================= #
+
+def train_sm_task(task):
+
+    # approximation_model - None to return the trained smt model (this process), otherwise the model is returned
+    # from a worker process: the trained smt model if it can be pickled, its prediction arrays if not
+    name, column, spec, xt, yt, approximation_model, print_sm = task
+
+    sm = sm_from_spec(spec)
+    sm.set_training_values(xt, yt)
+    sm.options['print_global'] = print_sm
+
+    start_time = time.time()
+    sm.train()
+    train_time = time.time() - start_time
+
+    # optimal hyperparameters (kriging models), see warm_start_sm in sm_update.py
+    theta = None
+    if hasattr(sm, 'optimal_theta'):
+        theta = np.array(sm.optimal_theta, dtype=float).flatten()
+
+    if approximation_model is not None:
+        try:
+            pickle.dumps(sm, pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            sm = sm_to_blocks(sm, approximation_model)
+
+    return name, column, sm, train_time, theta
+
+# ========================================================================================================= #
+
+def sm_train_num_procs(num_procs, num_tasks):
+
+    # num_procs - number of processes (1 - train in this process, 0 - one per core)
+    if num_procs <= 0:
+        num_procs = cpu_count()
+
+    return max(1, min(num_procs, num_tasks))
+
+# ========================================================================================================= #
+
+def train_sm_models(sm_list, names, xt, yt_list, approximation_model, num_procs=1, per_column=False, print_sm=False,
+                    print_time=True):
+
+    # sm_list - untrained smt surrogate models, yt_list - (nt, ny_i) training outputs of each model
+    # returns dicts of the trained models (smt models; predictors rebuilt from sm_to_blocks for models trained in
+    # worker processes that can not be pickled), of the training times (s) of each model (per_column - list of
+    # the training times of each column) and of the optimal hyperparameters of each model (None if per_column or not
+    # a kriging model)
+
+    xt = np.ascontiguousarray(xt)
+
+    num_tasks = len(sm_list)
+    if per_column:
+        num_tasks = int(np.sum([np.shape(yt)[1] for yt in yt_list]))
+
+    num_procs = sm_train_num_procs(num_procs, num_tasks)
+
+    # trained models that can not be pickled are returned as arrays from worker processes
+    task_model = None
+    if num_procs > 1:
+        task_model = approximation_model
+
+    tasks = []
+    for i in range(len(sm_list)):
+
+        yt = np.ascontiguousarray(yt_list[i])
+
+        if per_column:
+            for j in range(yt.shape[1]):
+                tasks.append((names[i], j, sm_spec(sm_list[i]), xt, yt[:, j:j + 1], task_model, print_sm))
+        else:
+            tasks.append((names[i], None, sm_spec(sm_list[i]), xt, yt, task_model, print_sm))
+
+    if num_procs == 1:
+        results = [train_sm_task(task) for task in tasks]
+    else:
+        pool = Pool(num_procs)
+        try:
+            results = pool.map(train_sm_task, tasks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+        # (attrs, blocks) of the models that could not be pickled
+        for i in range(len(results)):
+            name, column, sm, train_time, theta = results[i]
+            if isinstance(sm, tuple):
+                results[i] = name, column, blocks_to_sm(sm[0], sm[1]), train_time, theta
+
+    sm_trained = dict()
+    sm_time = dict()
+    sm_theta = dict()
+
+    if per_column:
+
+        sm_columns = dict()
+        for name in names:
+            sm_columns[name] = [None] * np.shape(yt_list[names.index(name)])[1]
+            sm_time[name] = [0.0] * len(sm_columns[name])
+
+        for name, column, sm, train_time, theta in results:
+            sm_columns[name][column] = sm
+            sm_time[name][column] = train_time
+
+        for name in names:
+            sm_trained[name] = ColumnSM(sm_columns[name])
+            sm_theta[name] = None
+
+    else:
+
+        for name, column, sm, train_time, theta in results:
+            sm_trained[name] = sm
+            sm_time[name] = train_time
+            sm_theta[name] = theta
+
+    if print_time:
+        print_sm_train_time(sm_time, num_procs)
+
+    return sm_trained, sm_time, sm_theta
+
+# ========================================================================================================= #
+
+def print_sm_train_time(sm_time, num_procs):
+
+    print('Surrogate model training time (s), ' + str(num_procs) + ' process(es):')
+    for name in sorted(sm_time.keys()):
+        if hasattr(sm_time[name], '__len__'):
+            print('  ' + name + ': ' + str(np.sum(sm_time[name])) + ' (' + str(len(sm_time[name])) + ' columns, max '
+                  + str(np.max(sm_time[name])) + ')')
+        else:
+            print('  ' + name + ': ' + str(sm_time[name]))
+
+# ========================================================================================================= #
+
+def cv_fold_task(task):
+
+    fold, name, spec, xt, yt, train_pts, test_pts, print_sm = task
+
+    sm = sm_from_spec(spec)
+    sm.set_training_values(xt[train_pts], yt[train_pts])
+    sm.options['print_global'] = print_sm
+    sm.train()
+
+    return fold, name, sm.predict_values(xt[test_pts])
+
+# ========================================================================================================= #
+
+def cv_fold_points(kfolds, num_pts):
+
+    # zero-based training / held-out point indices of each fold (see kfold_params in FAST_util.py)
+    fold_pts = []
+    for kfold in kfolds:
+
+        test_pts = np.asarray(kfold).astype(int)
+
+        train_mask = np.ones(num_pts, dtype=bool)
+        train_mask[test_pts] = False
+
+        fold_pts.append([np.nonzero(train_mask)[0], test_pts])
+
+    return fold_pts
+
+# ========================================================================================================= #
+
+def cross_validate_sm(sm, names, xt, yt_list, kfolds, num_procs=1, print_sm=False):
+
+    # sm - untrained smt surrogate model (a new model with its options is trained for each fold and output),
+    # xt - (nt, nx), yt_list - (nt, ny_i) training outputs, kfolds - held-out points of each fold
+    # returns a dict of the held-out predictions (nt, ny_i) of each output, where each point is predicted by the
+    # model of its fold
+
+    xt = np.ascontiguousarray(xt)
+    fold_pts = cv_fold_points(kfolds, len(xt))
+
+    tasks = []
+    for j in range(len(fold_pts)):
+        for i in range(len(names)):
+            tasks.append((j, names[i], sm_spec(sm), xt, np.ascontiguousarray(yt_list[i]), fold_pts[j][0],
+                          fold_pts[j][1], print_sm))
+
+    num_procs = sm_train_num_procs(num_procs, len(tasks))
+
+    start_time = time.time()
+
+    if num_procs == 1:
+        results = [cv_fold_task(task) for task in tasks]
+    else:
+        pool = Pool(num_procs)
+        try:
+            results = pool.map(cv_fold_task, tasks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+    print('Cross validation time (s), ' + str(len(fold_pts)) + ' folds, ' + str(num_procs) + ' process(es): '
+          + str(time.time() - start_time))
+
+    yt_cv = dict()
+    for i in range(len(names)):
+        yt_cv[names[i]] = np.zeros(np.shape(yt_list[i]))
+
+    for fold, name, yt_fold in results:
+        yt_cv[name][fold_pts[fold][1]] = yt_fold
+
+    return yt_cv
+
+# ========================================================================================================= #
+
+def cv_error_stats(yt, yt_cv, kfolds):
+
+    # yt - (nt, ny) training outputs, yt_cv - (nt, ny) held-out predictions (see cross_validate_sm)
+    # returns a dict of:
+    #   'error', 'percent_error' - (ny, num_folds) average (percent) error of each fold
+    #   'avg_percent_error', 'rms_percent_error', 'max_percent_error' - (ny, 1) over all folds
+    #   'rms_error' - rms of rms_percent_error over all outputs
+
+    error = yt_cv - yt
+    percent_error = np.abs(error) / yt
+
+    fold_error = np.zeros([np.shape(yt)[1], len(kfolds)])
+    fold_percent_error = np.zeros([np.shape(yt)[1], len(kfolds)])
+
+    for j in range(len(kfolds)):
+        test_pts = np.asarray(kfolds[j]).astype(int)
+        fold_error[:, j] = np.mean(error[test_pts], axis=0)
+        fold_percent_error[:, j] = np.mean(percent_error[test_pts], axis=0)
+
+    rms_percent_error = np.sqrt(np.mean(fold_percent_error ** 2.0, axis=1, keepdims=True))
+
+    return {'error': fold_error, 'percent_error': fold_percent_error,
+            'avg_percent_error': np.mean(fold_percent_error, axis=1, keepdims=True),
+            'rms_percent_error': rms_percent_error,
+            'max_percent_error': np.max(fold_percent_error, axis=1, keepdims=True),
+            'rms_error': float(np.sqrt(np.mean(rms_percent_error ** 2.0)))}
+
+# ========================================================================================================= #
+
+def approximation_sm(approximation_model, theta0_val, num_var, settings=None):
+
+    # untrained smt surrogate model, with the settings used in calc_FAST_sm_fit
+    # settings - hyperparameters that replace the defaults (d0, theta0, n_comp; see sm_hyper.py)
+    from smt.surrogate_models import QP, LS, KRG, KPLS, KPLSK, RBF
+
+    if settings is None:
+        settings = dict()
+
+    theta0 = settings.get('theta0', theta0_val[0])
+
+    if approximation_model == 'second_order_poly':
+        return QP()
+    elif approximation_model == 'least_squares':
+        return LS()
+    elif approximation_model == 'RBF':
+        return RBF(d0=settings.get('d0', 5))
+    elif approximation_model == 'kriging':
+        return KRG(theta0=np.ones(num_var) * theta0)
+    elif approximation_model in ['KPLS', 'KPLSK']:
+
+        sm_class = KPLS
+        if approximation_model == 'KPLSK':
+            sm_class = KPLSK
+
+        if 'n_comp' in settings:
+            return sm_class(n_comp=settings['n_comp'], theta0=np.ones(settings['n_comp']) * theta0)
+        if 'theta0' in settings:
+            return sm_class(theta0=[theta0])
+        return sm_class(theta0=theta0_val)
+
+    raise Exception('Unknown approximation model ' + str(approximation_model) + '.')
+
+# ========================================================================================================= #
+
+def sm_kfolds(num_pts, num_folds, seed=0):
+
+    # held-out points of each fold (random, reproducible), same form as FASTinfo['kfolds']
+    if num_pts % num_folds > 0:
+        raise Exception('Number of folds (k) should be a factor of num_pts.')
+
+    shuffled_pts = np.random.RandomState(seed).permutation(num_pts)
+
+    return np.split(shuffled_pts, num_folds)
+
+# ========================================================================================================= #
+
+def compare_sm_task(task):
+
+    # label - approximation model (compare_sm_models) or candidate index (search_sm_hyper in sm_hyper.py)
+    label, num_pts, fold, name, spec, xt, yt, train_pts, test_pts = task
+
+    try:
+        sm = sm_from_spec(spec)
+        sm.set_training_values(xt[train_pts], yt[train_pts])
+        sm.options['print_global'] = False
+
+        start_time = time.time()
+        sm.train()
+        train_time = time.time() - start_time
+
+        start_time = time.time()
+        yt_fold = sm.predict_values(xt[test_pts])
+        predict_time = time.time() - start_time
+
+    except Exception as e:
+        return label, num_pts, fold, name, None, str(e), 0.0
+
+    return label, num_pts, fold, name, yt_fold, train_time, predict_time
+
+# ========================================================================================================= #
+
+def compare_fused_task(task):
+
+    # same as compare_sm_task, for a fused fit of all outputs (fit_fused_sm); returns the predictions of each output
+    approximation_model, num_pts, fold, names, xt, yt_list, train_pts, test_pts = task
+
+    try:
+        start_time = time.time()
+        sm = fit_fused_sm(xt[train_pts], [yt[train_pts] for yt in yt_list], names, approximation_model)
+        train_time = time.time() - start_time
+
+        start_time = time.time()
+        yt_fold = sm.predict_values(xt[test_pts])
+        predict_time = time.time() - start_time
+
+    except Exception as e:
+        return approximation_model, num_pts, fold, names, None, str(e), 0.0
+
+    return approximation_model, num_pts, fold, names, yt_fold, train_time, predict_time
+
+# ========================================================================================================= #
+
+def compare_task(task):
+
+    if isinstance(task[3], list):
+        return compare_fused_task(task)
+
+    return compare_sm_task(task)
+
+# ========================================================================================================= #
+
+def compare_sm_models(approximation_models, names, xt, yt_list, num_pts_list, num_folds=5, theta0_val=[1e-2],
+                      num_procs=1, seed=0, fused_models=[]):
+
+    # cross validates each approximation model with the first num_pts training points (for each num_pts in
+    # num_pts_list); all models use the same folds for a given num_pts, and all (model, size, fold, output) fits
+    # run in one pool of processes
+    # fused_models - approximation models fit with fit_fused_sm (one fit of all outputs per fold), as in
+    # calc_FAST_sm_fit with FASTinfo['fused_sm']; the other models are fit with smt
+    # returns one dict per (model, num_pts) with:
+    #   'rms_error' - overall rms percent error (same as the cross validation in calc_FAST_sm_fit)
+    #   'max_error' - maximum fold average percent error of any output
+    #   'train_time' - time (s) to train all outputs once (average over folds)
+    #   'predict_time' - time (s) per point to predict all outputs (batched prediction)
+    #   'error' - error message if a fit failed, otherwise None
+    #   'fused' - True if fit with fit_fused_sm
+
+    xt = np.ascontiguousarray(xt)
+    yt_list = [np.ascontiguousarray(yt) for yt in yt_list]
+
+    kfolds = dict()
+    fold_pts = dict()
+    for num_pts in num_pts_list:
+        kfolds[num_pts] = sm_kfolds(num_pts, num_folds, seed)
+        fold_pts[num_pts] = cv_fold_points(kfolds[num_pts], num_pts)
+
+    tasks = []
+    for approximation_model in approximation_models:
+
+        if approximation_model in fused_models:
+            for num_pts in num_pts_list:
+                for j in range(num_folds):
+                    tasks.append((approximation_model, num_pts, j, list(names), xt, yt_list,
+                                  fold_pts[num_pts][j][0], fold_pts[num_pts][j][1]))
+            continue
+
+        spec = sm_spec(approximation_sm(approximation_model, theta0_val, xt.shape[1]))
+        for num_pts in num_pts_list:
+            for j in range(num_folds):
+                for i in range(len(names)):
+                    tasks.append((approximation_model, num_pts, j, names[i], spec, xt, yt_list[i],
+                                  fold_pts[num_pts][j][0], fold_pts[num_pts][j][1]))
+
+    num_procs = sm_train_num_procs(num_procs, len(tasks))
+
+    if num_procs == 1:
+        results = [compare_task(task) for task in tasks]
+    else:
+        pool = Pool(num_procs)
+        try:
+            results = pool.map(compare_task, tasks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+    # held-out predictions, times of each (model, size)
+    yt_cv = dict()
+    comparison = dict()
+    for approximation_model in approximation_models:
+        for num_pts in num_pts_list:
+            yt_cv[(approximation_model, num_pts)] = dict()
+            for i in range(len(names)):
+                yt_cv[(approximation_model, num_pts)][names[i]] = np.zeros([num_pts, yt_list[i].shape[1]])
+            comparison[(approximation_model, num_pts)] = {'approximation_model': approximation_model,
+                                                          'num_pts': num_pts, 'train_time': 0.0,
+                                                          'predict_time': 0.0, 'error': None,
+                                                          'fused': approximation_model in fused_models}
+
+    for approximation_model, num_pts, fold, name, yt_fold, train_time, predict_time in results:
+
+        row = comparison[(approximation_model, num_pts)]
+
+        if yt_fold is None:
+            row['error'] = train_time
+            continue
+
+        # (fused fits return the predictions of all outputs)
+        if isinstance(name, list):
+            for i in range(len(name)):
+                yt_cv[(approximation_model, num_pts)][name[i]][fold_pts[num_pts][fold][1]] = yt_fold[i]
+        else:
+            yt_cv[(approximation_model, num_pts)][name][fold_pts[num_pts][fold][1]] = yt_fold
+        row['train_time'] += train_time / num_folds
+        row['predict_time'] += predict_time / num_pts
+
+    rows = []
+    for approximation_model in approximation_models:
+        for num_pts in num_pts_list:
+
+            row = comparison[(approximation_model, num_pts)]
+
+            if row['error'] is None:
+
+                rms_error = []
+                max_error = []
+                for i in range(len(names)):
+                    stats = cv_error_stats(yt_list[i][:num_pts], yt_cv[(approximation_model, num_pts)][names[i]],
+                                           kfolds[num_pts])
+                    rms_error.append(stats['rms_error'])
+                    max_error.append(np.max(stats['max_percent_error']))
+
+                row['rms_error'] = float(np.sqrt(np.mean(np.array(rms_error) ** 2.0)))
+                row['max_error'] = float(np.max(max_error))
+
+            else:
+                row['rms_error'] = np.nan
+                row['max_error'] = np.nan
+
+            rows.append(row)
+
+    return rows
+
+# ========================================================================================================= #
+
+def sm_comparison_table(rows):
+
+    # text table of the results of compare_sm_models (errors in %)
+    lines = ['%-26s %8s %12s %12s %14s %14s' % ('model', 'num_pts', 'rms (%)', 'max (%)', 'train (s)',
+                                                 'predict (s/pt)')]
+
+    for row in rows:
+        model = row['approximation_model']
+        if row.get('fused', False):
+            model += ' (fused)'
+        line = '%-26s %8d %12.4f %12.4f %14.4g %14.4g' % (model, row['num_pts'], row['rms_error'] * 100.0,
+                                                            row['max_error'] * 100.0, row['train_time'],
+                                                            row['predict_time'])
+        if row['error'] is not None:
+            line += '  (failed: ' + row['error'] + ')'
+        lines.append(line)
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,141 @@
+# sm_trust_region.py includes the trust region management used to mix surrogate model optimization with FAST runs
+# (see run_trust_region.py)
+#
+# each iteration:
+#   - FAST is run at the trust region center, and the surrogate model is corrected to match it there
+#     additive - DEM_sm + (DEM_FAST - DEM_sm(center)), multiplicative - DEM_sm * DEM_FAST / DEM_sm(center)
+#   - the corrected surrogate model is optimized inside the trust region
+#   - FAST is run at the new design, and the step is accepted / the trust region resized based on
+#     rho = (actual reduction, FAST) / (predicted reduction, corrected surrogate model)
+#
+# the correction is zeroth-order (values only), since FAST gradients are not available
+
+import numpy as np
+from collections import OrderedDict
+
+# ========================================================================================================= #
+
+# FAST outputs (CreateFASTConstraints) and the matching surrogate model outputs (use_FAST_surr_model)
+tr_output_names = [['DEMx', 'DEMx_sm'], ['DEMy', 'DEMy_sm'], ['Edg_max', 'Edg_sm'], ['Flp_max', 'Flp_sm']]
+
+# ========================================================================================================= #
+
+def calc_sm_correction(sm_values, FAST_values, correction_type='additive'):
+
+    # sm_values, FAST_values - dicts with the surrogate model / FAST outputs at the trust region center, keyed on the
+    # surrogate model output names
+    # returns a dict of [mult, add], where the corrected surrogate model output is mult * sm + add
+
+    sm_correction = dict()
+    for name in sm_values:
+
+        sm_val = np.asarray(sm_values[name], dtype=float)
+        FAST_val = np.asarray(FAST_values[name], dtype=float)
+
+        if correction_type == 'additive':
+            sm_correction[name] = [np.ones(sm_val.shape), FAST_val - sm_val]
+
+        elif correction_type == 'multiplicative':
+
+            # outputs close to zero are corrected additively
+            mult = np.ones(sm_val.shape)
+            add = np.zeros(sm_val.shape)
+
+            small = np.abs(sm_val) < 1e-8 * max(np.max(np.abs(sm_val)), 1.0)
+            mult[~small] = FAST_val[~small] / sm_val[~small]
+            add[small] = FAST_val[small] - sm_val[small]
+
+            sm_correction[name] = [mult, add]
+
+        else:
+            raise Exception('Surrogate model correction type must be additive or multiplicative.')
+
+    return sm_correction
+
+# ========================================================================================================= #
+
+def apply_sm_correction(sm_correction, name, value):
+
+    if sm_correction is None or name not in sm_correction:
+        return value
+
+    return sm_correction[name][0] * value + sm_correction[name][1]
+
+# ========================================================================================================= #
+
+class SMTrustRegion(object):
+
+    # domains - OrderedDict of design variable name: [lower, upper] (see des_var_domains in FAST_util.py)
+    # the trust region radius is a fraction of the width of each design variable domain
+
+    def __init__(self, domains, radius=0.25, radius_min=1e-3, radius_max=1.0, eta1=0.25, eta2=0.75, shrink=0.5,
+                 expand=2.0):
+
+        self.domains = OrderedDict()
+        for name in domains:
+            self.domains[name] = [np.asarray(domains[name][0], dtype=float),
+                                  np.asarray(domains[name][1], dtype=float)]
+
+        self.radius = radius
+        self.radius_min = radius_min
+        self.radius_max = radius_max
+
+        self.eta1 = eta1
+        self.eta2 = eta2
+        self.shrink = shrink
+        self.expand = expand
+
+    def bounds(self, center):
+
+        # trust region around center, clipped to the design variable domains
+        tr_bounds = OrderedDict()
+        for name in self.domains:
+
+            lower, upper = self.domains[name]
+            width = self.radius * (upper - lower)
+
+            tr_bounds[name] = [np.maximum(lower, center[name] - width), np.minimum(upper, center[name] + width)]
+
+        return tr_bounds
+
+    def on_boundary(self, center, step, tol=1e-3):
+
+        # True if the step reached the edge of the trust region (but not the edge of the domain)
+        tr_bounds = self.bounds(center)
+        for name in self.domains:
+
+            lower, upper = self.domains[name]
+            width = self.radius * (upper - lower)
+
+            at_lower = np.abs(step[name] - tr_bounds[name][0]) <= tol * width
+            at_upper = np.abs(step[name] - tr_bounds[name][1]) <= tol * width
+
+            if np.any(at_lower & (tr_bounds[name][0] > lower)) or np.any(at_upper & (tr_bounds[name][1] < upper)):
+                return True
+
+        return False
+
+    def ratio(self, FAST_center, FAST_step, sm_center, sm_step):
+
+        # actual / predicted reduction of the objective; no predicted reduction gives 0.0 (step rejected)
+        predicted = sm_center - sm_step
+        if predicted <= 0.0:
+            return 0.0
+
+        return (FAST_center - FAST_step) / predicted
+
+    def update(self, rho, step_on_boundary):
+
+        # resizes the trust region, returns True if the step is accepted
+        if rho < self.eta1:
+            self.radius = self.shrink * self.radius
+        elif rho > self.eta2 and step_on_boundary:
+            self.radius = min(self.expand * self.radius, self.radius_max)
+
+        return rho > 0.0
+
+    def converged(self):
+
+        return self.radius < self.radius_min
+
+# ========================================================================================================= #
@@ -0,0 +1,269 @@
+# sm_update.py includes incremental updates of the surrogate models when training points are added to a campaign
+# (FASTinfo['sm_incremental'], see calc_FAST_sm_fit)
+#
+#   second_order_poly, least_squares - the R factor of the QR factorization of the basis matrix and Q^T yt are kept;
+#       new rows are folded in with one small QR factorization (cost independent of the number of points)
+#   RBF - the Cholesky factor of the kernel matrix is kept and extended with the rows / columns of the new points
+#       (O(n^2 m) for m new points instead of O(n^3))
+#       if the factorization fails (the kernel matrix is close to singular), the model is fit from scratch with
+#       fit_fused_sm, which solves the system without factorizing it
+#   kriging, KPLS - the hyperparameter optimization starts from the previous optimal hyperparameters
+#       (KPLSK is fit from scratch: its optimal hyperparameters are given per input, but the next fit starts from one
+#       hyperparameter per PLS component)
+#
+# the update state is saved next to the model file (<model file>.state.npz), with the number of points it was fit to
+# and a crc of their inputs and outputs. If the first points of the training data are not the points of the state
+# (ex. the training points were reordered or replaced, or their outputs were recomputed or rescaled), the model is
+# fit from scratch.
+
+import os
+import zlib
+import numpy as np
+
+from sm_artifact import PolySM, RBFSM, FusedSM, fit_fused_sm
+
+# ========================================================================================================= #
+
+# models whose optimal hyperparameters can be used as the initial hyperparameters of the next fit
+sm_warm_start_models = ['kriging', 'KPLS']
+
+# ========================================================================================================= #
+
+def sm_state_file_name(sm_file):
+
+    return sm_file + '.state.npz'
+
+# ========================================================================================================= #
+
+def sm_state_crc(xt, yt):
+
+    crc = zlib.crc32(np.ascontiguousarray(xt, dtype='<f8').tobytes())
+
+    return zlib.crc32(np.ascontiguousarray(yt, dtype='<f8').tobytes(), crc) & 0xffffffff
+
+# ========================================================================================================= #
+
+def load_sm_state(file_name):
+
+    if not os.path.isfile(file_name):
+        return None
+
+    state_file = np.load(file_name, allow_pickle=False)
+    state = dict()
+    for name in state_file.files:
+        state[name] = state_file[name]
+    state_file.close()
+
+    return state
+
+# ========================================================================================================= #
+
+def save_sm_state(file_name, state):
+
+    # written to a temporary file first, so an interrupted save leaves the previous state
+    tmp_file_name = file_name + '.' + str(os.getpid()) + '.tmp.npz'
+    np.savez(tmp_file_name, **state)
+    os.rename(tmp_file_name, file_name)
+
+# ========================================================================================================= #
+
+def sm_state_matches(state, approximation_model, xt, yt):
+
+    # True if the state can be updated with the points of xt, yt after the first state['num_pts']
+    if state is None or str(state['approximation_model']) != approximation_model:
+        return False
+
+    num_pts = int(state['num_pts'])
+    if num_pts > len(xt) or xt.shape[1] != int(state['num_var']):
+        return False
+
+    return sm_state_crc(xt[:num_pts], yt[:num_pts]) == int(state['crc'])
+
+# ========================================================================================================= #
+
+def poly_degree(approximation_model):
+
+    if approximation_model == 'second_order_poly':
+        return 2
+
+    return 1
+
+# ========================================================================================================= #
+
+def poly_state(xt, yt, approximation_model):
+
+    # the input scaling of the first fit is kept (a full polynomial basis gives the same least squares fit for any
+    # affine scaling of the inputs)
+    X_offset = np.mean(xt, axis=0)
+    X_scale = np.std(xt, axis=0)
+    X_scale[X_scale == 0.0] = 1.0
+
+    poly = PolySM(X_offset, X_scale, None, poly_degree(approximation_model))
+    Q, R = np.linalg.qr(poly.basis(xt))
+
+    return {'X_offset': X_offset, 'X_scale': X_scale, 'R': R, 'Qty': np.dot(Q.T, yt)}
+
+# ========================================================================================================= #
+
+def update_poly_state(state, xt_new, yt_new, approximation_model):
+
+    poly = PolySM(state['X_offset'], state['X_scale'], None, poly_degree(approximation_model))
+
+    # [R; B_new] = Q' R', the part of the old outputs outside of range(Q) does not change the fit
+    Q, R = np.linalg.qr(np.vstack([state['R'], poly.basis(xt_new)]))
+
+    state['Qty'] = np.dot(Q.T, np.vstack([state['Qty'], yt_new]))
+    state['R'] = R
+
+    return state
+
+# ========================================================================================================= #
+
+def poly_state_sm(state, approximation_model):
+
+    coef = np.linalg.lstsq(state['R'], state['Qty'], rcond=None)[0]
+
+    return PolySM(state['X_offset'], state['X_scale'], coef, poly_degree(approximation_model))
+
+# ========================================================================================================= #
+
+def rbf_kernel(x1, x2, d0):
+
+    dx = (x1[:, np.newaxis, :] - x2[np.newaxis, :, :]) / d0
+
+    return np.exp(-np.sum(dx**2.0, axis=2))
+
+# ========================================================================================================= #
+
+def rbf_state(xt, d0, reg):
+
+    # same interpolation problem as fit_fused_sm
+    d0 = np.array(np.atleast_1d(d0), dtype=float)
+    if len(d0) == 1:
+        d0 = d0 * np.ones(xt.shape[1])
+
+    L = np.linalg.cholesky(rbf_kernel(xt, xt, d0) + reg * np.eye(len(xt)))
+
+    return {'xt': np.array(xt, dtype=float), 'd0': d0, 'reg': np.array(reg), 'L': L}
+
+# ========================================================================================================= #
+
+def update_rbf_state(state, xt_new):
+
+    # K' = [K B; B^T C]  ->  L' = [L 0; S^T L22], S = L^-1 B, L22 L22^T = C - S^T S
+    from scipy.linalg import solve_triangular
+
+    L = state['L']
+    d0 = state['d0']
+
+    S = solve_triangular(L, rbf_kernel(state['xt'], xt_new, d0), lower=True)
+    C = rbf_kernel(xt_new, xt_new, d0) + float(state['reg']) * np.eye(len(xt_new))
+    L22 = np.linalg.cholesky(C - np.dot(S.T, S))
+
+    num_pts = len(L)
+    L_new = np.zeros([num_pts + len(xt_new), num_pts + len(xt_new)])
+    L_new[:num_pts, :num_pts] = L
+    L_new[num_pts:, :num_pts] = S.T
+    L_new[num_pts:, num_pts:] = L22
+
+    state['L'] = L_new
+    state['xt'] = np.vstack([state['xt'], xt_new])
+
+    return state
+
+# ========================================================================================================= #
+
+def rbf_state_sm(state, yt):
+
+    from scipy.linalg import cho_solve
+
+    return RBFSM(state['xt'], state['d0'], cho_solve((state['L'], True), yt), -1)
+
+# ========================================================================================================= #
+
+def update_fused_sm(state_file, xt, yt_list, names, approximation_model, d0=5.0, reg=1e-10):
+
+    # same fit as fit_fused_sm, updated from the state in state_file when it was fit to the first points of xt
+    # returns the FusedSM and the number of points that were added (all points if fit from scratch)
+
+    xt = np.array(xt, dtype=float)
+    yt = np.hstack(yt_list)
+
+    state = load_sm_state(state_file)
+
+    # (an RBF state is only reused with the same kernel width)
+    if approximation_model == 'RBF' and state is not None and 'd0' in state \
+            and not np.allclose(state['d0'], np.atleast_1d(d0)):
+        state = None
+
+    if sm_state_matches(state, approximation_model, xt, yt):
+        num_old = int(state['num_pts'])
+    else:
+        state = None
+        num_old = 0
+
+    if approximation_model == 'RBF':
+
+        try:
+            if state is None:
+                state = rbf_state(xt, d0, reg)
+            elif num_old < len(xt):
+                state = update_rbf_state(state, xt[num_old:])
+        except np.linalg.LinAlgError:
+            # kernel matrix not numerically positive definite, no state is kept
+            if os.path.isfile(state_file):
+                os.remove(state_file)
+            return fit_fused_sm(xt, yt_list, names, approximation_model, d0, reg), len(xt)
+
+        sm = rbf_state_sm(state, yt)
+
+    elif approximation_model in ['second_order_poly', 'least_squares']:
+
+        if state is None:
+            state = poly_state(xt, yt, approximation_model)
+        elif num_old < len(xt):
+            state = update_poly_state(state, xt[num_old:], yt[num_old:], approximation_model)
+
+        sm = poly_state_sm(state, approximation_model)
+
+    else:
+        raise Exception('Only second_order_poly, least_squares and RBF fits can be updated incrementally.')
+
+    state['approximation_model'] = np.array(approximation_model)
+    state['num_pts'] = np.array(len(xt))
+    state['num_var'] = np.array(xt.shape[1])
+    state['crc'] = np.array(sm_state_crc(xt, yt))
+
+    save_sm_state(state_file, state)
+
+    return FusedSM(sm, names, [np.shape(y)[1] for y in yt_list]), len(xt) - num_old
+
+# ========================================================================================================= #
+
+def warm_start_sm(sm, state_file, approximation_model):
+
+    # kriging, KPLS - start the hyperparameter optimization of sm at the optimal hyperparameters of the previous fit
+    # (single start, if supported by the smt version)
+    if approximation_model not in sm_warm_start_models:
+        return False
+
+    state = load_sm_state(state_file)
+    if state is None or str(state['approximation_model']) != approximation_model:
+        return False
+
+    sm.options['theta0'] = np.array(state['theta'], dtype=float)
+    if 'n_start' in sm.options:
+        sm.options['n_start'] = 1
+
+    return True
+
+# ========================================================================================================= #
+
+def save_warm_start(theta, state_file, approximation_model):
+
+    # theta - optimal hyperparameters of the trained model (see train_sm_models in sm_train.py)
+    if approximation_model not in sm_warm_start_models or theta is None:
+        return
+
+    save_sm_state(state_file, {'approximation_model': np.array(approximation_model),
+                               'theta': np.array(theta, dtype=float).flatten()})
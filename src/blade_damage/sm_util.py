@@ -0,0 +1,453 @@
+# sm_util.py includes functions used to load, store, and evaluate the surrogate models of FAST outputs (DEMs, extreme
+# loads) that are created in calc_FAST_sm_fit and used in use_FAST_surr_model
+
+import os
+import pickle
+import numpy as np
+from collections import OrderedDict
+
+from sm_artifact import load_sm_artifact, sm_fused_models
+
+# ========================================================================================================= #
+
+# surrogate models that make up the DEM / extreme load fit
+sm_name_list = ['sm_x', 'sm_y', 'sm_x_load', 'sm_y_load']
+
+# ========================================================================================================= #
+
+# process-wide cache of loaded surrogate models
+# key: absolute file name, value: [(mtime, size), model]
+_sm_cache = dict()
+
+# number of times a model file was read from disk (loads), or returned from the cache (hits)
+_sm_cache_stats = {'loads': 0, 'hits': 0}
+
+# ========================================================================================================= #
+
+def sm_file_name(opt_dir, sm_name, approximation_model, sm_file_type='pkl'):
+
+    # sm_file_type - 'pkl' (pickled smt object) or 'smb' (binary file, see sm_artifact.py)
+    return opt_dir + '/' + sm_name + '_' + approximation_model + '.' + sm_file_type
+
+# ========================================================================================================= #
+
+def load_sm(file_name):
+
+    file_name = os.path.abspath(file_name)
+
+    # file is identified by modification time and size, so a re-trained fit is picked up
+    file_stat = os.stat(file_name)
+    file_key = (file_stat.st_mtime, file_stat.st_size)
+
+    if file_name in _sm_cache and _sm_cache[file_name][0] == file_key:
+        _sm_cache_stats['hits'] += 1
+        return _sm_cache[file_name][1]
+
+    if file_name.endswith('.smb'):
+        sm = load_sm_artifact(file_name)
+    else:
+        file_handle = open(file_name, "rb")
+        sm = pickle.load(file_handle)
+        file_handle.close()
+
+    _sm_cache[file_name] = [file_key, sm]
+    _sm_cache_stats['loads'] += 1
+
+    return sm
+
+# ========================================================================================================= #
+
+def sm_cache_stats():
+
+    stats = dict(_sm_cache_stats)
+    stats['num_cached'] = len(_sm_cache)
+
+    return stats
+
+# ========================================================================================================= #
+
+def clear_sm_cache():
+
+    _sm_cache.clear()
+    _sm_cache_stats['loads'] = 0
+    _sm_cache_stats['hits'] = 0
+
+# ========================================================================================================= #
+
+def load_sm_models(FASTinfo):
+
+    sm_models = dict()
+    for i in range(len(sm_name_list)):
+        sm_models[sm_name_list[i]] = load_sm(sm_file_name(FASTinfo['opt_dir'], sm_name_list[i],
+                                                          FASTinfo['approximation_model'],
+                                                          FASTinfo['sm_file_type']))
+
+    return sm_models
+
+# ========================================================================================================= #
+
+def use_fused_sm(FASTinfo):
+
+    # all outputs stored in one model (sm_fused), only for polynomial / RBF fits stored as .smb files
+    return FASTinfo['fused_sm'] and FASTinfo['approximation_model'] in sm_fused_models \
+        and FASTinfo['sm_file_type'] == 'smb'
+
+# ========================================================================================================= #
+
+def load_fused_sm(FASTinfo):
+
+    return load_sm(sm_file_name(FASTinfo['opt_dir'], 'sm_fused', FASTinfo['approximation_model'], 'smb'))
+
+# ========================================================================================================= #
+
+def sm_signature(FASTinfo):
+
+    # modification time and size of the surrogate model files currently in use
+    if use_fused_sm(FASTinfo):
+        file_names = [sm_file_name(FASTinfo['opt_dir'], 'sm_fused', FASTinfo['approximation_model'], 'smb')]
+    else:
+        file_names = []
+        for i in range(len(sm_name_list)):
+            file_names.append(sm_file_name(FASTinfo['opt_dir'], sm_name_list[i], FASTinfo['approximation_model'],
+                                           FASTinfo['sm_file_type']))
+
+    signature = []
+    for file_name in file_names:
+        file_stat = os.stat(file_name)
+        signature.append((file_stat.st_mtime, file_stat.st_size))
+
+    return tuple(signature)
+
+# ========================================================================================================= #
+
+class SMMemo(object):
+
+    # bounded least-recently-used cache of surrogate model predictions, keyed on the design vector
+    # max_size - number of stored predictions (0 turns memoization off)
+    # tol - design variables are rounded to multiples of tol before comparing (0.0 - exact match)
+
+    def __init__(self, max_size=128, tol=0.0):
+
+        self.max_size = max_size
+        self.tol = tol
+        self.memo = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, kind, designs, bladeLength, signature):
+
+        designs = np.asarray(designs, dtype=float).flatten()
+        if self.tol > 0.0:
+            designs = np.round(designs / self.tol).astype(int)
+
+        return (kind, tuple(designs.tolist()), float(np.asarray(bladeLength).flatten()[0]), signature)
+
+    def get(self, key):
+
+        if key in self.memo:
+            self.hits += 1
+            value = self.memo.pop(key)
+            self.memo[key] = value
+            return value
+
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+
+        if self.max_size <= 0:
+            return
+
+        self.memo[key] = value
+        while len(self.memo) > self.max_size:
+            self.memo.popitem(last=False)
+
+    def stats(self):
+
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.memo), 'max_size': self.max_size}
+
+    def clear(self):
+
+        self.memo.clear()
+        self.hits = 0
+        self.misses = 0
+
+# ========================================================================================================= #
+
+def sm_chord_columns(FASTinfo):
+
+    # columns of the surrogate model input that hold chord_sub values (nondimensionalized by blade length)
+    chord_cols = []
+    for i in range(len(FASTinfo['var_index'])):
+        if FASTinfo['sm_var_names'][FASTinfo['var_index'][i]] == 'chord_sub':
+            chord_cols.append(i)
+
+    return chord_cols
+
+# ========================================================================================================= #
+
+def sm_design_vector(params, sm_var_names, sm_var_index):
+
+    # current design variable values, in the column order used by the surrogate model
+    sv = []
+    for i in range(0, len(sm_var_names)):
+
+        # chord_sub, theta_sub
+        if hasattr(params[sm_var_names[i]], '__len__'):
+            for j in range(0, len(params[sm_var_names[i]])):
+                if j in sm_var_index[i]:
+                    sv.append(params[sm_var_names[i]][j])
+        # turbulence intensity
+        else:
+            sv.append(params[sm_var_names[i]])
+
+    return np.array(sv, dtype=float)
+
+# ========================================================================================================= #
+
+def predict_batch(designs, FASTinfo, bladeLength=None):
+
+    # designs - (N, num_var) array of chord_sub (m), theta_sub (deg), turbulence intensity values
+    # returns DEMx, DEMy (N, 18) and Edg, Flp (N, nstr)
+
+    designs = np.atleast_2d(np.asarray(designs, dtype=float))
+
+    if designs.shape[1] != FASTinfo['num_var']:
+        raise Exception('Each design needs ' + str(FASTinfo['num_var']) + ' surrogate model variables, '
+                        'but ' + str(designs.shape[1]) + ' were given.')
+
+    if bladeLength is None:
+        bladeLength = FASTinfo['bladeLength']
+
+    # calculate chord / blade length (bladeLength can be a scalar or one value per design)
+    sm_input = designs.copy()
+    chord_cols = sm_chord_columns(FASTinfo)
+    sm_input[:, chord_cols] = sm_input[:, chord_cols] / np.reshape(np.asarray(bladeLength, dtype=float), (-1, 1))
+
+    if use_fused_sm(FASTinfo):
+
+        # one basis evaluation for all outputs
+        sm_fused = load_fused_sm(FASTinfo)
+        y = dict(zip(sm_fused.names, sm_fused.predict_values(sm_input)))
+
+        return y['sm_x'], y['sm_y'], y['sm_x_load'], y['sm_y_load']
+
+    sm_models = load_sm_models(FASTinfo)
+
+    # DEMs
+    DEMx = sm_models['sm_x'].predict_values(sm_input)
+    DEMy = sm_models['sm_y'].predict_values(sm_input)
+
+    # extreme loads
+    Edg = sm_models['sm_x_load'].predict_values(sm_input)
+    Flp = sm_models['sm_y_load'].predict_values(sm_input)
+
+    return DEMx, DEMy, Edg, Flp
+
+# ========================================================================================================= #
+
+def predict_batch_derivatives(designs, FASTinfo, bladeLength=None):
+
+    # designs - (N, num_var) array of chord_sub (m), theta_sub (deg), turbulence intensity values
+    # returns a dict with, for each surrogate model, the partials of its outputs w.r.t. the design variables
+    # (N, ny, num_var) and w.r.t. blade length (N, ny)
+
+    designs = np.atleast_2d(np.asarray(designs, dtype=float))
+
+    if designs.shape[1] != FASTinfo['num_var']:
+        raise Exception('Each design needs ' + str(FASTinfo['num_var']) + ' surrogate model variables, '
+                        'but ' + str(designs.shape[1]) + ' were given.')
+
+    if bladeLength is None:
+        bladeLength = FASTinfo['bladeLength']
+    bladeLength = np.reshape(np.asarray(bladeLength, dtype=float), (-1, 1))
+
+    # calculate chord / blade length
+    sm_input = designs.copy()
+    chord_cols = sm_chord_columns(FASTinfo)
+    sm_input[:, chord_cols] = sm_input[:, chord_cols] / bladeLength
+
+    # partials w.r.t. the surrogate model inputs
+    d_sm = dict()
+    for i in range(len(sm_name_list)):
+        d_sm[sm_name_list[i]] = []
+
+    if use_fused_sm(FASTinfo):
+        sm_fused = load_fused_sm(FASTinfo)
+        for kx in range(designs.shape[1]):
+            d_kx = sm_fused.predict_derivatives(sm_input, kx)
+            for i in range(len(sm_fused.names)):
+                d_sm[sm_fused.names[i]].append(d_kx[i])
+    else:
+        sm_models = load_sm_models(FASTinfo)
+        for i in range(len(sm_name_list)):
+            for kx in range(designs.shape[1]):
+                d_sm[sm_name_list[i]].append(sm_models[sm_name_list[i]].predict_derivatives(sm_input, kx))
+
+    sm_derivs = dict()
+    for i in range(len(sm_name_list)):
+
+        d_out = np.stack(d_sm[sm_name_list[i]], axis=2)
+
+        # chain rule for chord / blade length
+        d_bladeLength = np.zeros(d_out.shape[0:2])
+        for kx in chord_cols:
+            d_bladeLength -= d_out[:, :, kx] * np.reshape(designs[:, kx], (-1, 1)) / bladeLength**2.0
+            d_out[:, :, kx] = d_out[:, :, kx] / bladeLength
+
+        sm_derivs[sm_name_list[i]] = [d_out, d_bladeLength]
+
+    return sm_derivs
+
+# ========================================================================================================= #
+
+def read_sm_master(file_name):
+
+    # returns the training point index (from the 'pt_<i>' / 'num_pt_<i>' label) and values of each completed line
+    # of an sm_master_<ft>.txt (or sm_<ft>_<i>.txt) file; place holder lines are skipped
+    f = open(file_name, "r")
+    lines = f.read().splitlines()
+    f.close()
+
+    pt_labels = []
+    rows = []
+    for i in range(1, len(lines)):
+
+        cur_line = lines[i].split(None, 1)
+
+        if len(cur_line) < 2 or not (cur_line[0].startswith('pt_') or cur_line[0].startswith('num_pt_')):
+            continue
+
+        pt_labels.append(cur_line[0])
+        rows.append(cur_line[1])
+
+    pt_index = np.array([int(float(label.split('_')[-1])) for label in pt_labels], dtype=int)
+
+    if len(rows) == 0:
+        return pt_index, np.zeros([0, 0])
+
+    # all values parsed at once
+    values = np.array(' '.join(rows).split(), dtype=float)
+
+    if values.size % len(rows) != 0:
+        raise Exception('Lines of ' + file_name + ' have different numbers of values.')
+
+    return pt_index, values.reshape(len(rows), -1)
+
+# ========================================================================================================= #
+
+def sm_master_rows(pt_var, pt_out_list, dir_name):
+
+    # rows of each output file for the points of the variable file, and which points have all outputs
+    # points are matched by their 'pt_<i>' label (files are merged separately, so a point can be missing from some
+    # of them); master files merged by FAST_Files/combine_sm_results.py repeat labels (every campaign starts at
+    # pt_0), in which case row k of each file belongs to the same point
+    unique_labels = len(np.unique(pt_var)) == len(pt_var)
+    for pt_out in pt_out_list:
+        if len(pt_out) == 0:
+            raise Exception('No training point results found in ' + dir_name + '.')
+        unique_labels = unique_labels and len(np.unique(pt_out)) == len(pt_out)
+
+    rows = []
+
+    if not unique_labels:
+        for pt_out in pt_out_list:
+            if len(pt_out) < len(pt_var):
+                raise Exception('Training point labels in ' + dir_name + ' are repeated, and the output files have '
+                                'fewer lines than sm_master_var.txt, so the points can not be matched.')
+            rows.append(np.arange(len(pt_var)))
+
+        return rows, np.ones(len(pt_var), dtype=bool)
+
+    has_all = np.ones(len(pt_var), dtype=bool)
+    for pt_out in pt_out_list:
+        sorter = np.argsort(pt_out)
+        pos = np.minimum(np.searchsorted(pt_out, pt_var, sorter=sorter), len(pt_out) - 1)
+        rows.append(sorter[pos])
+        has_all = has_all & (pt_out[rows[-1]] == pt_var)
+
+    return rows, has_all
+
+# ========================================================================================================= #
+
+def load_sm_training_data(FASTinfo, num_pts, rated_tq, bladeLength, return_pt=False):
+
+    # training points of the surrogate model, from the sm_master_<ft>.txt files, the binary store (sm_store.py) or
+    # the training database (sm_db.py), depending on FASTinfo['sm_training_store']
+    # returns contiguous (N, .) arrays of the first num_pts points that have all outputs:
+    # xt - design variables (chord_sub in m), yt_x, yt_y - DEMx, DEMy, yt_x_load, yt_y_load - Edg, Flp,
+    # yt_def - tip deflection
+    # (return_pt - the training point index of each row is returned as well)
+
+    dir_name = FASTinfo['opt_dir'] + '/' + FASTinfo['sm_var_out_dir']
+
+    if FASTinfo['sm_training_store'] == 'bin':
+
+        from sm_store import compact_sm_store, read_sm_store
+
+        # shards written by the training jobs are moved into the store first
+        compact_sm_store(FASTinfo['opt_dir'] + '/' + FASTinfo['sm_store_file'])
+
+        header, points = read_sm_store(FASTinfo['opt_dir'] + '/' + FASTinfo['sm_store_file'])
+
+        # stored unscaled, rescaled with the current rated torque (same as the text files)
+        tq_scale = np.reshape(rated_tq / points['rated_tq'], (-1, 1))
+
+        pt = points['pt']
+        sm_var = points['var']
+        yt_DEM = np.hstack([points['DEMx'], points['DEMy']]) * tq_scale
+        yt_load = np.hstack([points['Edg'], points['Flp']]) * tq_scale
+        yt_def = np.reshape(points['tip_def'] / points['bladeLength'], (-1, 1)) * bladeLength
+
+    elif FASTinfo['sm_training_store'] == 'db':
+
+        from sm_db import query_sm_db
+
+        points = query_sm_db(FASTinfo['opt_dir'] + '/' + FASTinfo['sm_db_file'])
+
+        pt = points['pt']
+        sm_var = points['var']
+        yt_DEM = points['DEM'] * rated_tq
+        yt_load = points['load'] * rated_tq
+        yt_def = np.reshape(points['def'], (-1, 1)) * bladeLength
+
+    else:
+
+        pt_var, sm_var = read_sm_master(dir_name + '/sm_master_var.txt')
+        pt_DEM, yt_DEM = read_sm_master(dir_name + '/sm_master_DEM.txt')
+        pt_load, yt_load = read_sm_master(dir_name + '/sm_master_load.txt')
+        pt_def, yt_def = read_sm_master(dir_name + '/sm_master_def.txt')
+
+        pt_var = pt_var[:num_pts]
+        sm_var = sm_var[:num_pts]
+
+        rows, has_all = sm_master_rows(pt_var, [pt_DEM, pt_load, pt_def], dir_name)
+
+        pt = pt_var[has_all]
+        sm_var = sm_var[has_all]
+        yt_DEM = yt_DEM[rows[0][has_all]] * rated_tq
+        yt_load = yt_load[rows[1][has_all]] * rated_tq
+        yt_def = yt_def[rows[2][has_all]] * bladeLength
+
+    pt = pt[:num_pts]
+    sm_var = sm_var[:num_pts]
+    yt_DEM = yt_DEM[:num_pts]
+    yt_load = yt_load[:num_pts]
+    yt_def = yt_def[:num_pts]
+
+    # convert from chord / blade length to chord
+    xt = np.array(sm_var, dtype=float)
+    chord_cols = sm_chord_columns(FASTinfo)
+    xt[:, chord_cols] = xt[:, chord_cols] * bladeLength
+
+    num_DEM = int(yt_DEM.shape[1] / 2)
+    nstr = int(yt_load.shape[1] / 2)
+
+    training_data = (xt, np.ascontiguousarray(yt_DEM[:, 0:num_DEM]), np.ascontiguousarray(yt_DEM[:, num_DEM:]),
+                     np.ascontiguousarray(yt_load[:, 0:nstr]), np.ascontiguousarray(yt_load[:, nstr:]),
+                     np.ascontiguousarray(yt_def))
+
+    if return_pt:
+        return training_data + (pt,)
+
+    return training_data
@@ -0,0 +1,163 @@
+# unit tests of the FAST result cache keys, entries and cache hits (FAST_cache.py); numpy only, FAST is not run
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from collections import OrderedDict
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from FAST_cache import FAST_case_key, FAST_cache_hit_cfg, FAST_cache_entry, FAST_cache_channels, \
+    FAST_cache_run_caseids, put_FAST_cache_entry, prepare_FAST_cache_case, read_FAST_cache_case
+
+# ========================================================================================================= #
+
+def write_file(file_name, contents):
+
+    f = open(file_name, "w")
+    f.write(contents)
+    f.close()
+
+# ========================================================================================================= #
+
+class TestFASTCaseKey(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tmp_dir = tempfile.mkdtemp()
+
+        self.template_dir = os.path.join(self.tmp_dir, 'template')
+        os.makedirs(os.path.join(self.template_dir, 'AeroData'))
+        write_file(os.path.join(self.template_dir, 'fst_runfile.fst'), 'template fst\n')
+        write_file(os.path.join(self.template_dir, 'AeroData', 'Cylinder1.dat'), 'airfoil\n')
+
+        self.wnd_file = os.path.join(self.tmp_dir, 'wind.wnd')
+        write_file(self.wnd_file, 'wind\n')
+
+        self.fst_exe = os.path.join(self.tmp_dir, 'FAST_glin64')
+        write_file(self.fst_exe, 'exe\n')
+
+        self.case_files = {'fst_runfile.fst': 'rendered fst\n', 'NREL5MW_Blade.dat': 'blade\n'}
+        self.cfg = OrderedDict([('TMax', 60.0), ('BldGagNd', [1, 2, 3]), ('fst_rundir', '/case/1'),
+                                ('PtfmModel', np.array([1.0, 2.0]))])
+        self.settings = {'m_value': 10.0, 'rm_time': 5.0}
+
+    def tearDown(self):
+
+        shutil.rmtree(self.tmp_dir)
+
+    def key(self, **changes):
+
+        args = {'template_dir': self.template_dir, 'case_files': self.case_files, 'cfg': self.cfg,
+                'wnd_file_path': self.wnd_file, 'fst_exe': self.fst_exe, 'settings': self.settings}
+        args.update(changes)
+
+        return FAST_case_key(args['template_dir'], args['case_files'], args['cfg'], args['wnd_file_path'],
+                             args['fst_exe'], args['settings'])
+
+    def test_stable(self):
+
+        key = self.key()
+
+        self.assertEqual(key, self.key())
+        self.assertEqual(len(key), 40)
+
+        # config order, numpy values, case directory, cache hit mark and quoted wind file path do not change the key
+        cfg = OrderedDict(reversed(list(self.cfg.items())))
+        cfg['PtfmModel'] = [1.0, 2.0]
+        cfg['fst_rundir'] = '/case/2'
+        cfg[FAST_cache_hit_cfg] = True
+        self.assertEqual(key, self.key(cfg=cfg, wnd_file_path='"' + self.wnd_file + '"'))
+
+    def test_inputs_change_key(self):
+
+        key = self.key()
+
+        cfg = OrderedDict(self.cfg)
+        cfg['TMax'] = 61.0
+        self.assertNotEqual(key, self.key(cfg=cfg))
+
+        case_files = dict(self.case_files)
+        case_files['NREL5MW_Blade.dat'] = 'blade 2\n'
+        self.assertNotEqual(key, self.key(case_files=case_files))
+
+        self.assertNotEqual(key, self.key(settings={'m_value': 9.0, 'rm_time': 5.0}))
+
+        # (different sizes, so the digests are not reused)
+        write_file(self.wnd_file, 'other wind\n')
+        key_wnd = self.key()
+        self.assertNotEqual(key, key_wnd)
+
+        write_file(os.path.join(self.template_dir, 'AeroData', 'Cylinder1.dat'), 'other airfoil\n')
+        key_template = self.key()
+        self.assertNotEqual(key_wnd, key_template)
+
+        write_file(self.fst_exe, 'other exe\n')
+        self.assertNotEqual(key_template, self.key())
+
+    def test_rendered_template_file(self):
+
+        # a template file that is rendered for the case is hashed by its rendered contents only
+        key = self.key()
+
+        write_file(os.path.join(self.template_dir, 'fst_runfile.fst'), 'changed template fst\n')
+
+        self.assertEqual(key, self.key())
+
+# ========================================================================================================= #
+
+class TestFASTCacheCase(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.tmp_dir, 'cache')
+        self.case_dir = os.path.join(self.tmp_dir, 'WNDfile1_sgp1')
+        os.mkdir(self.case_dir)
+
+        self.resultsdict = {'RootMxb1': np.array([1.0, -3.0, 2.0]), 'OoPDefl1': np.array([0.5, 1.5, -0.5])}
+        self.entry = FAST_cache_entry(np.array([[10.0], [20.0]]), ['RootMxb1', 'RootMyb1'],
+                                      [np.array([1.0, 2.0]), np.array([3.0])], self.resultsdict)
+
+    def tearDown(self):
+
+        shutil.rmtree(self.tmp_dir)
+
+    def test_hit(self):
+
+        put_FAST_cache_entry(self.cache_dir, 'a' * 40, self.entry, 1e9)
+
+        self.assertTrue(prepare_FAST_cache_case(self.cache_dir, 'a' * 40, self.case_dir))
+        key, entry = read_FAST_cache_case(self.case_dir)
+
+        # the channel extremes are kept as such, not as time series
+        self.assertEqual(key, 'a' * 40)
+        np.testing.assert_array_equal(entry['DEM'], [[10.0], [20.0]])
+        np.testing.assert_array_equal(entry['peaks_list'][1], [3.0])
+        self.assertEqual(FAST_cache_channels(entry, 'min'), {'OoPDefl1': -0.5, 'RootMxb1': -3.0})
+        self.assertEqual(FAST_cache_channels(entry, 'max'), {'OoPDefl1': 1.5, 'RootMxb1': 2.0})
+        self.assertEqual(FAST_cache_channels(entry, 'mean'), {'OoPDefl1': 0.5, 'RootMxb1': 0.0})
+
+    def test_miss(self):
+
+        self.assertEqual(prepare_FAST_cache_case(self.cache_dir, 'b' * 40, self.case_dir), None)
+        self.assertEqual(read_FAST_cache_case(self.case_dir), ('b' * 40, None))
+
+    def test_run_caseids(self):
+
+        # only the cases that are not marked as hits are run
+        cfg_master = {'WNDfile1_sgp1': {FAST_cache_hit_cfg: True}, 'WNDfile2_sgp1': {'TMax': 60.0},
+                      'WNDfile3_sgp1': {FAST_cache_hit_cfg: True}}
+
+        self.assertEqual(FAST_cache_run_caseids(cfg_master, ['WNDfile1_sgp1', 'WNDfile2_sgp1', 'WNDfile3_sgp1']),
+                         ['WNDfile2_sgp1'])
+        self.assertEqual(FAST_cache_run_caseids(dict(), ['WNDfile1_sgp1']), ['WNDfile1_sgp1'])
+
+# ========================================================================================================= #
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+# unit tests of the spanwise moment arms used to reconstruct the spanwise loads, and of the error budget of the
+# reconstruction (FAST_span_loads.py); numpy only
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from FAST_span_loads import element_moment_arms, span_load_errors, save_span_load_check, check_span_load_errors, \
+    span_load_check_file_name, span_load_quantities
+
+# ========================================================================================================= #
+
+def integrated_moment_arms(r_nodes, dr_nodes, r_stations, num_steps=20000):
+
+    # midpoint rule integral of (r - r_station) over the part of each element outboard of the station
+    arms = np.zeros([len(r_stations), len(r_nodes)])
+    for j in range(len(r_nodes)):
+        ds = dr_nodes[j] / num_steps
+        r = r_nodes[j] - dr_nodes[j] / 2.0 + ds * (np.arange(num_steps) + 0.5)
+        for i in range(len(r_stations)):
+            arms[i, j] = np.sum(np.maximum(r - r_stations[i], 0.0)) * ds
+
+    return arms
+
+# ========================================================================================================= #
+
+class TestElementMomentArms(unittest.TestCase):
+
+    def setUp(self):
+
+        # element centers / lengths of a 63 m blade (NREL 5MW AeroDyn nodes)
+        self.dr_nodes = np.array([2.7333, 2.7333, 2.7333, 4.1, 4.1, 4.1, 4.1, 4.1, 4.1, 4.1, 4.1, 4.1, 4.1, 2.7333,
+                                  2.7333, 2.7333, 2.7333])
+        self.r_nodes = 1.5 + np.cumsum(self.dr_nodes) - self.dr_nodes / 2.0
+
+    def test_root(self):
+
+        # all of every element is outboard of the blade root: arm = length * (center - root)
+        arms = element_moment_arms(self.r_nodes, self.dr_nodes, [1.5])
+
+        np.testing.assert_allclose(arms[0], self.dr_nodes * (self.r_nodes - 1.5), rtol=1e-12)
+
+    def test_stations(self):
+
+        # stations at element centers, element edges, between nodes and outboard of the tip
+        r_stations = [1.5, self.r_nodes[2], self.r_nodes[5] + self.dr_nodes[5] / 2.0, 30.0, self.r_nodes[-1],
+                      70.0]
+
+        arms = element_moment_arms(self.r_nodes, self.dr_nodes, r_stations)
+
+        self.assertEqual(arms.shape, (len(r_stations), len(self.r_nodes)))
+        np.testing.assert_allclose(arms, integrated_moment_arms(self.r_nodes, self.dr_nodes, r_stations),
+                                   rtol=1e-6, atol=1e-6)
+
+        # elements inboard of a station do not contribute, nothing is outboard of the tip
+        self.assertTrue(np.all(arms[2, :6] == 0.0))
+        self.assertTrue(np.all(arms[-1] == 0.0))
+
+    def test_element_center(self):
+
+        # a station at an element center only sees the outboard half of that element
+        arms = element_moment_arms(self.r_nodes, self.dr_nodes, [self.r_nodes[4]])
+
+        self.assertAlmostEqual(arms[0, 4], (self.dr_nodes[4] / 2.0)**2.0 / 2.0, places=12)
+        self.assertTrue(np.all(arms[0, :4] == 0.0))
+
+# ========================================================================================================= #
+
+class TestSpanLoadCheck(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tmp_dir = tempfile.mkdtemp()
+
+        # root and 3 nodes, node 2 reconstructed
+        self.reconstructed = [2]
+        M_ref = np.array([[1.0, 2.0, 4.0, 8.0], [2.0, 4.0, 8.0, 16.0]])
+        M_span = M_ref * np.array([[1.0, 1.0, 1.03, 1.0], [1.0, 1.0, 0.98, 1.2]])
+
+        self.errors = dict()
+        for quantity in span_load_quantities:
+            self.errors[quantity] = span_load_errors(M_ref, M_span)
+
+        save_span_load_check(os.path.join(self.tmp_dir, span_load_check_file_name), self.errors, self.reconstructed, 2)
+
+    def tearDown(self):
+
+        shutil.rmtree(self.tmp_dir)
+
+    def test_errors(self):
+
+        np.testing.assert_allclose(self.errors['DEMx'][0], [0.0, 0.0, 0.03, 0.2])
+        np.testing.assert_allclose(self.errors['DEMx'][1], [0.0, 0.0, np.sqrt((0.03**2.0 + 0.02**2.0) / 2.0),
+                                                            np.sqrt(0.2**2.0 / 2.0)])
+
+    def test_within_budget(self):
+
+        # only the reconstructed nodes count (node 3 is a strain gage)
+        self.assertAlmostEqual(check_span_load_errors(self.tmp_dir, 0.05), 0.03)
+
+    def test_above_budget(self):
+
+        self.assertRaises(Exception, check_span_load_errors, self.tmp_dir, 0.01)
+
+    def test_not_measured(self):
+
+        os.remove(os.path.join(self.tmp_dir, span_load_check_file_name))
+
+        self.assertRaises(Exception, check_span_load_errors, self.tmp_dir, 0.05)
+
+# ========================================================================================================= #
+
+if __name__ == "__main__":
+    unittest.main()
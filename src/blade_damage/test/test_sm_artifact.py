@@ -0,0 +1,267 @@
+# unit tests of the .smb surrogate model files, fused fits and output PCA (sm_artifact.py); numpy only
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sm_artifact import PolySM, RBFSM, KrigingSM, ColumnSM, PCASM, save_sm_artifact, load_sm_artifact, fit_fused_sm, \
+    fit_output_pca
+
+# ========================================================================================================= #
+
+def training_points(num_pts=30, num_var=3, seed=1):
+
+    rng = np.random.RandomState(seed)
+    xt = rng.uniform(0.0, 1.0, [num_pts, num_var])
+    yt_list = [np.column_stack([np.sin(3.0 * xt[:, 0]) + xt[:, 1]**2.0, xt[:, 2] * xt[:, 0]]),
+               np.column_stack([np.cos(xt[:, 1]) + 2.0 * xt[:, 2]])]
+
+    return xt, yt_list
+
+# ========================================================================================================= #
+
+def quadratic_basis(x):
+
+    # unscaled second order polynomial basis: 1, x_i, x_i x_j (i <= j)
+    terms = [np.ones([x.shape[0], 1]), x]
+    for i in range(x.shape[1]):
+        terms.append(x[:, i:i + 1] * x[:, i:])
+
+    return np.hstack(terms)
+
+# ========================================================================================================= #
+
+class TestSMArtifact(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self.x = np.random.RandomState(2).uniform(0.0, 1.0, [7, 3])
+
+    def tearDown(self):
+
+        shutil.rmtree(self.tmp_dir)
+
+    def round_trip(self, sm, approximation_model):
+
+        file_name = os.path.join(self.tmp_dir, 'sm.smb')
+        save_sm_artifact(file_name, sm, approximation_model)
+
+        return load_sm_artifact(file_name)
+
+    def assert_same_predictions(self, sm, sm_loaded):
+
+        y = sm.predict_values(self.x)
+        y_loaded = sm_loaded.predict_values(self.x)
+        dy = sm.predict_derivatives(self.x, 1)
+        dy_loaded = sm_loaded.predict_derivatives(self.x, 1)
+
+        if isinstance(y, list):
+            for i in range(len(y)):
+                np.testing.assert_array_equal(y[i], y_loaded[i])
+                np.testing.assert_array_equal(dy[i], dy_loaded[i])
+        else:
+            np.testing.assert_array_equal(y, y_loaded)
+            np.testing.assert_array_equal(dy, dy_loaded)
+
+    def test_round_trip_poly(self):
+
+        rng = np.random.RandomState(1)
+        sm = PolySM(rng.uniform(size=3), rng.uniform(1.0, 2.0, 3), rng.uniform(size=[10, 2]), 2)
+
+        self.assert_same_predictions(sm, self.round_trip(sm, 'second_order_poly'))
+
+    def test_round_trip_rbf(self):
+
+        rng = np.random.RandomState(2)
+        sm = RBFSM(rng.uniform(size=[10, 3]), rng.uniform(0.5, 1.0, 3), rng.uniform(size=[14, 2]), 1)
+
+        self.assert_same_predictions(sm, self.round_trip(sm, 'RBF'))
+
+    def test_round_trip_fused(self):
+
+        xt, yt_list = training_points()
+
+        for approximation_model in ['second_order_poly', 'least_squares', 'RBF']:
+
+            sm = fit_fused_sm(xt, yt_list, ['DEM', 'load'], approximation_model)
+            sm_loaded = self.round_trip(sm, approximation_model)
+
+            self.assertEqual(sm_loaded.names, ['DEM', 'load'])
+            self.assertEqual(sm_loaded.sizes, [2, 1])
+            self.assert_same_predictions(sm, sm_loaded)
+
+    def test_round_trip_kriging(self):
+
+        rng = np.random.RandomState(3)
+        sm = KrigingSM(rng.uniform(size=3), rng.uniform(1.0, 2.0, 3), rng.uniform(size=[10, 3]),
+                       rng.uniform(size=2), rng.uniform(1.0, 2.0, 2), rng.uniform(0.1, 1.0, 3),
+                       rng.uniform(size=[4, 2]), rng.uniform(size=[10, 2]), 2.0, 1)
+
+        self.assert_same_predictions(sm, self.round_trip(sm, 'kriging'))
+
+    def test_round_trip_columns(self):
+
+        xt, yt_list = training_points()
+
+        columns = ColumnSM([fit_fused_sm(xt, [yt_list[0][:, i:i + 1]], ['DEM'], 'least_squares').sm
+                            for i in range(2)])
+        self.assert_same_predictions(columns, self.round_trip(columns, 'least_squares'))
+
+    def test_round_trip_pca(self):
+
+        xt, yt_list = training_points()
+
+        y_mean, components, scores = fit_output_pca(yt_list[0], 2)
+        pca = PCASM(fit_fused_sm(xt, [scores], ['DEM'], 'RBF').sm, y_mean, components)
+        self.assert_same_predictions(pca, self.round_trip(pca, 'RBF'))
+
+    def test_overwrite_mapped_file(self):
+
+        # a model loaded (memory-mapped) before the file is saved again keeps its values
+        rng = np.random.RandomState(4)
+        file_name = os.path.join(self.tmp_dir, 'sm.smb')
+
+        sm_old = PolySM(rng.uniform(size=3), rng.uniform(1.0, 2.0, 3), rng.uniform(size=[10, 2]), 2)
+        save_sm_artifact(file_name, sm_old, 'second_order_poly')
+        sm_loaded = load_sm_artifact(file_name)
+
+        sm_new = PolySM(rng.uniform(size=3), rng.uniform(1.0, 2.0, 3), rng.uniform(size=[4, 5]), 1)
+        save_sm_artifact(file_name, sm_new, 'least_squares')
+
+        self.assert_same_predictions(sm_old, sm_loaded)
+        self.assert_same_predictions(sm_new, load_sm_artifact(file_name))
+        self.assertEqual(os.listdir(self.tmp_dir), ['sm.smb'])
+
+    def test_empty_blocks(self):
+
+        sm = PolySM(np.zeros(0), np.zeros(0), np.zeros([1, 0]), 1)
+
+        sm_loaded = self.round_trip(sm, 'least_squares')
+
+        self.assertEqual(sm_loaded.coef.shape, (1, 0))
+        self.assertEqual(sm_loaded.X_offset.shape, (0,))
+
+    def test_not_an_artifact(self):
+
+        file_name = os.path.join(self.tmp_dir, 'sm.smb')
+        f = open(file_name, "wb")
+        f.write(b'not a surrogate model file')
+        f.close()
+
+        self.assertRaises(Exception, load_sm_artifact, file_name)
+
+# ========================================================================================================= #
+
+class TestFitFusedSM(unittest.TestCase):
+
+    def test_rbf_direct_solve(self):
+
+        xt, yt_list = training_points()
+        d0 = 0.7
+        reg = 1e-10
+
+        sm = fit_fused_sm(xt, yt_list, ['DEM', 'load'], 'RBF', d0=d0, reg=reg)
+
+        # interpolation matrix, solved separately for each output block
+        K = np.exp(-np.sum(((xt[:, np.newaxis, :] - xt[np.newaxis, :, :]) / d0)**2.0, axis=2))
+        K += reg * np.eye(len(xt))
+
+        x = np.random.RandomState(4).uniform(0.0, 1.0, [5, 3])
+        K_x = np.exp(-np.sum(((x[:, np.newaxis, :] - xt[np.newaxis, :, :]) / d0)**2.0, axis=2))
+
+        y_list = sm.predict_values(x)
+        for i in range(len(yt_list)):
+            np.testing.assert_allclose(y_list[i], np.dot(K_x, np.linalg.solve(K, yt_list[i])), rtol=1e-8, atol=1e-8)
+
+    def test_poly_direct_solve(self):
+
+        xt, yt_list = training_points()
+        x = np.random.RandomState(5).uniform(0.0, 1.0, [5, 3])
+
+        sm = fit_fused_sm(xt, yt_list, ['DEM', 'load'], 'second_order_poly')
+
+        # least squares in unscaled inputs (the fit does not depend on the input scaling)
+        y_list = sm.predict_values(x)
+        for i in range(len(yt_list)):
+            coef = np.linalg.lstsq(quadratic_basis(xt), yt_list[i], rcond=None)[0]
+            np.testing.assert_allclose(y_list[i], np.dot(quadratic_basis(x), coef), rtol=1e-8, atol=1e-10)
+
+        sm = fit_fused_sm(xt, yt_list, ['DEM', 'load'], 'least_squares')
+
+        B = np.hstack([np.ones([len(xt), 1]), xt])
+        y_list = sm.predict_values(x)
+        for i in range(len(yt_list)):
+            coef = np.linalg.lstsq(B, yt_list[i], rcond=None)[0]
+            np.testing.assert_allclose(y_list[i], np.dot(np.hstack([np.ones([len(x), 1]), x]), coef), rtol=1e-8,
+                                       atol=1e-10)
+
+    def test_poly_derivatives(self):
+
+        xt, yt_list = training_points()
+        x = np.random.RandomState(6).uniform(0.2, 0.8, [4, 3])
+        h = 1e-6
+
+        sm = fit_fused_sm(xt, yt_list, ['DEM', 'load'], 'second_order_poly')
+
+        for kx in range(3):
+            dx = np.zeros(3)
+            dx[kx] = h
+            fd = (sm.sm.predict_values(x + dx) - sm.sm.predict_values(x - dx)) / (2.0 * h)
+            np.testing.assert_allclose(sm.sm.predict_derivatives(x, kx), fd, rtol=1e-5, atol=1e-7)
+
+    def test_not_fused(self):
+
+        xt, yt_list = training_points()
+
+        self.assertRaises(Exception, fit_fused_sm, xt, yt_list, ['DEM', 'load'], 'kriging')
+
+# ========================================================================================================= #
+
+class TestOutputPCA(unittest.TestCase):
+
+    def test_all_components(self):
+
+        yt = np.random.RandomState(7).uniform(1.0, 2.0, [20, 6])
+
+        y_mean, components, scores = fit_output_pca(yt, 6)
+
+        self.assertEqual(components.shape, (6, 6))
+        self.assertEqual(scores.shape, (20, 6))
+        np.testing.assert_allclose(y_mean + np.dot(scores, components), yt, rtol=1e-10)
+
+    def test_variance_fraction(self):
+
+        # outputs of rank 2 (plus a constant column): two components keep all of the variance
+        rng = np.random.RandomState(8)
+        basis = rng.uniform(size=[2, 5])
+        yt = np.hstack([np.dot(rng.uniform(size=[20, 2]), basis), np.ones([20, 1])])
+
+        y_mean, components, scores = fit_output_pca(yt, 0.9999)
+
+        self.assertEqual(components.shape[0], 2)
+        np.testing.assert_allclose(y_mean + np.dot(scores, components), yt, rtol=1e-10, atol=1e-12)
+
+    def test_fewer_components(self):
+
+        yt = np.random.RandomState(9).uniform(1.0, 2.0, [20, 6])
+
+        y_mean, components, scores = fit_output_pca(yt, 3)
+
+        # reconstruction is the projection on the kept components (standardized outputs)
+        y_std = np.std(yt, axis=0)
+        u = (yt - y_mean) / y_std
+        U, s, Vt = np.linalg.svd(u, full_matrices=False)
+        u_proj = np.dot(np.dot(u, Vt[:3].T), Vt[:3])
+
+        np.testing.assert_allclose(y_mean + np.dot(scores, components), y_mean + u_proj * y_std, rtol=1e-10)
+
+# ========================================================================================================= #
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+# unit tests of the saved hyperparameter settings (sm_hyper.py); numpy only
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sm_hyper import save_sm_hyper, load_sm_hyper, sm_hyper_file_name, sm_hyper_grid
+
+# ========================================================================================================= #
+
+class TestSMHyperFile(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+
+        shutil.rmtree(self.tmp_dir)
+
+    def test_round_trip(self):
+
+        file_name = sm_hyper_file_name(self.tmp_dir, 'KPLS')
+        save_sm_hyper(file_name, 'KPLS', {'theta0': 0.1, 'n_comp': 2}, 0.05)
+
+        self.assertEqual(file_name, os.path.join(self.tmp_dir, 'sm_hyper_KPLS.json'))
+        self.assertEqual(load_sm_hyper(file_name), {'theta0': 0.1, 'n_comp': 2})
+
+    def test_no_search(self):
+
+        self.assertEqual(load_sm_hyper(sm_hyper_file_name(self.tmp_dir, 'RBF')), {})
+
+# ========================================================================================================= #
+
+class TestSMHyperGrid(unittest.TestCase):
+
+    def test_candidates(self):
+
+        grid_values = {'d0': [1.0, 2.0], 'theta0': [1e-2, 1e-1], 'n_comp': [1, 2, 3]}
+
+        self.assertEqual(sm_hyper_grid('RBF', 3, grid_values), [{'d0': 1.0}, {'d0': 2.0}])
+        self.assertEqual(sm_hyper_grid('second_order_poly', 3, grid_values), [])
+
+        # no more components than design variables
+        candidates = sm_hyper_grid('KPLSK', 2, grid_values)
+        self.assertEqual(len(candidates), 4)
+        self.assertEqual(sorted(set([candidate['n_comp'] for candidate in candidates])), [1, 2])
+
+# ========================================================================================================= #
+
+if __name__ == "__main__":
+    unittest.main()
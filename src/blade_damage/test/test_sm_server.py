@@ -0,0 +1,113 @@
+# unit tests of the access control of the surrogate model server (sm_server.py); numpy only, no models are loaded
+
+import os
+import sys
+import stat
+import time
+import shutil
+import binascii
+import tempfile
+import unittest
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sm_server
+from sm_server import serve_sm, get_sm_client, sm_server_dir, sm_server_address, sm_server_key_file, \
+    sm_server_info, sm_server_keys, sm_server_authkey_env
+
+# ========================================================================================================= #
+
+class TestSMServerDir(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self.environ = dict(os.environ)
+        os.environ['XDG_RUNTIME_DIR'] = self.tmp_dir
+
+    def tearDown(self):
+
+        os.environ.clear()
+        os.environ.update(self.environ)
+        shutil.rmtree(self.tmp_dir)
+
+    def test_private_dir(self):
+
+        dir_name = sm_server_dir()
+
+        self.assertEqual(dir_name, os.path.join(self.tmp_dir, 'blade_damage_sm'))
+        self.assertEqual(stat.S_IMODE(os.stat(dir_name).st_mode), 0o700)
+        self.assertEqual(sm_server_address(), os.path.join(dir_name, 'sm_server.sock'))
+
+    def test_shared_dir_rejected(self):
+
+        os.mkdir(os.path.join(self.tmp_dir, 'blade_damage_sm'), 0o755)
+        os.chmod(os.path.join(self.tmp_dir, 'blade_damage_sm'), 0o755)
+
+        self.assertRaises(Exception, sm_server_dir)
+
+    def test_absolute_opt_dir(self):
+
+        FASTinfo = dict([(key, None) for key in sm_server_keys])
+        FASTinfo['opt_dir'] = 'FAST_Files/Opt_Files/test_sm'
+
+        self.assertEqual(sm_server_info(FASTinfo)['opt_dir'], os.path.abspath('FAST_Files/Opt_Files/test_sm'))
+
+# ========================================================================================================= #
+
+class TestSMServerConnection(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self.address = os.path.join(self.tmp_dir, 'sm_server.sock')
+        self.environ = dict(os.environ)
+
+        self.server = multiprocessing.Process(target=serve_sm, args=(self.address,))
+        self.server.daemon = True
+        self.server.start()
+
+        for i in range(100):
+            if os.path.exists(self.address) and os.path.exists(sm_server_key_file(self.address)):
+                break
+            time.sleep(0.05)
+
+        sm_server._sm_client.clear()
+
+    def tearDown(self):
+
+        self.server.terminate()
+        self.server.join()
+        sm_server._sm_client.clear()
+        os.environ.clear()
+        os.environ.update(self.environ)
+        shutil.rmtree(self.tmp_dir)
+
+    def test_key_file(self):
+
+        self.assertEqual(stat.S_IMODE(os.stat(sm_server_key_file(self.address)).st_mode), 0o600)
+
+        # a new key for each server
+        f = open(sm_server_key_file(self.address), "rb")
+        authkey = f.read()
+        f.close()
+        self.assertEqual(len(binascii.unhexlify(authkey)), 32)
+
+    def test_connect(self):
+
+        sm_client = get_sm_client(self.address)
+
+        self.assertTrue(sm_client)
+        self.assertEqual(sm_client.cache_stats()['num_cached'], 0)
+
+    def test_wrong_key(self):
+
+        os.environ[sm_server_authkey_env] = binascii.hexlify(os.urandom(32)).decode('ascii')
+
+        self.assertFalse(get_sm_client(self.address))
+
+# ========================================================================================================= #
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+# unit tests of the binary training point store and its shards (sm_store.py); numpy only
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sm_store import write_sm_shard, sm_shard_dir, sm_shard_files, compact_sm_store, read_sm_store
+
+# ========================================================================================================= #
+
+class TestSMStore(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self.store_file = os.path.join(self.tmp_dir, 'sm_store.bin')
+
+    def tearDown(self):
+
+        shutil.rmtree(self.tmp_dir)
+
+    def write_point(self, pt, value, shard_name=None):
+
+        # 2 design variables, 3 DEMs, 2 strain gages; every value of the point is value
+        write_sm_shard(self.store_file, 2, 3, 2, 'variable points: ', pt, [value] * 2, [value] * 3, [value] * 3,
+                       [value] * 2, [value] * 2, value, value, value)
+
+        # (rename the shard just written, to control the order the shard files are listed in)
+        if shard_name is not None:
+            shard_dir = sm_shard_dir(self.store_file)
+            written_suffix = '_' + str(os.getpid()) + '.bin'
+            for shard_file in os.listdir(shard_dir):
+                if shard_file.startswith('pt_' + str(pt) + '_') and shard_file.endswith(written_suffix):
+                    os.rename(os.path.join(shard_dir, shard_file), os.path.join(shard_dir, shard_name))
+
+    def test_read_shards_and_store(self):
+
+        for pt in [2, 0, 1]:
+            self.write_point(pt, float(pt) + 0.5)
+
+        header, points = read_sm_store(self.store_file)
+
+        np.testing.assert_array_equal(points['pt'], [0, 1, 2])
+        np.testing.assert_array_equal(points['DEMx'], np.reshape([0.5, 1.5, 2.5], (-1, 1)) * np.ones([1, 3]))
+        self.assertEqual(header['var_header'], 'variable points: ')
+
+        self.assertEqual(compact_sm_store(self.store_file), 3)
+        self.assertEqual(len(sm_shard_files(self.store_file)), 0)
+
+        header, points_compacted = read_sm_store(self.store_file)
+        for name in points:
+            np.testing.assert_array_equal(points[name], points_compacted[name])
+
+    def test_last_write_wins(self):
+
+        # the point written last is used, whatever the order of the shard files or the position in the store
+        self.write_point(0, 1.0, 'pt_0_z.bin')
+        time.sleep(0.01)
+        self.write_point(0, 2.0, 'pt_0_a.bin')
+
+        header, points = read_sm_store(self.store_file)
+        np.testing.assert_array_equal(points['tip_def'], [2.0])
+
+        compact_sm_store(self.store_file)
+        time.sleep(0.01)
+        self.write_point(0, 3.0)
+        compact_sm_store(self.store_file)
+
+        header, points = read_sm_store(self.store_file)
+        np.testing.assert_array_equal(points['pt'], [0])
+        np.testing.assert_array_equal(points['tip_def'], [3.0])
+
+    def test_corrupt_record(self):
+
+        self.write_point(0, 1.0)
+        self.write_point(1, 2.0)
+        compact_sm_store(self.store_file)
+
+        # flip a byte of the last value of the last record
+        f = open(self.store_file, "r+b")
+        f.seek(-1, os.SEEK_END)
+        last_byte = f.read(1)
+        f.seek(-1, os.SEEK_END)
+        f.write(bytes(bytearray([ord(last_byte) ^ 0xff])))
+        f.close()
+
+        header, points = read_sm_store(self.store_file)
+        np.testing.assert_array_equal(points['pt'], [0])
+
+    def test_no_points(self):
+
+        self.assertRaises(Exception, read_sm_store, self.store_file)
+
+# ========================================================================================================= #
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,180 @@
+# unit tests of the surrogate model training and cross validation error statistics (sm_train.py); the training
+# tests need smt
+
+import os
+import sys
+import unittest
+import warnings
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sm_train import train_sm_models, approximation_sm, sm_approximation_models, cv_error_stats, \
+    sm_kfolds
+
+try:
+    import smt
+    has_smt = True
+except ImportError:
+    has_smt = False
+
+# ========================================================================================================= #
+
+def training_points(num_pts=24, num_var=3, seed=1):
+
+    rng = np.random.RandomState(seed)
+    xt = rng.uniform(0.0, 1.0, [num_pts, num_var])
+    yt_list = [np.column_stack([np.sin(3.0 * xt[:, 0]) + xt[:, 1]**2.0]),
+               np.column_stack([np.cos(xt[:, 1]) + 2.0 * xt[:, 2] * xt[:, 0]])]
+
+    return xt, yt_list
+
+# ========================================================================================================= #
+
+def cv_error_loop(yt, yt_cv, kfolds):
+
+    # per point / per fold loops of the do_cv_DEM / do_cv_Load branches that cv_error_stats replaced
+    num_out = yt.shape[1]
+    num_folds = len(kfolds)
+
+    error = np.zeros([num_out, num_folds])
+    percent_error = np.zeros([num_out, num_folds])
+
+    for j in range(num_folds):
+
+        cur_error = np.zeros([num_out, len(kfolds[j])])
+        cur_percent_error = np.zeros([num_out, len(kfolds[j])])
+
+        for k in range(len(kfolds[j])):
+            pt = int(kfolds[j][k])
+            for i in range(num_out):
+                cur_error[i][k] = yt_cv[pt][i] - yt[pt][i]
+                cur_percent_error[i][k] = abs(yt_cv[pt][i] - yt[pt][i]) / yt[pt][i]
+
+        for i in range(num_out):
+            error[i][j] = sum(cur_error[i, :]) / len(cur_error[i, :])
+            percent_error[i][j] = sum(cur_percent_error[i, :]) / len(cur_percent_error[i, :])
+
+    avg_percent_error = np.zeros([num_out, 1])
+    rms_percent_error = np.zeros([num_out, 1])
+    max_percent_error = np.zeros([num_out, 1])
+
+    for i in range(num_out):
+        avg_percent_error[i] = sum(percent_error[i, :]) / len(percent_error[i, :])
+
+        squared_total = 0.0
+        for index in range(len(percent_error[i, :])):
+            squared_total += percent_error[i, index] ** 2.0
+        rms_percent_error[i] = (squared_total / len(percent_error[i, :])) ** 0.5
+
+        max_percent_error[i] = max(percent_error[i, :])
+
+    rms_error = (sum(rms_percent_error[:, 0] ** 2.0) / num_out) ** 0.5
+
+    return error, percent_error, avg_percent_error, rms_percent_error, max_percent_error, rms_error
+
+# ========================================================================================================= #
+
+class TestCVErrorStats(unittest.TestCase):
+
+    def test_against_loop(self):
+
+        rng = np.random.RandomState(1)
+        yt = rng.uniform(1.0, 2.0, [20, 4])
+        yt_cv = yt * rng.uniform(0.9, 1.1, [20, 4])
+        kfolds = np.split(rng.permutation(20), 5)
+
+        stats = cv_error_stats(yt, yt_cv, kfolds)
+        error, percent_error, avg_percent_error, rms_percent_error, max_percent_error, rms_error = \
+            cv_error_loop(yt, yt_cv, kfolds)
+
+        np.testing.assert_allclose(stats['error'], error, rtol=1e-12, atol=1e-15)
+        np.testing.assert_allclose(stats['percent_error'], percent_error, rtol=1e-12)
+        np.testing.assert_allclose(stats['avg_percent_error'], avg_percent_error, rtol=1e-12)
+        np.testing.assert_allclose(stats['rms_percent_error'], rms_percent_error, rtol=1e-12)
+        np.testing.assert_allclose(stats['max_percent_error'], max_percent_error, rtol=1e-12)
+        self.assertAlmostEqual(stats['rms_error'], rms_error, places=12)
+
+    def test_kfolds(self):
+
+        # every point is held out exactly once, the same folds for the same seed
+        kfolds = sm_kfolds(20, 5, seed=3)
+
+        self.assertEqual(len(kfolds), 5)
+        np.testing.assert_array_equal(np.sort(np.concatenate(kfolds).astype(int)), np.arange(20))
+        np.testing.assert_array_equal(np.concatenate(kfolds), np.concatenate(sm_kfolds(20, 5, seed=3)))
+
+        self.assertRaises(Exception, sm_kfolds, 20, 3)
+
+# ========================================================================================================= #
+
+@unittest.skipIf(not has_smt, 'smt is not installed')
+class TestTrainSMModels(unittest.TestCase):
+
+    def train(self, approximation_model, num_procs, per_column=False):
+
+        xt, yt_list = training_points()
+        sm_list = [approximation_sm(approximation_model, [1e-2], xt.shape[1]) for yt in yt_list]
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            sm_trained = train_sm_models(sm_list, ['DEM', 'load'], xt, yt_list, approximation_model,
+                                         num_procs=num_procs, per_column=per_column, print_time=False)[0]
+
+        return sm_trained
+
+    def test_serial_parallel(self):
+
+        # fits trained in worker processes are identical to fits trained in this process
+        x = np.random.RandomState(2).uniform(0.0, 1.0, [6, 3])
+
+        for approximation_model in sm_approximation_models:
+
+            sm_serial = self.train(approximation_model, 1)
+            sm_parallel = self.train(approximation_model, 2)
+
+            for name in ['DEM', 'load']:
+                np.testing.assert_array_equal(sm_serial[name].predict_values(x),
+                                              sm_parallel[name].predict_values(x), err_msg=approximation_model)
+                np.testing.assert_array_equal(sm_serial[name].predict_derivatives(x, 1),
+                                              sm_parallel[name].predict_derivatives(x, 1), err_msg=approximation_model)
+
+    def test_serial_parallel_columns(self):
+
+        x = np.random.RandomState(3).uniform(0.0, 1.0, [6, 3])
+
+        sm_serial = self.train('RBF', 1, per_column=True)
+        sm_parallel = self.train('RBF', 2, per_column=True)
+
+        for name in ['DEM', 'load']:
+            np.testing.assert_array_equal(sm_serial[name].predict_values(x), sm_parallel[name].predict_values(x))
+
+# ========================================================================================================= #
+
+@unittest.skipIf(not has_smt, 'smt is not installed')
+class TestApproximationSM(unittest.TestCase):
+
+    def test_defaults(self):
+
+        self.assertEqual(approximation_sm('RBF', [1e-2], 3).options['d0'], 5)
+        np.testing.assert_array_equal(approximation_sm('kriging', [1e-2], 3).options['theta0'], [1e-2] * 3)
+        np.testing.assert_array_equal(approximation_sm('KPLS', [1e-2], 3).options['theta0'], [1e-2])
+
+    def test_settings(self):
+
+        self.assertEqual(approximation_sm('RBF', [1e-2], 3, {'d0': 2.0}).options['d0'], 2.0)
+        np.testing.assert_array_equal(approximation_sm('kriging', [1e-2], 3, {'theta0': 0.1}).options['theta0'],
+                                      [0.1] * 3)
+
+        sm = approximation_sm('KPLSK', [1e-2], 3, {'theta0': 0.1, 'n_comp': 2})
+        self.assertEqual(sm.options['n_comp'], 2)
+        np.testing.assert_array_equal(sm.options['theta0'], [0.1] * 2)
+
+    def test_unknown(self):
+
+        self.assertRaises(Exception, approximation_sm, 'spline', [1e-2], 3)
+
+# ========================================================================================================= #
+
+if __name__ == "__main__":
+    unittest.main()
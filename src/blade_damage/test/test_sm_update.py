@@ -0,0 +1,124 @@
+# unit tests of the incremental surrogate model updates (sm_update.py) against a full refit; numpy / scipy only
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sm_artifact import fit_fused_sm
+from sm_update import poly_state, update_poly_state, poly_state_sm, rbf_state, update_rbf_state, rbf_state_sm, \
+    rbf_kernel, update_fused_sm, sm_state_file_name
+
+# ========================================================================================================= #
+
+def training_points(num_pts=40, num_var=3, seed=1):
+
+    rng = np.random.RandomState(seed)
+    xt = rng.uniform(0.0, 1.0, [num_pts, num_var])
+    yt = np.column_stack([np.sin(3.0 * xt[:, 0]) + xt[:, 1]**2.0, xt[:, 2] * xt[:, 0], np.cos(xt[:, 1])])
+
+    return xt, yt
+
+# ========================================================================================================= #
+
+class TestPolyUpdate(unittest.TestCase):
+
+    def test_qr_update(self):
+
+        xt, yt = training_points()
+        x = np.random.RandomState(2).uniform(0.0, 1.0, [6, 3])
+
+        for approximation_model in ['second_order_poly', 'least_squares']:
+
+            state = poly_state(xt[:25], yt[:25], approximation_model)
+            state = update_poly_state(state, xt[25:32], yt[25:32], approximation_model)
+            state = update_poly_state(state, xt[32:], yt[32:], approximation_model)
+
+            sm_update = poly_state_sm(state, approximation_model)
+            sm_refit = fit_fused_sm(xt, [yt], ['DEM'], approximation_model).sm
+
+            np.testing.assert_allclose(sm_update.predict_values(x), sm_refit.predict_values(x), rtol=1e-8,
+                                       atol=1e-10)
+
+# ========================================================================================================= #
+
+class TestRBFUpdate(unittest.TestCase):
+
+    def test_cholesky_update(self):
+
+        xt, yt = training_points()
+        x = np.random.RandomState(3).uniform(0.0, 1.0, [6, 3])
+        d0 = 0.3
+        reg = 1e-8
+
+        state = rbf_state(xt[:25], d0, reg)
+        state = update_rbf_state(state, xt[25:32])
+        state = update_rbf_state(state, xt[32:])
+
+        # factor of the full kernel matrix
+        K = rbf_kernel(xt, xt, d0 * np.ones(3)) + reg * np.eye(len(xt))
+        np.testing.assert_allclose(state['L'], np.linalg.cholesky(K), rtol=1e-6, atol=1e-7)
+        np.testing.assert_array_equal(state['xt'], xt)
+
+        sm_update = rbf_state_sm(state, yt)
+        sm_refit = fit_fused_sm(xt, [yt], ['DEM'], 'RBF', d0=d0, reg=reg).sm
+
+        np.testing.assert_allclose(sm_update.predict_values(x), sm_refit.predict_values(x), rtol=1e-6, atol=1e-8)
+
+# ========================================================================================================= #
+
+class TestUpdateFusedSM(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self.state_file = sm_state_file_name(os.path.join(self.tmp_dir, 'sm.smb'))
+
+    def tearDown(self):
+
+        shutil.rmtree(self.tmp_dir)
+
+    def test_points_added(self):
+
+        xt, yt = training_points()
+        x = np.random.RandomState(4).uniform(0.0, 1.0, [6, 3])
+        yt_list = [yt[:, :2], yt[:, 2:]]
+
+        for approximation_model in ['second_order_poly', 'RBF']:
+
+            if os.path.isfile(self.state_file):
+                os.remove(self.state_file)
+
+            sm, num_added = update_fused_sm(self.state_file, xt[:30], [y[:30] for y in yt_list], ['DEM', 'load'],
+                                            approximation_model, d0=0.3, reg=1e-8)
+            self.assertEqual(num_added, 30)
+
+            sm, num_added = update_fused_sm(self.state_file, xt, yt_list, ['DEM', 'load'], approximation_model,
+                                            d0=0.3, reg=1e-8)
+            self.assertEqual(num_added, 10)
+
+            sm_refit = fit_fused_sm(xt, yt_list, ['DEM', 'load'], approximation_model, d0=0.3, reg=1e-8)
+            for y, y_refit in zip(sm.predict_values(x), sm_refit.predict_values(x)):
+                np.testing.assert_allclose(y, y_refit, rtol=1e-6, atol=1e-8)
+
+    def test_changed_points_refit(self):
+
+        # earlier training points that changed are not updated from the saved state
+        xt, yt = training_points()
+
+        update_fused_sm(self.state_file, xt[:30], [yt[:30]], ['DEM'], 'least_squares')
+
+        yt_changed = yt.copy()
+        yt_changed[0] += 1.0
+        sm, num_added = update_fused_sm(self.state_file, xt, [yt_changed], ['DEM'], 'least_squares')
+
+        self.assertEqual(num_added, 40)
+
+# ========================================================================================================= #
+
+if __name__ == "__main__":
+    unittest.main()
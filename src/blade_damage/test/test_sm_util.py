@@ -0,0 +1,151 @@
+# unit tests of the surrogate model training data parsing (sm_util.py); numpy only
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sm_util import read_sm_master, sm_master_rows, load_sm_training_data
+
+# ========================================================================================================= #
+
+var_header = 'variable points: chord_sub_0_1 theta_sub_0 turbulence_intensity_0 '
+
+def write_master(file_name, label, rows):
+
+    # rows - [point id, values] (None - place holder line)
+    f = open(file_name, "w")
+    f.write(var_header + '\n')
+    for pt, values in rows:
+        if values is None:
+            f.write('-- place holder --\n')
+        else:
+            f.write(label + str(pt) + ' ' + ' '.join([repr(float(val)) for val in values]) + '\n')
+    f.close()
+
+# ========================================================================================================= #
+
+class TestReadSMMaster(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+
+        shutil.rmtree(self.tmp_dir)
+
+    def test_training_point_file(self):
+
+        # training point file written by Calculate_FAST_sm_training_points (point 0 done, place holder lines left)
+        file_name = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'FAST_Files',
+                                 'Opt_Files', 'test_sm', 'sm_var_dir_B_I_af1', 'sm_var_0.txt')
+
+        pt_index, values = read_sm_master(file_name)
+
+        np.testing.assert_array_equal(pt_index, [0])
+        np.testing.assert_allclose(values[0], [0.0542406504065, 0.0734097560976, 0.0513886178862, 0.0267757845528,
+                                               14.5003, 7.85836, 3.30717, -2.0378099, 0.14])
+
+    def test_labels_and_place_holders(self):
+
+        file_name = os.path.join(self.tmp_dir, 'sm_master_DEM.txt')
+        write_master(file_name, 'pt_', [[3, [1.0, 2.0e5]], [0, None], [7, [-3.5, 1e-3]], [1, None]])
+
+        pt_index, values = read_sm_master(file_name)
+
+        np.testing.assert_array_equal(pt_index, [3, 7])
+        np.testing.assert_array_equal(values, [[1.0, 2.0e5], [-3.5, 1e-3]])
+
+    def test_empty(self):
+
+        file_name = os.path.join(self.tmp_dir, 'sm_master_DEM.txt')
+        write_master(file_name, 'pt_', [[0, None]])
+
+        pt_index, values = read_sm_master(file_name)
+
+        self.assertEqual(len(pt_index), 0)
+        self.assertEqual(values.shape, (0, 0))
+
+    def test_different_lengths(self):
+
+        file_name = os.path.join(self.tmp_dir, 'sm_master_DEM.txt')
+        write_master(file_name, 'pt_', [[0, [1.0, 2.0]], [1, [1.0, 2.0, 3.0]]])
+
+        self.assertRaises(Exception, read_sm_master, file_name)
+
+# ========================================================================================================= #
+
+class TestSMMasterRows(unittest.TestCase):
+
+    def test_match_labels(self):
+
+        # output files merged in another order, point 5 has no load
+        rows, has_all = sm_master_rows(np.array([0, 5, 2]), [np.array([2, 0, 5]), np.array([0, 2])], 'dir')
+
+        np.testing.assert_array_equal(has_all, [True, False, True])
+        np.testing.assert_array_equal(rows[0][has_all], [1, 0])
+        np.testing.assert_array_equal(rows[1][has_all], [0, 1])
+
+    def test_repeated_labels(self):
+
+        # combined campaigns repeat labels, lines are matched by position
+        rows, has_all = sm_master_rows(np.array([0, 1, 0, 1]), [np.array([0, 1, 0, 1])], 'dir')
+
+        self.assertTrue(np.all(has_all))
+        np.testing.assert_array_equal(rows[0], [0, 1, 2, 3])
+
+        self.assertRaises(Exception, sm_master_rows, np.array([0, 1, 0, 1]), [np.array([0, 1, 0])], 'dir')
+
+    def test_no_results(self):
+
+        self.assertRaises(Exception, sm_master_rows, np.array([0, 1]), [np.array([], dtype=int)], 'dir')
+
+# ========================================================================================================= #
+
+class TestLoadSMTrainingData(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tmp_dir = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.tmp_dir, 'sm_var_dir'))
+
+        self.FASTinfo = {'opt_dir': self.tmp_dir, 'sm_var_out_dir': 'sm_var_dir', 'sm_training_store': 'txt',
+                         'var_index': [0, 1, 2], 'sm_var_names': ['chord_sub', 'chord_sub', 'theta_sub']}
+
+    def tearDown(self):
+
+        shutil.rmtree(self.tmp_dir)
+
+    def test_txt(self):
+
+        dir_name = os.path.join(self.tmp_dir, 'sm_var_dir')
+        var = [[0.05, 0.04, 10.0], [0.06, 0.03, 12.0], [0.07, 0.02, 8.0]]
+
+        write_master(os.path.join(dir_name, 'sm_master_var.txt'), 'num_pt_', [[0, var[0]], [1, var[1]], [2, var[2]]])
+        write_master(os.path.join(dir_name, 'sm_master_DEM.txt'), 'pt_',
+                     [[2, [5.0, 6.0]], [0, [1.0, 2.0]], [1, [3.0, 4.0]]])
+        write_master(os.path.join(dir_name, 'sm_master_load.txt'), 'pt_',
+                     [[0, [10.0, 20.0]], [2, [50.0, 60.0]]])
+        write_master(os.path.join(dir_name, 'sm_master_def.txt'), 'pt_', [[0, [0.1]], [1, [0.2]], [2, [0.3]]])
+
+        xt, yt_x, yt_y, yt_x_load, yt_y_load, yt_def, pt = \
+            load_sm_training_data(self.FASTinfo, 3, 2.0, 60.0, return_pt=True)
+
+        # point 1 has no loads; chord columns times blade length, outputs times rated torque / blade length
+        np.testing.assert_array_equal(pt, [0, 2])
+        np.testing.assert_allclose(xt, [[3.0, 2.4, 10.0], [4.2, 1.2, 8.0]])
+        np.testing.assert_allclose(yt_x, [[2.0], [10.0]])
+        np.testing.assert_allclose(yt_y, [[4.0], [12.0]])
+        np.testing.assert_allclose(yt_x_load, [[20.0], [100.0]])
+        np.testing.assert_allclose(yt_y_load, [[40.0], [120.0]])
+        np.testing.assert_allclose(yt_def, [[6.0], [18.0]])
+
+# ========================================================================================================= #
+
+if __name__ == "__main__":
+    unittest.main()